@@ -0,0 +1,23 @@
+# coding: utf-8
+# Shared helpers for the selenium-genebots crawler scripts.
+
+from genebots.cache import ResultCache
+from genebots.checkpoint import Checkpoint, resume_keys
+from genebots.context import RunContext, add_common_args, add_queue_args, add_replay_args, check_replay_args
+from genebots.core import init_driver, next_step, setup_logging
+from genebots.driver_pool import DriverPool
+from genebots.downloads import wait_for_download
+from genebots.eutils import EUtilsClient
+from genebots.extract import table_rows
+from genebots.forms import clear_nodes, selected_texts, warm_form
+from genebots.inputs import read_column, read_lines, read_rows
+from genebots.merge import MergedDataset, prefix_column
+from genebots.planner import Deduplicator
+from genebots.profiles import ProfileManager
+from genebots.refsnp import RefSnpClient
+from genebots.replay import FormReplayClient, ShapeMismatch
+from genebots.retry import CircuitBreaker, RetryQueue
+from genebots.screenshots import ScreenshotWriter, rotate_screenshot_dirs
+from genebots.sink import OutputSink
+from genebots.workers import HostLimiter, RateLimiter, run_ordered
+from genebots.workqueue import WorkQueue, queue_status
@@ -0,0 +1,7 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from genebots.cli import main
+
+if __name__ == "__main__":
+    main()
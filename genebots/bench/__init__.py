@@ -0,0 +1,5 @@
+# coding: utf-8
+# Offline benchmark: a local stand-in for the crawled sites and a runner timing each crawler against it.
+
+from genebots.bench.runner import CRAWLERS, bench, run_crawler
+from genebots.bench.server import StandInServer
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv, json, logging, os, subprocess, sys, time
+
+from genebots.bench.server import REGION_STEP, StandInServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rsids(size):
+    return [f"rs{1000 + i * 7919}" for i in range(size)]
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def clinvar_input(path, size):
+    with open(path, 'w') as f:
+        f.write(''.join(f"Stand-in disease {i}\n" for i in range(size)))
+
+
+def dbsnp_input(path, size):
+    write_csv(path, ['Unnamed: 0', '#Uploaded_variation', 'GRCh38', 'GRCh37'], [[i, rsid, '', ''] for i, rsid in enumerate(rsids(size), 1)])
+
+
+def taiwanview_input(path, size):
+    write_csv(path, ['#', 'rs ID'], list(enumerate(rsids(size), 1)))
+
+
+def taiwanview_xy_input(path, size):
+    write_csv(path, ['#', 'rs ID', 'hg38 chromosome', 'Location'],
+              [[i, rsid, 'X' if i % 2 else 'Y', 100000 + i * REGION_STEP] for i, rsid in enumerate(rsids(size), 1)])
+
+
+def vietnamese_input(path, size):
+    write_csv(path, ['#Uploaded_variation'], [[rsid] for rsid in rsids(size)])
+
+
+COMMON = ['--workers', '{workers}', '--screenshots', 'off', '--max-wait', '{max_wait}', '--retry-delay', '1',
+          '--failure-manifest', '{work}/failures.json', '--metrics-file', '{work}/metrics.json']
+
+# 每個 crawler：腳本、metrics 的 source 標籤、輸入檔產生器與指向 stand-in 的參數
+CRAWLERS = {
+    'clinvar': {'script': 'ncbi-clinvar_automate_download.py', 'source': 'clinvar', 'input': ('input.txt', clinvar_input),
+                'args': ['--base-url', '{clinvar}', '--output-dir', '{work}/outputs', '--download-timeout', '{max_wait}']},
+    'clinvar-eutils': {'script': 'ncbi-clinvar_automate_download.py', 'source': 'clinvar', 'input': ('input.txt', clinvar_input),
+                       'args': ['--engine', 'eutils', '--eutils-url', '{eutils}', '--output-dir', '{work}/outputs']},
+    'dbsnp': {'script': 'ncbi-dbSNP_automate.py', 'source': 'dbsnp', 'input': ('input.csv', dbsnp_input),
+              'args': ['--base-url', '{dbsnp}', '--output', '{work}/output.csv']},
+    'dbsnp-http': {'script': 'ncbi-dbSNP_automate.py', 'source': 'dbsnp', 'input': ('input.csv', dbsnp_input),
+                   'args': ['--engine', 'http', '--refsnp-url', '{refsnp}', '--host-rate', '1000', '--no-fallback',
+                            '--base-url', '{dbsnp}', '--output', '{work}/output.csv']},
+    'taiwanview': {'script': 'taiwanview_automate.py', 'source': 'taiwanview', 'input': ('input.csv', taiwanview_input),
+                   'args': ['--base-url', '{taiwanview}', '--output', '{work}/output.csv']},
+    'taiwanview-xy': {'script': 'taiwanview_automate_xy.py', 'source': 'taiwanview-xy', 'input': ('input.csv', taiwanview_xy_input),
+                      'args': ['--base-url', '{taiwanview}', '--output', '{work}/output.csv']},
+    'vietnamese': {'script': 'vietnamese_automate.py', 'source': 'vietnamese', 'input': ('input.csv', vietnamese_input),
+                   'args': ['--base-url', '{vietnamese}', '--output', '{work}/output.csv']},
+}
+# 同一 crawler 改用 --engine http 重送表單請求
+for name, search in (('taiwanview', 'taiwanview_search'), ('taiwanview-xy', 'taiwanview_search'), ('vietnamese', 'vietnamese_search')):
+    CRAWLERS[f'{name}-http'] = dict(CRAWLERS[name], args=CRAWLERS[name]['args'] + ['--engine', 'http', '--replay-url', f'{{{search}}}'])
+
+COLUMNS = ['crawler', 'rows', 'workers', 'status', 'seconds', 'rows_per_sec', 'p50', 'p95', 'peak_rss_mb', 'errors']
+
+
+def tree_rss(pid):
+    """Resident memory in bytes of `pid` and every descendant (chromedriver, Chrome), read from /proc."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+        pending.extend(children.get(current, []))
+    return total
+
+
+def stage_latency(metrics, stage, source):
+    for row in metrics.get('stages', []):
+        if row['stage'] == stage and row['source'] == source:
+            return tuple(round(value, 3) if value is not None else None for value in (row['p50'], row['p95']))
+    return None, None
+
+
+def run_crawler(name, size, workers, urls, work_dir, max_wait=30, timeout=None, python=sys.executable, poll=0.2):
+    """Run one crawler end to end against the stand-in server and return its benchmark row."""
+    spec = CRAWLERS[name]
+    work = os.path.abspath(os.path.join(work_dir, f'{name}-{size}x{workers}'))
+    os.makedirs(work, exist_ok=True)
+    filename, generate = spec['input']
+    generate(os.path.join(work, filename), size)
+
+    values = dict(urls, work=work, workers=workers, max_wait=max_wait)
+    command = [python, spec['script'], '--input', os.path.join(work, filename)]
+    command += [arg.format(**values) for arg in spec['args'] + COMMON]
+    logging.info(f"bench | {name} | {size} rows x {workers} workers")
+
+    peak, status = 0, 'ok'
+    started = time.monotonic()
+    with open(os.path.join(work, 'crawler.log'), 'w') as log:
+        process = subprocess.Popen(command, cwd=REPO_DIR, stdout=log, stderr=subprocess.STDOUT)
+        while process.poll() is None:
+            peak = max(peak, tree_rss(process.pid))
+            if timeout and time.monotonic() - started > timeout:
+                process.kill()
+                status = 'timeout'
+            time.sleep(poll)
+    seconds = time.monotonic() - started
+    if status == 'ok' and process.returncode:
+        status = f'exit {process.returncode}'
+
+    metrics = {}
+    if os.path.exists(os.path.join(work, 'metrics.json')):
+        with open(os.path.join(work, 'metrics.json')) as f:
+            metrics = json.load(f)
+    p50, p95 = stage_latency(metrics, 'lookup', spec['source'])
+    lookups = metrics.get('lookups', {}).get(spec['source'], {})
+
+    return {'crawler': name, 'rows': size, 'workers': workers, 'status': status, 'seconds': round(seconds, 2),
+            'rows_per_sec': round(size / seconds, 2) if seconds else None, 'p50': p50, 'p95': p95,
+            'peak_rss_mb': round(peak / 1024 / 1024, 1), 'errors': lookups.get('error', 0) + lookups.get('circuit_open', 0)}
+
+
+def print_report(results):
+    widths = {column: max(len(column), *(len(str(row[column])) for row in results)) for column in COLUMNS}
+    print('  '.join(column.ljust(widths[column]) for column in COLUMNS))
+    for row in results:
+        print('  '.join(str(row[column]).ljust(widths[column]) for column in COLUMNS))
+
+
+def write_report(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+def bench(crawlers, sizes, workers, work_dir, latency=0.0, jitter=0.0, error_rate=0.0, empty_rate=0.1, seed=0,
+          max_wait=30, timeout=None, report=None):
+    """Benchmark every crawler x size x workers combination against one stand-in server."""
+    server = StandInServer(latency=latency, jitter=jitter, error_rate=error_rate, empty_rate=empty_rate, seed=seed).start()
+    results = []
+    try:
+        urls = server.base_urls()
+        for name in crawlers:
+            for size in sizes:
+                for count in workers:
+                    results.append(run_crawler(name, size, count, urls, work_dir, max_wait, timeout))
+    finally:
+        server.close()
+
+    print_report(results)
+    if report:
+        write_report(report, results)
+        logging.info(f"Benchmark report written to {report}")
+    return results
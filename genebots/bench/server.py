@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import html, json, logging, os, random, threading, time, zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import parse_qs, quote, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Stand-in entry points, relative to the server URL, as passed to each crawler's --base-url
+# (and the search requests behind the forms, as passed to --replay-url)
+PATHS = {
+    'clinvar': '/clinvar/',
+    'eutils': '/eutils/',
+    'dbsnp': '/snp/',
+    'refsnp': '/refsnp/',
+    'taiwanview': '/taiwanview/variant.php',
+    'taiwanview_search': '/taiwanview/search',
+    'vietnamese': '/vietnamese/',
+    'vietnamese_search': '/vietnamese/search',
+}
+
+# TaiwanView Region results only exist at positions divisible by this, so windows stay small
+REGION_STEP = 100
+
+
+def digest(key):
+    return zlib.crc32(str(key).strip().lower().encode('utf-8'))
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return Template(f.read())
+
+
+class StandInData:
+    """Deterministic fake records: the same key always gives the same rows.
+
+    About `empty_rate` of the keys have no data, mirroring the empty pages
+    each crawler has to recognize.
+    """
+
+    def __init__(self, empty_rate=0.1):
+        self.empty_rate = empty_rate
+
+    def empty(self, key):
+        return digest(key) % 1000 < self.empty_rate * 1000
+
+    def gene(self, key):
+        return f"GENE{digest(key) % 500}"
+
+    def chromosome(self, key):
+        return str(digest(key) % 22 + 1)
+
+    def position(self, key):
+        return 10000 + digest(key) % 200000000
+
+    def clinvar_rows(self, term):
+        if self.empty(term):
+            return []
+        return [[f"NM_{digest(term) % 900000:06d}.{i}(GENE{i}):c.{100 + i}A>G", f"GENE{i}", f"p.K{i}R",
+                 term, f"VCV{digest(term) % 10 ** 9:09d}", self.chromosome(term), str(self.position(term) + i),
+                 self.chromosome(term), str(self.position(term) + 1000 + i), str(digest(term) % 10 ** 6 + i),
+                 f"rs{digest(term) % 10 ** 8 + i}"]
+                for i in range(3 + digest(term) % 20)]
+
+    def dbsnp(self, rsid):
+        if self.empty(rsid):
+            return None
+        chromosome, position = self.chromosome(rsid), self.position(rsid)
+        return f"{chromosome}:{position} (GRCh38)", f"{chromosome}:{position - 12345} (GRCh37)"
+
+    def taiwanview_rsid(self, rsid):
+        if self.empty(rsid):
+            return []
+        chromosome, position = self.chromosome(rsid), self.position(rsid)
+        return [[rsid, f"chr{chromosome}:{position}", self.gene(rsid), 'A', alt, f"{(digest(rsid + alt) % 5000) / 10000:.4f}"]
+                for alt in 'CGT'[:1 + digest(rsid) % 3]]
+
+    def taiwanview_region(self, chromosome, start, end):
+        rows = []
+        first = -(-start // REGION_STEP) * REGION_STEP
+        for position in range(first, min(end, start + 10 ** 6) + 1, REGION_STEP):
+            key = f"{chromosome}:{position}"
+            if not self.empty(key):
+                rows.append([f"rs{digest(key) % 10 ** 8}", f"chr{chromosome}:{position}", self.gene(key), 'A', 'G',
+                             f"{(digest(key) % 5000) / 10000:.4f}"])
+        return rows
+
+    def vietnamese(self, rsid):
+        if self.empty(rsid):
+            return []
+        return [[alt, f"{(digest(rsid + alt) % 5000) / 10000:.4f}", f"{(digest(alt + rsid) % 5000) / 10000:.4f}",
+                 'exonic', self.gene(rsid), 'MODERATE', f"p.R{digest(rsid) % 900}W"]
+                for alt in 'CGT'[:1 + digest(rsid) % 3]]
+
+    def eutils_ids(self, term):
+        return [] if self.empty(term) else [str(digest(term) % 10 ** 6 * 100 + i) for i in range(3 + digest(term) % 20)]
+
+    def eutils_summary(self, uid):
+        return {
+            'uid': uid, 'title': f"NM_{int(uid) % 900000:06d}.1(GENE{uid[-2:]}):c.{uid[-3:]}A>G", 'accession': f"VCV{uid}",
+            'accession_version': f"VCV{uid}.1", 'protein_change': f"K{uid[-2:]}R", 'genes': [{'symbol': f"GENE{uid[-2:]}"}],
+            'molecular_consequence_list': ['missense variant'],
+            'germline_classification': {'description': 'Pathogenic', 'last_evaluated': '2024/01/01 00:00',
+                                        'review_status': 'criteria provided, single submitter',
+                                        'trait_set': [{'trait_name': 'Stand-in condition'}]},
+            'variation_set': [{'variation_loc': [{'assembly_name': 'GRCh38', 'chr': '1', 'start': uid, 'stop': uid},
+                                                 {'assembly_name': 'GRCh37', 'chr': '1', 'start': uid, 'stop': uid}],
+                               'variation_xrefs': [{'db_source': 'dbSNP', 'db_id': uid}],
+                               'canonical_spdi': f"NC_000001.11:{uid}:A:G", 'variant_type': 'single nucleotide variant'}],
+        }
+
+    def refsnp(self, number):
+        rsid = f"rs{number}"
+        if self.empty(rsid):
+            return None
+        chromosome, position = self.chromosome(rsid), self.position(rsid)
+
+        def placement(assembly, accession, offset):
+            return {'placement_annot': {'seq_id_traits_by_assembly': [{'assembly_name': assembly, 'is_chromosome': True}]},
+                    'alleles': [{'allele': {'spdi': {'seq_id': accession, 'position': position - offset - 1,
+                                                     'deleted_sequence': 'A', 'inserted_sequence': 'A'}}}]}
+
+        return {'refsnp_id': str(number), 'primary_snapshot_data': {'placements_with_allele': [
+            placement('GRCh38.p14', f"NC_{int(chromosome):06d}.11", 0),
+            placement('GRCh37.p13', f"NC_{int(chromosome):06d}.10", 12345),
+        ]}}
+
+
+class StandInServer:
+    """Local HTTP server imitating the pages and APIs the crawlers use.
+
+    Serves ClinVar search, results and the "Create File" download; the
+    E-utilities esearch/esummary JSON; dbSNP search and record pages and the
+    refsnp API; TaiwanView `variant.php` with its `datatable`; and the
+    genomes.vn result table, all from `fixtures/` filled with `StandInData`.
+    Result requests (not the empty search pages) wait `latency` seconds
+    (+/- `jitter`) and fail with HTTP 503 with probability `error_rate`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, empty_rate=0.1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.data = StandInData(empty_rate)
+        self.requests = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._templates = {name: fixture(f'{name}.html') for name in ('clinvar', 'dbsnp', 'taiwanview', 'vietnamese')}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def base_urls(self):
+        return {name: self.url + path for name, path in PATHS.items()}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stand-in-server', daemon=True)
+        self._thread.start()
+        logging.info(f'Stand-in server on {self.url} (latency={self.latency}s jitter={self.jitter}s error_rate={self.error_rate})')
+        return self
+
+    def serve_forever(self):
+        logging.info(f'Stand-in server on {self.url}: ' + ', '.join(f'{name}={url}' for name, url in self.base_urls().items()))
+        self._server.serve_forever()
+
+    def close(self):
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def delay(self):
+        """Sleep the injected latency; returns True when this request should fail."""
+        with self._lock:
+            seconds = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            failed = self._random.random() < self.error_rate
+        if seconds:
+            time.sleep(seconds)
+        return failed
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+                data = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_json(self, value, status=200):
+                self.send(status, json.dumps(value), 'application/json')
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                route = server.route(url.path)
+                with server._lock:
+                    server.requests[route] += 1
+                try:
+                    getattr(server, f'serve_{route}')(self, url.path, query)
+                except Exception as e:
+                    logging.warning(f'Stand-in {url.path} failed: {e}')
+                    self.send(500, 'Internal error')
+
+        return Handler
+
+    def route(self, path):
+        if path.startswith('/clinvar/download'):
+            return 'clinvar_download'
+        for name, prefix in PATHS.items():
+            if path.startswith(prefix.rsplit('/', 1)[0] + '/') or path == prefix:
+                if name in ('taiwanview', 'vietnamese') and path.endswith('/search'):
+                    return f'{name}_search'
+                return name
+        return 'stats' if path == '/stats' else 'not_found'
+
+    def unavailable(self, request):
+        request.send(503, '<html><body><h1>503 Service Unavailable</h1></body></html>')
+
+    def serve_not_found(self, request, path, query):
+        request.send(404, 'Not found')
+
+    def serve_stats(self, request, path, query):
+        request.send_json(dict(self.requests))
+
+    def serve_clinvar(self, request, path, query):
+        term = query.get('term', '')
+        if not term:
+            content = ''
+        elif self.delay():
+            return self.unavailable(request)
+        else:
+            rows = self.data.clinvar_rows(term)
+            if not rows:
+                content = '<div class="warn">No items found.</div>'
+            else:
+                items = ''.join(f'<tr><td>{html.escape(row[0])}</td><td>{html.escape(row[1])}</td><td>{row[4]}</td></tr>' for row in rows)
+                content = (f'<h2>{len(rows)} results</h2>'
+                           '<a href="#" onclick="showDownload(); return false;">Download</a>'
+                           f'<div id="download-dialog" data-href="{PATHS["clinvar"]}download?term={quote(term)}"></div>'
+                           f'<table class="docsum"><tbody>{items}</tbody></table>')
+        request.send(200, self._templates['clinvar'].safe_substitute(base=PATHS['clinvar'], term=html.escape(term, quote=True), content=content))
+
+    def serve_clinvar_download(self, request, path, query):
+        term = query.get('term', '')
+        if self.delay():
+            return self.unavailable(request)
+        header = ['Name', 'Gene(s)', 'Protein change', 'Condition(s)', 'Accession', 'GRCh37Chromosome', 'GRCh37Location',
+                  'GRCh38Chromosome', 'GRCh38Location', 'VariationID', 'dbSNP ID']
+        lines = ['\t'.join(header)] + ['\t'.join(row) for row in self.data.clinvar_rows(term)]
+        request.send(200, '\n'.join(lines) + '\n', 'text/plain; charset=utf-8',
+                     {'Content-Disposition': 'attachment; filename="clinvar_result.txt"'})
+
+    def serve_eutils(self, request, path, query):
+        if self.delay():
+            return request.send(503, 'Service Unavailable', 'text/plain')
+        if path.endswith('esearch.fcgi'):
+            ids = self.data.eutils_ids(query.get('term', ''))
+            start, size = int(query.get('retstart', 0)), int(query.get('retmax', 10000))
+            request.send_json({'esearchresult': {'count': str(len(ids)), 'idlist': ids[start:start + size]}})
+        elif path.endswith('esummary.fcgi'):
+            uids = [uid for uid in query.get('id', '').split(',') if uid]
+            request.send_json({'result': {'uids': uids, **{uid: self.data.eutils_summary(uid) for uid in uids}}})
+        else:
+            request.send(404, 'Not found')
+
+    def serve_dbsnp(self, request, path, query):
+        term = query.get('term', '')
+        if not term:
+            content = ''
+        elif self.delay():
+            return self.unavailable(request)
+        else:
+            positions = self.data.dbsnp(term)
+            if positions is None:
+                content = f'<div class="warn">The following term was not found in dbSNP: {html.escape(term)}</div>'
+            else:
+                content = ('<div class="summary-box"><dl><dt>Organism</dt><dd>Homo sapiens</dd>'
+                           f'<dt>Chromosome: </dt><dd>{positions[0]}<br>{positions[1]}</dd>'
+                           f'<dt>Gene : Consequence</dt><dd>{self.data.gene(term)}</dd></dl></div>')
+        request.send(200, self._templates['dbsnp'].safe_substitute(base=PATHS['dbsnp'], term=html.escape(term, quote=True), content=content))
+
+    def serve_refsnp(self, request, path, query):
+        if self.delay():
+            return request.send(503, 'Service Unavailable', 'text/plain')
+        record = self.data.refsnp(path.rstrip('/').rsplit('/', 1)[-1])
+        if record is None:
+            return request.send_json({'error': {'code': 404, 'message': 'RefSNP not found'}}, 404)
+        request.send_json(record)
+
+    def serve_taiwanview(self, request, path, query):
+        request.send(200, self._templates['taiwanview'].safe_substitute(api=PATHS['taiwanview_search']))
+
+    def serve_taiwanview_search(self, request, path, query):
+        if self.delay():
+            return request.send(503, 'Service Unavailable', 'text/plain')
+        if query.get('searchBy') == 'Region':
+            chromosome = query.get('chr', '').replace('Chr', '')
+            rows = self.data.taiwanview_region(chromosome, int(query.get('chrFrom') or 0), int(query.get('chrTo') or 0))
+        else:
+            rows = self.data.taiwanview_rsid(query.get('geneOrVariant', ''))
+        request.send_json({'rows': rows})
+
+    def serve_vietnamese(self, request, path, query):
+        request.send(200, self._templates['vietnamese'].safe_substitute(api=PATHS['vietnamese_search']))
+
+    def serve_vietnamese_search(self, request, path, query):
+        if self.delay():
+            return request.send(503, 'Service Unavailable', 'text/plain')
+        rsid = query.get('query', '')
+        request.send_json({'query': html.escape(rsid), 'reference': query.get('ref', ''),
+                           'position': f"chr{self.data.chromosome(rsid)}:{self.data.position(rsid)}",
+                           'rows': self.data.vietnamese(rsid)})
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+# URL patterns for Network.setBlockedURLs, grouped so each source can opt out of a group
+BLOCKED_RESOURCES = {
+    'images': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.ico', '*.bmp'],
+    'fonts': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*fonts.googleapis.com*', '*fonts.gstatic.com*'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg'],
+    'stylesheets': ['*.css'],
+    'trackers': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+                 '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*newrelic.com*', '*nr-data.net*',
+                 '*addthis.com*', '*sharethis.com*', '*siteimproveanalytics.com*', '*qualtrics.com*'],
+}
+
+# Groups each source still needs for its pages to work (e.g. CSS for dropdowns and visibility checks)
+SOURCE_ALLOWLISTS = {
+    'clinvar': ['stylesheets'],
+    'dbsnp': [],
+    'taiwanview': ['stylesheets'],
+    'vietnamese': ['stylesheets'],
+    # one pool serving several sources keeps what any of them needs
+    'shared': ['stylesheets'],
+}
+
+
+def blocked_patterns(source=None):
+    allowed = SOURCE_ALLOWLISTS.get(source, ['stylesheets'])
+    return [pattern for group, patterns in BLOCKED_RESOURCES.items() if group not in allowed for pattern in patterns]
+
+
+def apply_lean_options(options):
+    """Chrome options for the lean profile: no images and an eager page-load strategy."""
+    options.page_load_strategy = 'eager'
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-background-networking')
+    return {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    }
+
+
+def block_resources(driver, source=None):
+    """Block non-essential requests for this session through the DevTools protocol."""
+    patterns = blocked_patterns(source)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        logging.info(f'Lean profile: blocking {len(patterns)} URL patterns for {source}')
+    except Exception as e:
+        logging.warning(f'Lean profile: could not block resources: {e}')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json, logging, os, sqlite3, threading, time
+
+DAY = 24 * 60 * 60
+
+# How long a cached result stays valid for each source, in seconds
+DEFAULT_TTLS = {
+    'dbsnp': 180 * DAY,
+    'taiwanview': 90 * DAY,
+    'taiwanview-region': 90 * DAY,
+    'vietnamese': 90 * DAY,
+}
+
+
+class ResultCache:
+    """On-disk cache of lookup results keyed by (source, query, genome build).
+
+    Values are stored as JSON. Entries older than the source's TTL are
+    ignored, and the least recently used entries are evicted once the cache
+    holds more than `max_entries` rows. Hits only record their access time
+    in memory; the times are written in one batch once `access_batch` are
+    pending, before eviction and on close.
+    """
+
+    def __init__(self, path, ttls=None, default_ttl=90 * DAY, max_entries=1000000, access_batch=500):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.access_batch = access_batch
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        # 命中的 key -> 最後存取時間，批次寫回
+        self._accessed = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS results (
+                                source TEXT, query TEXT, build TEXT, value TEXT,
+                                created REAL, accessed REAL,
+                                PRIMARY KEY (source, query, build))''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+        self._conn.commit()
+
+    def get(self, source, query, build=''):
+        """Return the cached value, or None on a miss or an expired entry."""
+        now = time.time()
+        oldest = now - self.ttls.get(source, self.default_ttl)
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE source=? AND query=? AND build=? AND created>=?',
+                                     (source, query, build, oldest)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._accessed[(source, query, build)] = now
+            if len(self._accessed) >= self.access_batch:
+                self._write_accessed()
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, source, query, value, build=''):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                               (source, query, build, json.dumps(value), now, now))
+            self._accessed.pop((source, query, build), None)
+            self._puts += 1
+            if self._puts % 1000 == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _write_accessed(self):
+        if self._accessed:
+            self._conn.executemany('UPDATE results SET accessed=? WHERE source=? AND query=? AND build=?',
+                                   [(accessed, *key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self):
+        # 先寫回存取時間，才能依最近使用排序
+        self._write_accessed()
+        count = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute('DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY accessed LIMIT ?)',
+                               (count - self.max_entries,))
+            logging.info(f'Cache evicted {count - self.max_entries} entries')
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        logging.info(f'Cache {self.path}: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate)')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv, glob, logging, os
+
+from genebots.sink import ERROR, STATUS_COLUMN, is_parquet
+
+
+def split_finished(rows, key_column, result_columns, retry_empty=False):
+    finished, requeued = set(), set()
+    for row in rows:
+        values = [row.get(column) for column in result_columns]
+        key = str(row[key_column])
+        if ERROR in values or row.get(STATUS_COLUMN) == ERROR or (retry_empty and not any(value not in (None, '') for value in values)):
+            requeued.add(key)
+        else:
+            finished.add(key)
+    return finished - requeued, requeued
+
+
+def resume_keys(output_file, key_column, result_columns, retry_empty=False):
+    """Return (finished keys, re-queued keys) found in an existing output.
+
+    A key is re-queued when any of its rows has 'error' in a result column or
+    in the `status` column of a typed Parquet output (or, with `retry_empty`,
+    when all of its result columns are empty). The
+    rows of re-queued keys are removed from the output so that the rerun does
+    not leave duplicates behind. Works on CSV files and Parquet directories.
+    """
+    if is_parquet(output_file):
+        return resume_parquet_keys(output_file, key_column, result_columns, retry_empty)
+
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        return set(), set()
+
+    with open(output_file, newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    finished, requeued = split_finished(rows, key_column, result_columns, retry_empty)
+
+    if requeued:
+        tmp_file = f'{output_file}.tmp'
+        with open(tmp_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(row for row in rows if row[key_column] not in requeued)
+        os.replace(tmp_file, output_file)
+
+    logging.info(f'Resume: {len(finished)} keys already in {output_file}, {len(requeued)} re-queued')
+    return finished, requeued
+
+
+def resume_parquet_keys(output_dir, key_column, result_columns, retry_empty=False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parts = sorted(glob.glob(os.path.join(output_dir, 'part-*.parquet')))
+    if not parts:
+        return set(), set()
+
+    table = pa.concat_tables(pq.read_table(part) for part in parts)
+    rows = table.to_pylist()
+    finished, requeued = split_finished(rows, key_column, result_columns, retry_empty)
+
+    if requeued:
+        kept = pa.Table.from_pylist([row for row in rows if str(row[key_column]) not in requeued], schema=table.schema)
+        tmp_file = os.path.join(output_dir, 'compacted.tmp')
+        pq.write_table(kept, tmp_file, compression='zstd')
+        for part in parts:
+            os.remove(part)
+        os.replace(tmp_file, os.path.join(output_dir, 'part-00000.parquet'))
+
+    logging.info(f'Resume: {len(finished)} keys already in {output_dir}, {len(requeued)} re-queued')
+    return finished, requeued
+
+
+class Checkpoint:
+    """Side-car file listing the keys that have been written, one per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.keys = {line.rstrip('\n') for line in f if line.strip()}
+        self._file = open(path, 'a')
+
+    def __contains__(self, key):
+        return str(key) in self.keys
+
+    def add(self, key):
+        key = str(key)
+        self.keys.add(key)
+        self._file.write(key + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
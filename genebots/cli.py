@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse, logging, os
+from collections import OrderedDict
+
+from genebots.bench import CRAWLERS, StandInServer, bench
+from genebots.context import RunContext, add_common_args
+from genebots.core import DRIVER_PATH, setup_logging
+from genebots.inputs import read_column
+from genebots.planner import normalize_rsid
+from genebots.refsnp import REFSNP_URL
+from genebots.sources import SOURCES
+from genebots.workers import run_ordered
+from genebots.workqueue import STATES, queue_status
+
+# Input columns tried, in order, when --column is not given
+RSID_COLUMNS = ['rs ID', '#Uploaded_variation', 'rsID', 'rsid', 'SNP', 'snp']
+
+
+def read_keys(path, column=None, window=100000):
+    """Stream the normalized rsIDs of the input in order, skipping repeats among the last `window` distinct ones."""
+    seen = OrderedDict()
+    for value in read_column(path, column, RSID_COLUMNS):
+        if not value.strip():
+            continue
+        key = normalize_rsid(value)
+        if key in seen:
+            seen.move_to_end(key)
+            continue
+        seen[key] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        yield key
+
+
+def join_values(values):
+    """Collapse one column of a multi-row result into a single cell, e.g. 'A|G'."""
+    if all(value is None for value in values):
+        return None
+    if len(values) == 1:
+        return values[0]
+    return '|'.join('' if value is None else str(value) for value in values)
+
+
+def joined_row(rsid, sources, results):
+    row = [rsid]
+    for source in sources:
+        rows = results[source.name]
+        row.extend(join_values([values[i] for values in rows]) for i in range(len(source.columns)))
+    return row
+
+
+def source_options(args):
+    options = {
+        'dbsnp': {'engine': args.dbsnp_engine, 'refsnp_url': args.refsnp_url,
+                  'fallback': args.fallback, 'maxsize': args.workers},
+        'taiwanview': {'engine': args.taiwanview_engine, 'fallback': args.fallback, 'maxsize': args.workers},
+        'vietnamese': {'engine': args.vietnamese_engine, 'fallback': args.fallback, 'maxsize': args.workers},
+    }
+    for value in args.base_url or []:
+        name, _, url = value.partition('=')
+        options.setdefault(name, {})['base_url'] = url
+    for value in args.replay_url or []:
+        name, _, url = value.partition('=')
+        options.setdefault(name, {})['replay_url'] = url
+    return options
+
+
+def run(args):
+    names = [name.strip() for name in args.sources.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown:
+        raise SystemExit(f'Unknown source(s): {", ".join(unknown)}. Available: {", ".join(SOURCES)}')
+    options = source_options(args)
+    missing = [name for name in ('taiwanview', 'vietnamese') if name in names and options[name]['engine'] == 'http' and not options[name].get('replay_url')]
+    if missing:
+        raise SystemExit(f'--{missing[0]}-engine http needs --replay-url {missing[0]}=URL, the URL its search form submits to')
+
+    work_dir = os.getcwd()
+    log_time = setup_logging(work_dir, 'genebots_run')
+
+    keys = read_keys(args.input, args.column, args.dedup_window)
+    logging.info(f'rsIDs from {args.input} x {len(names)} sources: {", ".join(names)}')
+
+    # 所有網站共用同一組瀏覽器與每個網站各自的並行上限
+    lean_source = names[0] if len(names) == 1 else 'shared'
+    with RunContext(args, 'genebots_run', work_dir, log_time, lean_source=lean_source, screenshot_name='run', driver_path=args.driver_path) as run:
+        sources = [run.source(SOURCES[name], **options.get(name, {})) for name in names]
+        run.prewarm([url for source in sources for url in source.prewarm_urls()])
+
+        # 每個網站各有一個重試佇列與斷路器
+        retries = {}
+        lookups = {}
+        for source in sources:
+            retries[source.name] = run.retry(source.base_url, source.name, failed=source.failed, empty=source.empty, key=lambda task: task[1])
+            lookups[source.name] = lambda task, source=source: source.lookup(task[0], task[1], run.cache)
+
+        def dispatch(task):
+            name = task[2].name
+            return retries[name].guard(lookups[name])(task)
+
+        columns = ['rsID'] + [f'{source.name}_{column}' for source in sources for column in source.columns]
+        sink = run.output(args.output, columns)
+
+        # 每個 rsID 依序派給所有網站；同一 rsID 的結果到齊後合併成一列
+        tasks = ((number, rsid, source) for number, rsid in enumerate(keys, 1) for source in sources)
+        results = {}
+        # 需重試的 rsID 依輸入順序保留，重試完再寫出
+        held = OrderedDict()
+
+        for task, rows, reason in run_ordered(dispatch, tasks, args.workers):
+            number, rsid, source = task
+            if reason:
+                retries[source.name].add(task, reason, rows)
+                held[rsid] = None
+            else:
+                results.setdefault(rsid, {})[source.name] = rows
+            if source is sources[-1] and rsid not in held:
+                sink.write([joined_row(rsid, sources, results.pop(rsid))], key=rsid)
+
+        for source in sources:
+            for task, rows, reason in retries[source.name].drain(lookups[source.name], args.workers):
+                results.setdefault(task[1], {})[source.name] = rows if not reason else rows or source.error_rows()
+        for rsid in held:
+            if rsid in results:
+                sink.write([joined_row(rsid, sources, results.pop(rsid))], key=rsid)
+
+
+def split_ints(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def run_bench(args):
+    setup_logging(os.getcwd(), 'genebots_bench')
+    crawlers = [name.strip() for name in args.crawlers.split(',') if name.strip()]
+    unknown = [name for name in crawlers if name not in CRAWLERS]
+    if unknown:
+        raise SystemExit(f"Unknown crawlers: {', '.join(unknown)} (choose from {', '.join(CRAWLERS)})")
+    bench(crawlers, split_ints(args.sizes), split_ints(args.workers), args.work_dir, latency=args.latency,
+          jitter=args.jitter, error_rate=args.error_rate, empty_rate=args.empty_rate, seed=args.seed,
+          max_wait=args.max_wait, timeout=args.timeout, report=args.report)
+
+
+def run_stand_in(args):
+    setup_logging(os.getcwd(), 'genebots_stand_in')
+    server = StandInServer(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           empty_rate=args.empty_rate, seed=args.seed)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+def run_queue_status(args):
+    status = queue_status(args.queue)
+    columns = ['job', 'rows', *STATES, 'expired', 'workers', 'sealed']
+    table = [[job, *(counts[column] for column in columns[1:])] for job, counts in status.items()]
+    widths = [max(len(str(value)) for value in column) for column in zip(columns, *table)]
+    for values in [columns, *table]:
+        print('  '.join(str(value).ljust(width) for value, width in zip(values, widths)))
+
+
+def add_stand_in_options(parser):
+    parser.add_argument('--latency', type=float, help='Seconds added to every result page, API and download response. Default=0', default=0.0)
+    parser.add_argument('--jitter', type=float, help='Random +/- seconds around --latency. Default=0', default=0.0)
+    parser.add_argument('--error-rate', type=float, help='Fraction of result responses answered with HTTP 503. Default=0', default=0.0)
+    parser.add_argument('--empty-rate', type=float, help='Fraction of keys without data. Default=0.1', default=0.1)
+    parser.add_argument('--seed', type=int, help='Seed for the injected latency and failures. Default=0', default=0)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='genebots', description='Shared crawler core for the selenium-genebots sources.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_run = commands.add_parser('run', help='Look every input rsID up in several sources in one pass and write one joined row per rsID.')
+    parser_run.add_argument('--sources', help=f'Comma-separated sources to query: {",".join(SOURCES)}. Default="dbsnp,taiwanview,vietnamese"', default=','.join(SOURCES))
+    parser_run.add_argument('--input', help='Input CSV/TSV (optionally .gz) with an rsID column. Default="./inputs/taiwanview_example.csv"', default='./inputs/taiwanview_example.csv')
+    parser_run.add_argument('--dedup-window', type=int, help='Skip an rsID repeated within the last N distinct rsIDs of the input. Default=100000', default=100000)
+    parser_run.add_argument('--column', help=f'Input column holding the rsIDs. Default=first of {", ".join(RSID_COLUMNS)}, else the first column', default=None)
+    parser_run.add_argument('--output', help='Output file path, .csv or .parquet. Default="./outputs/genebots_run_output.csv"', default='./outputs/genebots_run_output.csv')
+    parser_run.add_argument('--base-url', action='append', help='Point one source at another server, as NAME=URL (repeatable), e.g. "taiwanview=http://127.0.0.1:8800/taiwanview/variant.php"', default=None)
+    parser_run.add_argument('--driver-path', help=f'chromedriver path. Default="{DRIVER_PATH}"', default=DRIVER_PATH)
+    parser_run.add_argument('--warm-form', action='store_true', help='Reuse the TaiwanView and Vietnamese search forms within a browser session')
+    parser_run.add_argument('--dbsnp-engine', choices=['browser', 'http'], help='Look dbSNP up in the web page or the refsnp JSON API. Default="browser"', default='browser')
+    parser_run.add_argument('--refsnp-url', help=f'refsnp API base URL. Default="{REFSNP_URL}"', default=REFSNP_URL)
+    parser_run.add_argument('--taiwanview-engine', choices=['browser', 'http'], help='Fill the TaiwanView form in Chrome or replay its search request over HTTP. Default="browser"', default='browser')
+    parser_run.add_argument('--vietnamese-engine', choices=['browser', 'http'], help='Fill the genomes.vn form in Chrome or replay its search request over HTTP. Default="browser"', default='browser')
+    parser_run.add_argument('--replay-url', action='append', help='With --taiwanview-engine or --vietnamese-engine http, the URL that source\'s search form submits to, as NAME=URL (repeatable), copied from the browser network panel. Required for each http form engine', default=None)
+    parser_run.add_argument('--no-fallback', dest='fallback', action='store_false', help='With an http engine, do not fall back to the browser for rsIDs the API or replayed request cannot resolve')
+    add_common_args(parser_run, './outputs/run_{source}_failures.json', noun='lookups', dedup=False, resume=False)
+    parser_run.set_defaults(func=run)
+
+    parser_bench = commands.add_parser('bench', help='Run each crawler end to end against a local stand-in server and report rows/sec, p50/p95 lookup latency and peak RSS.')
+    parser_bench.add_argument('--crawlers', help=f'Comma-separated crawlers to benchmark: {",".join(CRAWLERS)}. Default="taiwanview,vietnamese,dbsnp"', default='taiwanview,vietnamese,dbsnp')
+    parser_bench.add_argument('--sizes', help='Comma-separated input sizes (rows). Default="10,50"', default='10,50')
+    parser_bench.add_argument('--workers', help='Comma-separated worker counts. Default="1,2"', default='1,2')
+    parser_bench.add_argument('--work-dir', help='Directory for generated inputs, outputs, logs and metrics of every run. Default="./outputs/bench"', default='./outputs/bench')
+    parser_bench.add_argument('--max-wait', type=float, help='--max-wait passed to each crawler. Default=30', default=30)
+    parser_bench.add_argument('--timeout', type=float, help='Kill a crawler run after this many seconds. Default=no limit', default=None)
+    parser_bench.add_argument('--report', help='Also write the results table to this .csv or .json file. Default=off', default=None)
+    add_stand_in_options(parser_bench)
+    parser_bench.set_defaults(func=run_bench)
+
+    parser_stand_in = commands.add_parser('stand-in', help='Serve the benchmark stand-in sites until interrupted, for running a crawler by hand with --base-url.')
+    parser_stand_in.add_argument('--host', help='Address to bind. Default="127.0.0.1"', default='127.0.0.1')
+    parser_stand_in.add_argument('--port', type=int, help='Port to listen on. Default=8800', default=8800)
+    add_stand_in_options(parser_stand_in)
+    parser_stand_in.set_defaults(func=run_stand_in)
+
+    parser_queue = commands.add_parser('queue-status', help='Show the tasks per state, expired leases and active workers of each job in a --queue file.')
+    parser_queue.add_argument('queue', help='Queue file passed to the crawlers with --queue')
+    parser_queue.set_defaults(func=run_queue_status)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
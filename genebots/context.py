@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import tempfile
+
+from genebots.cache import DAY, ResultCache
+from genebots.checkpoint import Checkpoint, resume_keys
+from genebots.core import DRIVER_PATH, init_driver
+from genebots.driver_pool import DriverPool
+from genebots.metrics import METRICS
+from genebots.planner import Deduplicator
+from genebots.profiles import ProfileManager
+from genebots.retry import CircuitBreaker, RetryQueue
+from genebots.screenshots import POLICIES, ScreenshotWriter, rotate_screenshot_dirs
+from genebots.sink import OutputSink
+from genebots.waits import LATENCY
+from genebots.workers import HostLimiter
+from genebots.workqueue import WorkQueue
+
+
+def add_common_args(parser, failure_manifest, noun='rsIDs', recycle_after=50, rows=True, dedup=True, resume=True):
+    """Options shared by the crawler scripts and `genebots run`: browsers, limits, screenshots, retries and metrics.
+
+    `rows` adds the output buffer and result cache options, `dedup` the
+    --dedup-window and `resume` the --resume/--checkpoint options of the
+    rsID crawlers; ClinVar and `genebots run` define their own.
+    """
+    if dedup:
+        parser.add_argument('--dedup-window', type=int, help=f'Remember the results of the last N distinct {noun} to serve repeated rows without a new lookup. Default=100000', default=100000)
+    if rows:
+        parser.add_argument('--flush-rows', type=int, help='Write buffered output every N rows. Default=100', default=100)
+        parser.add_argument('--flush-interval', type=float, help='Write buffered output at least every N seconds. Default=10', default=10)
+    parser.add_argument('--recycle-after', type=int, help=f'Restart a browser after this many {noun}. Default={recycle_after}', default=recycle_after)
+    parser.add_argument('--workers', type=int, help='Number of parallel browser workers. Default=1', default=1)
+    parser.add_argument('--max-per-host', type=int, help='Max concurrent lookups against one host (the ceiling with --adaptive). Default=--workers', default=None)
+    parser.add_argument('--adaptive', action='store_true', help='Start at one lookup per host and raise or halve the limit from observed latency, errors, timeouts and empty pages')
+    parser.add_argument('--host-rate', type=float, help='Max lookups per second against one host, spaced evenly. Default=no limit (3 for the refsnp API)', default=None)
+    parser.add_argument('--browser-profile', choices=['default', 'lean'], help='"lean" blocks images, fonts and trackers and returns once the DOM is ready. Default="default"', default='default')
+    parser.add_argument('--profile-dir', help='Keep one persistent Chrome profile (HTTP disk cache, cookies) per worker under this directory, e.g. "./profiles", so static assets are loaded from disk. Default=fresh profile per session', default=None)
+    parser.add_argument('--profile-max-mb', type=int, help='With --profile-dir, delete and restart a profile that grew past this size when its browser quits. Default=500', default=500)
+    parser.add_argument('--prewarm', action='store_true', help='Start every browser at the beginning of the run and load the search page once to fill its cache')
+    parser.add_argument('--screenshots', choices=POLICIES, help='When to take screenshots: always, on-failure, sampled (1 in --screenshot-sample rows) or off. Default="always"', default='always')
+    parser.add_argument('--screenshot-sample', type=int, help='With --screenshots sampled, keep screenshots for 1 in N rows. Default=10', default=10)
+    parser.add_argument('--screenshot-quality', type=int, help='Save JPEG screenshots at this quality (1-100) instead of PNG. Default=PNG', default=None)
+    parser.add_argument('--screenshot-max-mb', type=int, help='Delete the oldest screenshot directories when screenshots/ grows past this size. Default=no limit', default=None)
+    if rows:
+        parser.add_argument('--cache', help='SQLite result cache path shared across runs and crawlers, e.g. "./cache/results.sqlite". Default=off', default=None)
+        parser.add_argument('--cache-ttl', type=float, help='Days a cached result stays valid. Default=source-specific', default=None)
+        parser.add_argument('--cache-max-entries', type=int, help='Evict the least recently used results once the cache holds more than N entries. Default=1000000', default=1000000)
+    if resume:
+        parser.add_argument('--resume', action='store_true', help='Skip input rows already in the output and re-run rows that errored')
+        parser.add_argument('--retry-empty', action='store_true', help='With --resume, also re-run rows that returned no data')
+        parser.add_argument('--checkpoint', help='Side-car file recording finished keys, e.g. "./outputs/run.checkpoint". Default=off', default=None)
+    parser.add_argument('--max-wait', type=float, help='Upper bound in seconds for waiting on a page; the actual timeout adapts to recent page latencies. Default=30', default=30)
+    parser.add_argument('--retries', type=int, help='Retry failed lookups up to N more times at the end of the run (exponential backoff with jitter). Default=2', default=2)
+    parser.add_argument('--retry-delay', type=float, help='Seconds before the first retry round; doubles every round. Default=5', default=5)
+    parser.add_argument('--breaker-threshold', type=int, help='Pause lookups against a site after N consecutive failures. Default=5', default=5)
+    if '{source}' in failure_manifest:
+        parser.add_argument('--failure-manifest', help=f'Failure manifest per source; "{{source}}" is replaced by the source name. Default="{failure_manifest}"', default=failure_manifest)
+    else:
+        parser.add_argument('--failure-manifest', help=f'JSON file listing the keys that still failed and those without results. Default="{failure_manifest}"', default=failure_manifest)
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics (per-stage timings, result/error/retry counts, rows per minute) on this port at /metrics. Default=off', default=None)
+    parser.add_argument('--metrics-file', help='Rewrite a JSON metrics snapshot to this path every --metrics-interval seconds, e.g. "./outputs/metrics.json". Default=off', default=None)
+    parser.add_argument('--metrics-interval', type=float, help='Seconds between --metrics-file snapshots. Default=30', default=30)
+
+
+def add_replay_args(parser):
+    """--engine and form options of the crawlers that fill a search form or replay its request (TaiwanView, genomes.vn)."""
+    parser.add_argument('--engine', choices=['browser', 'http'], help='Fill the search form in Chrome, or replay its search request over HTTP (aiohttp, keep-alive) and use Chrome only when the response does not match. Default="browser"', default='browser')
+    parser.add_argument('--replay-url', help='URL the search form submits to, copied from the browser network panel. Required with --engine http', default=None)
+    parser.add_argument('--replay-method', choices=['GET', 'POST'], help='HTTP method of the replayed search request. Default="GET"', default='GET')
+    parser.add_argument('--no-fallback', dest='fallback', action='store_false', help='With --engine http, count unexpected responses as errors instead of falling back to the browser')
+    parser.add_argument('--warm-form', action='store_true', help='Set up the search form once per browser session and only replace the query for later lookups (reloads when the form state is lost)')
+
+
+def check_replay_args(parser, args):
+    """Exit with a usage error when --engine http is given without --replay-url."""
+    if args.engine == 'http' and not args.replay_url:
+        parser.error('--engine http needs --replay-url, the URL the search form submits to (see the browser network panel)')
+
+
+def add_queue_args(parser, job):
+    """--queue options of the crawlers that can share a `WorkQueue` across processes or containers."""
+    parser.add_argument('--queue', help=f'Shared SQLite work queue, e.g. "./outputs/{job}.queue". Every process or container started with it claims batches of rsIDs until the job is done; the last one writes --output. Default=off', default=None)
+    parser.add_argument('--queue-job', help=f'Job name inside --queue, so one queue file can hold several inputs. Default="{job}"', default=job)
+    parser.add_argument('--enqueue', action='store_true', help='With --queue, add the rows of --input to the job first; run it once per job, repeating it adds nothing')
+    parser.add_argument('--batch-size', type=int, help='With --queue, rsIDs claimed per lease. Default=50', default=50)
+    parser.add_argument('--lease', type=float, help='With --queue, seconds a claimed batch stays reserved without a heartbeat before other workers take it over. Default=300', default=300)
+    parser.add_argument('--queue-export', action='store_true', help='With --queue, only rewrite --output and the failure manifest of a finished job')
+
+
+class RunContext:
+    """Screenshots, browser pool, host limiter, metrics, cache, checkpoint, sink and retry queues of one run.
+
+    Built from the `add_common_args` options. Used as a context manager it
+    closes everything on exit, first the callbacks passed to `on_close`, then
+    writes the failure manifests and the metrics summary.
+    """
+
+    def __init__(self, args, name, work_dir, log_time, lean_source=None, screenshot_name=None, driver_path=DRIVER_PATH, download_dir=None):
+        self.args = args
+        self.name = name
+        self._closing = []
+        self._manifests = []
+        self.sink = None
+        self.queue = None
+
+        self.screenshot_root = f'{work_dir}/screenshots'
+        self.screenshot_dir = f'{self.screenshot_root}/{log_time}_{screenshot_name or name}_screenshot'
+        self.screenshots = ScreenshotWriter(self.screenshot_dir, args.screenshots, args.screenshot_sample, args.screenshot_quality)
+        self._rotate_screenshots()
+
+        # 持久化 profile：每個 worker 沿用自己的磁碟快取與 cookies，超過大小上限時輪替
+        self.profiles = ProfileManager(args.profile_dir, name, args.profile_max_mb * 1024 * 1024) if args.profile_dir else None
+        lean_source = (lean_source or name) if args.browser_profile == 'lean' else None
+
+        def driver(profile_args=None):
+            # 每個 browser session 使用自己的下載資料夾，避免多個 worker 互相覆蓋
+            session_dir = tempfile.mkdtemp(prefix='session-', dir=download_dir) if download_dir else None
+            return init_driver(driver_path, session_dir, lean_source=lean_source, profile_args=profile_args)
+
+        self.pool = DriverPool(driver, size=args.workers, max_pages=args.recycle_after, profiles=self.profiles)
+        # 每個網站的並行上限；--adaptive 依延遲與錯誤率自動調整
+        self.limiter = HostLimiter(args.max_per_host or args.workers, rate=args.host_rate, adaptive=args.adaptive)
+        LATENCY.max_wait = args.max_wait
+        # 各階段耗時與查詢結果計數：Prometheus 端點或定期寫出的 JSON
+        self.exporter = METRICS.export(args.metrics_port, args.metrics_file, args.metrics_interval)
+
+        self.cache = None
+        if getattr(args, 'cache', None):
+            self.cache = ResultCache(args.cache, max_entries=args.cache_max_entries)
+
+        self.checkpoint = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rotate_screenshots(self):
+        if self.args.screenshot_max_mb:
+            rotate_screenshot_dirs(self.screenshot_root, self.args.screenshot_max_mb * 1024 * 1024, keep=self.screenshot_dir)
+
+    def on_close(self, callback):
+        """Run `callback` first when the run closes, e.g. an HTTP client's close or a summary."""
+        self._closing.append(callback)
+        return callback
+
+    def prewarm(self, urls):
+        if self.args.prewarm and urls:
+            self.pool.prewarm(urls)
+
+    def cache_ttls(self, *sources):
+        """Apply --cache-ttl to the given cache sources."""
+        if self.cache and self.args.cache_ttl:
+            self.cache.ttls.update({source: self.args.cache_ttl * DAY for source in sources})
+
+    def source(self, cls, **options):
+        """A `genebots.sources` plugin on this run's pool, limiter and screenshots; closed with the run."""
+        source = cls(self.pool, self.limiter, self.screenshots, warm=getattr(self.args, 'warm_form', False), **options)
+        self.on_close(source.close)
+        self.cache_ttls(source.name)
+        return source
+
+    def work_queue(self, rows, key):
+        """The --queue job, with the rows of --input added when --enqueue is given; None without --queue."""
+        if not getattr(self.args, 'queue', None):
+            return None
+        self.queue = WorkQueue(self.args.queue, self.args.queue_job, lease=self.args.lease,
+                               max_attempts=self.args.retries + 1, base_delay=self.args.retry_delay)
+        if self.args.enqueue:
+            self.queue.enqueue(rows, key=key)
+        return self.queue
+
+    def resume(self, rows, output_file, key_column, result_columns, key=lambda row: str(row[0])):
+        """Open --checkpoint and, with --resume, drop the rows whose key is already finished; error rows are re-run."""
+        if self.queue:
+            return rows
+        self.checkpoint = Checkpoint(self.args.checkpoint) if self.args.checkpoint else None
+        if not self.args.resume:
+            return rows
+        finished, requeued = resume_keys(output_file, key_column, result_columns, self.args.retry_empty)
+        if self.checkpoint:
+            finished |= self.checkpoint.keys - requeued
+        return (row for row in rows if key(row) not in finished)
+
+    def output(self, path, columns, types=None):
+        """Buffered CSV or Parquet output, recording finished keys in the checkpoint."""
+        self.sink = OutputSink(path, columns, types=types, checkpoint=self.checkpoint,
+                               flush_rows=self.args.flush_rows, flush_interval=self.args.flush_interval)
+        return self.sink
+
+    def retry(self, host, source, failed, empty=None, key=str, manifest=True):
+        """A RetryQueue with its own circuit breaker; its failure manifest is written on close unless `manifest` is False."""
+        retry = RetryQueue(host, failed=failed, empty=empty, key=key, max_attempts=self.args.retries + 1,
+                           base_delay=self.args.retry_delay, breaker=CircuitBreaker(self.args.breaker_threshold), source=source)
+        if manifest:
+            self._manifests.append(retry)
+        return retry
+
+    def dedup(self, lookup, key, fan_out, failed=None):
+        """Look every key up once within the last --dedup-window keys; the summary is logged on close."""
+        dedup = Deduplicator(lookup, key=key, fan_out=fan_out, window=self.args.dedup_window, failed=failed)
+        self.on_close(dedup.log_summary)
+        return dedup
+
+    def close(self):
+        for callback in self._closing:
+            callback()
+        if self.queue:
+            self.queue.log_state()
+            self.queue.close()
+        self.pool.close()
+        if self.profiles:
+            self.profiles.log_usage()
+        LATENCY.summary()
+        self.limiter.log_state()
+        self.screenshots.close()
+        self._rotate_screenshots()
+        if self.cache:
+            self.cache.close()
+        if self.sink:
+            self.sink.close()
+        if self.checkpoint:
+            self.checkpoint.close()
+        for retry in self._manifests:
+            retry.write_manifest(self.args.failure_manifest.replace('{source}', retry.source), retry.source)
+        METRICS.summary()
+        self.exporter.close()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, os, tempfile, threading
+from datetime import datetime
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+from genebots.browser import apply_lean_options, block_resources
+from genebots.metrics import METRICS
+
+DRIVER_PATH = './chromedriver-linux64/chromedriver'
+
+_step_counter = 0
+_step_lock = threading.Lock()
+
+
+def next_step(tag_name):
+    """Prefix a screenshot name with a run-wide step number, e.g. '07-rs123_result.png'."""
+    global _step_counter
+    with _step_lock:
+        _step_counter += 1
+        step = _step_counter
+
+    return f'{step:02d}-{tag_name}'
+
+
+def init_driver(driverpath, download_dir=None, implicit_wait=0, lean_source=None, profile_args=None):
+    logging.info('Initializing driver')
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
+    options.add_argument('--disable-dev-shm-usage')
+    # 持久化 profile（ProfileManager.chrome_args）：沿用磁碟快取與 cookies
+    for arg in profile_args or []:
+        options.add_argument(arg)
+
+    if download_dir is None:
+        download_dir = tempfile.gettempdir()
+
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True
+    }
+
+    # lean profile: 不載入圖片、字型、追蹤程式，頁面 DOM 就緒即返回
+    if lean_source:
+        prefs.update(apply_lean_options(options))
+
+    service = Service(driverpath)
+    options.add_experimental_option("prefs", prefs)
+    with METRICS.timer('driver_start'):
+        driver = webdriver.Chrome(service=service, options=options)
+        driver.download_dir = download_dir
+        if lean_source:
+            block_resources(driver, lean_source)
+    driver.implicitly_wait(implicit_wait)
+    logging.info('Driver initialized successfully')
+
+    return driver
+
+
+def setup_logging(script_dir, name):
+    """Log to stderr and logs/<name>_<date>.log; returns the date string used for log and screenshot names."""
+    os.makedirs(f'{script_dir}/logs', exist_ok=True)
+    log_time = datetime.now().strftime("%Y-%m-%d")
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S',
+                        level=logging.INFO,
+                        handlers=[
+                            logging.FileHandler(f'{script_dir}/logs/{name}_{log_time}.log', mode='a'),
+                            logging.StreamHandler()
+                        ])
+    return log_time
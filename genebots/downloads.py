@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, os, time
+from glob import glob
+
+
+def wait_for_download(download_dir, pattern='*.txt', timeout=300, settle=1.0, poll_interval=0.5):
+    """Wait until Chrome has finished writing a file into `download_dir`.
+
+    A download counts as complete once no `.crdownload` partial file is left
+    and the newest file matching `pattern` has kept the same size for
+    `settle` seconds. Returns the file path, or None if `timeout` expires.
+    """
+    deadline = time.monotonic() + timeout
+    last_path, last_size, stable_since = None, None, None
+
+    while time.monotonic() < deadline:
+        partial = glob(os.path.join(download_dir, '*.crdownload'))
+        files = glob(os.path.join(download_dir, pattern))
+
+        if files and not partial:
+            path = max(files, key=os.path.getmtime)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+
+            if path == last_path and size is not None and size == last_size:
+                if time.monotonic() - stable_since >= settle:
+                    return path
+            else:
+                last_path, last_size, stable_since = path, size, time.monotonic()
+        else:
+            last_path, last_size, stable_since = None, None, None
+
+        time.sleep(poll_interval)
+
+    logging.warning(f'Download in {download_dir} not finished after {timeout}s')
+    return None
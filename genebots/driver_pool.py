@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from genebots.metrics import METRICS
+
+
+class DriverPool:
+    """Keep warm WebDriver sessions and hand them out to the row loops.
+
+    `factory` is the script's own `init_driver` (wrapped in a lambda), so each
+    crawler keeps its Chrome options. A session is health-checked before it is
+    handed out and recycled after `max_pages` lookups or when it has crashed.
+    With `profiles` (a ProfileManager) `factory` takes the Chrome arguments of
+    a leased persistent profile, which is handed back when the session quits.
+    """
+
+    def __init__(self, factory, size=1, max_pages=50, profiles=None):
+        self.factory = profiles.factory(factory) if profiles else factory
+        self.size = size
+        self.max_pages = max_pages
+        self.profiles = profiles
+        self._idle = []
+        self._pages = {}
+        self._created = 0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self._cond:
+            self._pages.pop(id(driver), None)
+            self._created -= 1
+            self._cond.notify()
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f'Driver quit failed: {e}')
+        if self.profiles:
+            self.profiles.release(getattr(driver, 'profile_dir', None))
+
+    def acquire(self):
+        while True:
+            driver = None
+            with self._cond:
+                while not self._idle and self._created >= self.size:
+                    self._cond.wait()
+                if self._idle:
+                    driver = self._idle.pop()
+                else:
+                    self._created += 1
+
+            if driver is None:
+                try:
+                    driver = self.factory()
+                except Exception:
+                    with self._cond:
+                        self._created -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pages[id(driver)] = 0
+                return driver
+
+            if self.is_healthy(driver):
+                return driver
+            logging.warning('Driver failed health check, recycling')
+            self._discard(driver)
+
+    def release(self, driver, broken=False):
+        if driver is None:
+            return
+        with self._cond:
+            pages = self._pages.get(id(driver), 0) + 1
+            self._pages[id(driver)] = pages
+            if not broken and pages < self.max_pages:
+                self._idle.append(driver)
+                self._cond.notify()
+                return
+
+        logging.info(f'Recycling driver after {pages} pages')
+        self._discard(driver)
+
+    def prewarm(self, urls):
+        """Start every session now and load `urls` once in each, so the first lookups find a warm cache."""
+        def warm(index):
+            driver = None
+            try:
+                driver = self.acquire()
+                for url in urls:
+                    driver.get(url)
+            except Exception as e:
+                logging.warning(f'Pre-warm failed: {e}')
+            return driver
+
+        with METRICS.timer('prewarm'):
+            with ThreadPoolExecutor(self.size) as executor:
+                drivers = list(executor.map(warm, range(self.size)))
+        for driver in drivers:
+            self.release(driver)
+        logging.info(f'Pre-warmed {sum(driver is not None for driver in drivers)} browser(s) with {len(urls)} page(s)')
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+        logging.info('Driver pool closed')
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json, logging
+from contextlib import nullcontext
+
+import urllib3
+
+from genebots.workers import Slot, http_outcome
+
+EUTILS_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+
+
+class EUtilsClient:
+    """Minimal NCBI E-utilities client on a pooled keep-alive HTTP connection.
+
+    `base_url` can point at a local stand-in server for testing. urllib3 is
+    already installed as a selenium dependency.
+    """
+
+    def __init__(self, base_url=EUTILS_URL, api_key=None, batch_size=200, page_size=10000, maxsize=4, timeout=30, limiter=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.limiter = limiter
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.page_size = page_size
+        retries = urllib3.Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+        self.http = urllib3.PoolManager(maxsize=maxsize, retries=retries, timeout=timeout)
+
+    def _get(self, endpoint, **params):
+        params['retmode'] = 'json'
+        if self.api_key:
+            params['api_key'] = self.api_key
+        url = self.base_url + endpoint
+        with self.limiter.slot(url) if self.limiter else nullcontext(Slot()) as slot:
+            response = self.http.request('GET', url, fields=params)
+            slot.outcome = http_outcome(response)
+        if response.status != 200:
+            raise RuntimeError(f'{endpoint} returned HTTP {response.status}')
+        return json.loads(response.data.decode('utf-8'))
+
+    def search(self, db, term, sort='relevance'):
+        """Return every UID matching `term`, in `sort` order."""
+        ids, retstart = [], 0
+        while True:
+            result = self._get('esearch.fcgi', db=db, term=term, sort=sort,
+                               retstart=retstart, retmax=self.page_size)['esearchresult']
+            page = result.get('idlist', [])
+            ids.extend(page)
+            retstart += len(page)
+            if not page or retstart >= int(result.get('count', 0)):
+                break
+        logging.info(f'esearch {db} "{term}": {len(ids)} ids')
+        return ids
+
+    def summaries(self, db, ids):
+        """Yield esummary documents for `ids`, fetched `batch_size` at a time."""
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            result = self._get('esummary.fcgi', db=db, id=','.join(batch))['result']
+            for uid in result.get('uids', batch):
+                if uid in result:
+                    yield result[uid]
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Collect every row matched by the XPath in one WebDriver command instead of one per cell
+TABLE_ROWS_JS = """
+const snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const rows = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const row = snapshot.snapshotItem(i);
+    rows.push({
+        th: Array.from(row.querySelectorAll(':scope > th'), cell => cell.innerText),
+        td: Array.from(row.querySelectorAll(':scope > td'), cell => cell.innerText),
+    });
+}
+return rows;
+"""
+
+
+def table_rows(driver, xpath):
+    """Return the rows matched by `xpath` as dicts of `th` and `td` cell texts."""
+    return driver.execute_script(TABLE_ROWS_JS, xpath) or []
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+# A page-level mark disappears whenever the page is navigated away from or reloaded
+MARK_FORM_JS = "window.__genebotsForm = arguments[0];"
+FORM_MARK_JS = "return window.__genebotsForm || null;"
+
+CLEAR_NODES_JS = """
+const snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const node = snapshot.snapshotItem(i);
+    if (node.parentElement) node.parentElement.setAttribute('data-cleared', '');
+    node.remove();
+}
+return snapshot.snapshotLength;
+"""
+
+
+def warm_form(driver, name, setup, check=None):
+    """Configure a search form once per browser session and reuse it for later queries.
+
+    `setup(driver)` loads the page and sets the fixed form fields. It runs
+    again only when the form state was lost: `check(driver)` returns False
+    (or raises), or, without a `check`, the page no longer carries the mark
+    left by the last setup because it was navigated away or reloaded.
+    Returns True when the form was (re)initialized.
+    """
+    try:
+        if check is not None:
+            ready = check(driver)
+        else:
+            ready = driver.execute_script(FORM_MARK_JS) == name
+        if ready:
+            return False
+    except Exception:
+        pass
+    logging.info(f'{name}: initializing search form')
+    setup(driver)
+    driver.execute_script(MARK_FORM_JS, name)
+    return True
+
+
+def clear_nodes(driver, xpath):
+    """Remove the nodes matched by `xpath`, so results of the previous query cannot be read again.
+
+    Their parents get a `data-cleared` attribute, so a wait condition can
+    tell the emptied container from one the next query renders empty.
+    """
+    return driver.execute_script(CLEAR_NODES_JS, xpath)
+
+
+SELECTED_TEXTS_JS = """
+const state = {};
+for (const id of arguments[0]) {
+    const select = document.getElementById(id);
+    state[id] = select && select.selectedIndex >= 0 ? select.options[select.selectedIndex].text : null;
+}
+return state;
+"""
+
+
+def selected_texts(driver, ids):
+    """Visible text of the selected option of each `<select>` id, read in one command."""
+    return driver.execute_script(SELECTED_TEXTS_JS, list(ids))
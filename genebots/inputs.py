@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv, gzip, logging
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_text(path):
+    """Open a plain or gzip-compressed text file for streaming; bgzip (VEP, tabix) is multi-member gzip."""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def read_header(f):
+    """Skip VEP `##` meta lines; return the header columns and the delimiter (tab if the header has one)."""
+    line = f.readline()
+    while line.startswith('##'):
+        line = f.readline()
+    delimiter = '\t' if '\t' in line else ','
+    return [name.strip() for name in next(csv.reader([line], delimiter=delimiter), [])], delimiter
+
+
+def read_rows(path, columns, row_number=None):
+    """Yield a tuple of `columns` for each data row of a CSV/TSV file (optionally gzip/bgzip), one at a time.
+
+    Only the current row is held in memory, so the workers pull rows as they
+    free up. `row_number` names a column filled with the 1-based row number
+    when the file does not have it, e.g. the `#` index for a bare VEP export.
+    """
+    with open_text(path) as f:
+        header, delimiter = read_header(f)
+        missing = [column for column in columns if column not in header and column != row_number]
+        if missing:
+            raise ValueError(f'{path}: no column(s) {", ".join(missing)} in header {header}')
+        indexes = [header.index(column) if column in header else None for column in columns]
+        logging.info(f'Streaming {", ".join(columns)} from {path}')
+
+        for number, record in enumerate(csv.reader(f, delimiter=delimiter), 1):
+            if not any(record):
+                continue
+            yield tuple(number if index is None else record[index] if index < len(record) else '' for index in indexes)
+
+
+def read_column(path, column=None, candidates=()):
+    """Yield one column of a CSV/TSV file: `column`, else the first of `candidates` present, else the first column."""
+    with open_text(path) as f:
+        header, _ = read_header(f)
+    if column is None:
+        column = next((name for name in candidates if name in header), header[0] if header else None)
+    for (value,) in read_rows(path, [column]):
+        yield value
+
+
+def read_lines(path):
+    """Yield the non-empty, stripped lines of a plain or gzip text file, e.g. the ClinVar disease list."""
+    with open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
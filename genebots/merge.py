@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv, glob, logging, os, sys
+
+csv.field_size_limit(sys.maxsize)
+
+
+def prefix_column(src_path, dest_path, name, value):
+    """Copy a tab-separated file to `dest_path`, line by line, with a leading `name` column set to `value`.
+
+    The destination is written under a temporary name and renamed when
+    complete; the source file is removed afterwards.
+    """
+    part_path = f'{dest_path}.part'
+    with open(src_path, 'r') as src, open(part_path, 'w') as dest:
+        header = src.readline()
+        dest.write(f"{name}\t{header.rstrip(chr(13) + chr(10))}\n")
+        for line in src:
+            dest.write(f"{value}\t{line}")
+    os.replace(part_path, dest_path)
+    os.remove(src_path)
+
+
+class MergedDataset:
+    """Append per-disease ClinVar tables into one Parquet dataset directory.
+
+    Tables are streamed into zstd-compressed part files of about
+    `batch_rows` rows, `chunk_rows` rows at a time; each chunk is one row
+    group sorted by (`Disease Name`, `Name`), so Parquet row-group statistics
+    can be used to look up a disease or a variation. A part is written under
+    a temporary name and renamed once complete, and a disease is never split
+    across parts, so its `on_merged` callback runs only once all its rows are
+    on disk; diseases already in the dataset are skipped. All columns are
+    strings, aligned to the columns of the first file that was merged.
+    """
+
+    def __init__(self, path, batch_rows=50000, sort_columns=('Disease Name', 'Name'), chunk_rows=10000):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.chunk_rows = chunk_rows
+        self.sort_columns = sort_columns
+        self.columns = None
+        self._rows = []
+        self._pending = []
+        self._writer = None
+        self._part_rows = 0
+        os.makedirs(path, exist_ok=True)
+        self._part = len(glob.glob(os.path.join(path, 'part-*.parquet')))
+        self._merged = set()
+        if self._part:
+            import pyarrow.parquet as pq
+            self.columns = pq.read_schema(sorted(glob.glob(os.path.join(path, 'part-*.parquet')))[0]).names
+            self._merged = self.diseases()
+
+    def diseases(self):
+        """Distinct `Disease Name` values already in the dataset."""
+        import pyarrow.parquet as pq
+
+        found = set()
+        for part in glob.glob(os.path.join(self.path, 'part-*.parquet')):
+            found.update(pq.read_table(part, columns=['Disease Name']).column(0).to_pylist())
+        return found
+
+    def add_file(self, tsv_path, disease=None, on_merged=None):
+        """Stream one disease table into the current part; `on_merged()` runs once the part is complete (at once if already merged)."""
+        if disease is not None and disease in self._merged:
+            logging.info(f'{disease} is already in {self.path}, not merging it again')
+            if on_merged:
+                on_merged()
+            return
+        with open(tsv_path, newline='') as f:
+            reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+            header = next(reader)
+            if self.columns is None:
+                self.columns = header
+            elif header != self.columns:
+                logging.warning(f'{tsv_path}: columns differ from the merged dataset, aligning by name')
+            positions = [header.index(column) if column in header else None for column in self.columns]
+            for row in reader:
+                self._rows.append([row[i] if i is not None and i < len(row) else None for i in positions])
+                if len(self._rows) >= self.chunk_rows:
+                    self._write_chunk()
+        self._pending.append((disease, on_merged))
+        # 只在疾病之間換 part，同一疾病不會跨 part
+        if self._part_rows + len(self._rows) >= self.batch_rows:
+            self.flush()
+
+    def _part_path(self):
+        return os.path.join(self.path, f'part-{self._part:05d}.parquet')
+
+    def _write_chunk(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        schema = pa.schema([(column, pa.string()) for column in self.columns])
+        table = pa.Table.from_pydict({column: [row[i] for row in self._rows] for i, column in enumerate(self.columns)}, schema=schema)
+        sort_keys = [(column, 'ascending') for column in self.sort_columns if column in self.columns]
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(f'{self._part_path()}.tmp', schema, compression='zstd')
+        self._writer.write_table(table, row_group_size=self.chunk_rows)
+        self._part_rows += len(self._rows)
+        self._rows = []
+
+    def flush(self):
+        """Finish the current part file, then run the callbacks of the diseases in it."""
+        self._write_chunk()
+        if self._writer is not None:
+            self._writer.close()
+            part_path = self._part_path()
+            os.replace(f'{part_path}.tmp', part_path)
+            logging.info(f'Merged {self._part_rows} rows into {part_path}')
+            self._part += 1
+            self._writer = None
+            self._part_rows = 0
+        # 資料寫入 part 檔後，才刪除 .txt 或記入 checkpoint；沒有資料列的疾病也要記入
+        pending, self._pending = self._pending, []
+        for disease, on_merged in pending:
+            self._merged.add(disease)
+            if on_merged:
+                on_merged()
+
+    def close(self):
+        self.flush()
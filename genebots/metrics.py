@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json, logging, os, threading, time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket bounds in seconds, from a table read to a slow ClinVar download
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Lookup outcomes counted by RetryQueue; 'result' and 'empty' count as finished rows
+OUTCOMES = ('result', 'empty', 'error', 'circuit_open')
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+class Histogram:
+    def __init__(self, window=1000):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+
+def labels(**values):
+    text = ','.join(f'{name}="{value}"' for name, value in values.items() if value is not None)
+    return f'{{{text}}}' if text else ''
+
+
+class Metrics:
+    """Stage timings and lookup counters for one run, shared by all threads.
+
+    Stages are timed per source with `timer(stage, source)` (or `observe`):
+    'driver_start', 'load', 'wait', 'extract', 'screenshot', 'write' and the
+    whole 'lookup'. `count(outcome, source)` records lookup outcomes and
+    retries. The registry is exported as Prometheus text (`prometheus()`)
+    or a JSON snapshot (`snapshot()`), and `summary()` logs a table.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._histograms = {}
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, source, seconds):
+        with self._lock:
+            key = (stage, source)
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, source=None):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, source, time.monotonic() - start)
+
+    def count(self, outcome, source=None, n=1):
+        with self._lock:
+            self._counters[(outcome, source)] += n
+
+    def rows_per_minute(self, source):
+        with self._lock:
+            rows = self._counters[('result', source)] + self._counters[('empty', source)]
+        minutes = (time.monotonic() - self.started) / 60
+        return rows / minutes if minutes > 0 else 0.0
+
+    def _copy(self):
+        with self._lock:
+            histograms = {key: (list(h.buckets), h.count, h.sum, list(h.recent)) for key, h in self._histograms.items()}
+            return histograms, Counter(self._counters)
+
+    def sources(self, counters):
+        return sorted({source for (outcome, source) in counters if source is not None})
+
+    def snapshot(self):
+        histograms, counters = self._copy()
+        return {
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_seconds': round(time.monotonic() - self.started, 1),
+            'stages': [{'stage': stage, 'source': source, 'count': count, 'sum': round(total, 3),
+                        'p50': percentile(recent, 50), 'p95': percentile(recent, 95)}
+                       for (stage, source), (buckets, count, total, recent) in sorted(histograms.items(), key=str)],
+            'lookups': {source: {outcome: counters[(outcome, source)] for outcome in OUTCOMES + ('retry',)}
+                        for source in self.sources(counters)},
+            'rows_per_minute': {source: round(self.rows_per_minute(source), 2) for source in self.sources(counters)},
+        }
+
+    def prometheus(self):
+        histograms, counters = self._copy()
+        lines = ['# HELP genebots_stage_seconds Time spent in each crawler stage.',
+                 '# TYPE genebots_stage_seconds histogram']
+        for (stage, source), (buckets, count, total, recent) in sorted(histograms.items(), key=str):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), buckets):
+                cumulative += n
+                lines.append(f'genebots_stage_seconds_bucket{labels(stage=stage, source=source, le=bound)} {cumulative}')
+            lines.append(f'genebots_stage_seconds_sum{labels(stage=stage, source=source)} {total:.6f}')
+            lines.append(f'genebots_stage_seconds_count{labels(stage=stage, source=source)} {count}')
+
+        lines += ['# HELP genebots_lookups_total Finished lookups by outcome.', '# TYPE genebots_lookups_total counter']
+        for source in self.sources(counters):
+            for outcome in OUTCOMES:
+                lines.append(f'genebots_lookups_total{labels(source=source, outcome=outcome)} {counters[(outcome, source)]}')
+        lines += ['# HELP genebots_retries_total Lookups sent again by the retry queue.', '# TYPE genebots_retries_total counter']
+        for source in self.sources(counters):
+            lines.append(f'genebots_retries_total{labels(source=source)} {counters[("retry", source)]}')
+        lines += ['# HELP genebots_rows_per_minute Finished lookups per minute since the run started.', '# TYPE genebots_rows_per_minute gauge']
+        for source in self.sources(counters):
+            lines.append(f'genebots_rows_per_minute{labels(source=source)} {self.rows_per_minute(source):.2f}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        snapshot = self.snapshot()
+        if not snapshot['stages'] and not snapshot['lookups']:
+            return
+        logging.info(f'Metrics after {snapshot["elapsed_seconds"]:.0f}s:')
+        logging.info(f'{"stage":<14}{"source":<18}{"n":>8}{"total s":>10}{"p50 s":>9}{"p95 s":>9}')
+        for stage in snapshot['stages']:
+            logging.info(f'{stage["stage"]:<14}{stage["source"] or "-":<18}{stage["count"]:>8}{stage["sum"]:>10.1f}'
+                         f'{stage["p50"] or 0:>9.2f}{stage["p95"] or 0:>9.2f}')
+        logging.info(f'{"source":<18}{"results":>9}{"empty":>8}{"errors":>8}{"circuit":>9}{"retries":>9}{"rows/min":>10}')
+        for source, counts in snapshot['lookups'].items():
+            logging.info(f'{source:<18}{counts["result"]:>9}{counts["empty"]:>8}{counts["error"]:>8}'
+                         f'{counts["circuit_open"]:>9}{counts["retry"]:>9}{snapshot["rows_per_minute"][source]:>10.1f}')
+
+    def write_json(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+    def export(self, port=None, path=None, interval=30.0):
+        return MetricsExporter(self, port, path, interval)
+
+
+class MetricsExporter:
+    """Serve `/metrics` in Prometheus text format on `port` and/or rewrite a JSON snapshot at `path` every `interval` seconds."""
+
+    def __init__(self, metrics, port=None, path=None, interval=30.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        if port:
+            self._server = ThreadingHTTPServer(('', port), self._handler())
+            threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+            logging.info(f'Metrics: serving Prometheus text on :{port}/metrics')
+        if path:
+            self._thread = threading.Thread(target=self._run, name='metrics-json', daemon=True)
+            self._thread.start()
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.metrics.write_json(self.path)
+            except Exception as e:
+                logging.warning(f'Metrics: could not write {self.path}: {e}')
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.metrics.write_json(self.path)
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+METRICS = Metrics()
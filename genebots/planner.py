@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+
+def normalize_rsid(value):
+    """`' RS123 '`, `'rs123'` and `'123'` all become `'rs123'`."""
+    key = str(value).strip().lower().replace(' ', '')
+    if key.isdigit():
+        key = f'rs{key}'
+    return key
+
+
+def normalize_region(chromosome, location):
+    """`('chrx', '100')` and `('X', 100.0)` both become `('X', 100)`."""
+    chromosome = str(chromosome).strip().upper()
+    if chromosome.startswith('CHR'):
+        chromosome = chromosome[3:]
+    return chromosome, int(float(location))
+
+
+def plan_windows(regions, max_span, max_positions):
+    """Merge normalized `(chromosome, position)` regions into query windows.
+
+    Regions are sorted by chromosome and position; a window grows while the
+    next position is on the same chromosome, within `max_span` bases of the
+    window start and the window holds fewer than `max_positions` positions.
+    Returns a list of `[chromosome, start, end, positions]`.
+    """
+    windows = []
+    for chromosome, position in sorted(set(regions)):
+        window = windows[-1] if windows else None
+        if window and window[0] == chromosome and position - window[1] <= max_span and len(window[3]) < max_positions:
+            window[2] = position
+            window[3].append(position)
+        else:
+            windows.append([chromosome, position, position, [position]])
+    logging.info(f'Plan: {len(set(regions))} unique regions in {len(windows)} windows')
+    return windows
+
+
+class Deduplicator:
+    """Crawl each normalized key once and fan the result out to every row that has it.
+
+    `keys` is the full list of normalized keys of the input (the plan); it is
+    used to report the saved lookups and to drop a shared result once its
+    last row has been served. Without `keys` the input is streamed: results
+    of the last `window` distinct keys are kept, so repeats that are close
+    together (e.g. one VEP line per transcript) are still looked up once and
+    memory stays bounded. Exceptions and results for which `failed(result)`
+    is true are not kept, so the retry round looks them up again.
+    `fan_out(row, result)` rewrites a result for another row with the same
+    key, e.g. to put back that row's own number.
+    """
+
+    def __init__(self, lookup, key, fan_out, keys=None, window=100000, failed=None):
+        self.lookup = lookup
+        self.failed = failed
+        self.key = key
+        self.fan_out = fan_out
+        self.window = window
+        self.remaining = Counter(keys) if keys is not None else None
+        self.rows = 0
+        self.lookups = 0
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        if keys is not None:
+            rows, unique = sum(self.remaining.values()), len(self.remaining)
+            logging.info(f'Plan: {rows} rows, {unique} unique lookups ({rows - unique} saved)')
+
+    def __call__(self, row):
+        key = self.key(row)
+        with self._lock:
+            self.rows += 1
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                self.lookups += 1
+                future = self._futures[key] = Future()
+            elif self.remaining is None:
+                self._futures.move_to_end(key)
+
+        if owner:
+            try:
+                future.set_result(self.lookup(row))
+            except Exception as e:
+                future.set_exception(e)
+
+        try:
+            return self.fan_out(row, future.result())
+        finally:
+            with self._lock:
+                if self.remaining is not None:
+                    self.remaining[key] -= 1
+                    if self.remaining[key] <= 0:
+                        self._futures.pop(key, None)
+                else:
+                    if owner and (future.exception() or (self.failed and self.failed(future.result()))):
+                        self._futures.pop(key, None)
+                    while len(self._futures) > self.window:
+                        self._futures.popitem(last=False)
+
+    def log_summary(self):
+        logging.info(f'Plan: {self.rows} rows, {self.lookups} lookups ({self.rows - self.lookups} saved by deduplication)')
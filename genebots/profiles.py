@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, os, shutil, socket, threading
+
+# Chrome 在 user-data-dir 內留下的單例鎖；當機後需清掉才能再次使用
+LOCK_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def lock_owner(path):
+    """PID of the live Chrome holding this profile, or None when it is free or the lock is stale."""
+    try:
+        host, _, pid = os.readlink(os.path.join(path, 'SingletonLock')).rpartition('-')
+        pid = int(pid)
+    except (OSError, ValueError):
+        return None
+    if host != socket.gethostname():
+        return pid
+    try:
+        os.kill(pid, 0)
+        return pid
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        return pid
+
+
+class ProfileManager:
+    """Persistent Chrome user-data directories, one per live driver, under `<root>/<source>/worker-N`.
+
+    Profiles keep the HTTP disk cache and cookies across browser sessions and
+    runs, so static assets come from disk after the first visit. Chrome
+    allows one process per profile, so each new driver leases the lowest free
+    directory (skipping ones held by another running crawler) and the pool
+    hands it back when the driver quits. A profile that has grown past
+    `max_bytes` is deleted at that point and starts fresh on the next lease.
+    """
+
+    def __init__(self, root, source, max_bytes=None):
+        self.root = os.path.join(root, source)
+        self.max_bytes = max_bytes
+        self._in_use = set()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def chrome_args(self, path):
+        args = [f'--user-data-dir={os.path.abspath(path)}', '--profile-directory=Default']
+        if self.max_bytes:
+            # 讓 Chrome 自行修剪快取，其餘成長（cookies、IndexedDB 等）由輪替處理
+            args.append(f'--disk-cache-size={self.max_bytes * 3 // 4}')
+        return args
+
+    def acquire(self):
+        with self._lock:
+            index = 0
+            while True:
+                path = os.path.join(self.root, f'worker-{index}')
+                if path not in self._in_use and lock_owner(path) is None:
+                    break
+                index += 1
+            self._in_use.add(path)
+        os.makedirs(path, exist_ok=True)
+        for name in LOCK_FILES:
+            try:
+                os.unlink(os.path.join(path, name))
+            except OSError:
+                pass
+        return path
+
+    def release(self, path):
+        if path is None:
+            return
+        if self.max_bytes:
+            size = dir_size(path)
+            if size > self.max_bytes:
+                logging.info(f'Rotating browser profile {path} ({size / 1024 / 1024:.0f} MB > {self.max_bytes / 1024 / 1024:.0f} MB)')
+                shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._in_use.discard(path)
+
+    def factory(self, make):
+        """Wrap `make(profile_args)` so every new driver runs on its own leased profile; used by DriverPool."""
+        def create():
+            path = self.acquire()
+            try:
+                driver = make(self.chrome_args(path))
+            except Exception:
+                self.release(path)
+                raise
+            driver.profile_dir = path
+            return driver
+        return create
+
+    def log_usage(self):
+        names = sorted(name for name in os.listdir(self.root) if name.startswith('worker-'))
+        sizes = [dir_size(os.path.join(self.root, name)) for name in names]
+        logging.info(f'Browser profiles in {self.root}: {len(names)} using {sum(sizes) / 1024 / 1024:.0f} MB')
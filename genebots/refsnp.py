@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json, logging
+from contextlib import nullcontext
+
+import urllib3
+
+from genebots.workers import Slot, http_outcome
+
+REFSNP_URL = 'https://api.ncbi.nlm.nih.gov/variation/v0/refsnp/'
+# NCBI 未提供 API key 時每秒最多 3 個請求
+REFSNP_RATE = 3
+
+# RefSeq chromosome accessions (NC_000001 .. NC_000024, NC_012920) to dbSNP chromosome names
+SPECIAL_CHROMOSOMES = {23: 'X', 24: 'Y', 12920: 'MT'}
+
+
+def chromosome_name(seq_id):
+    number = int(seq_id.split('.')[0][3:])
+    return SPECIAL_CHROMOSOMES.get(number, str(number))
+
+
+def format_position(spdi, assembly):
+    """Format an SPDI placement the way the dbSNP page does, e.g. `1:11794419 (GRCh38)`."""
+    start = spdi['position'] + 1
+    length = len(spdi.get('deleted_sequence', ''))
+    position = f"{start}-{start + length - 1}" if length > 1 else f"{start}"
+    return f"{chromosome_name(spdi['seq_id'])}:{position} ({assembly})"
+
+
+class RefSnpClient:
+    """Resolve rsIDs to GRCh38/GRCh37 positions with the dbSNP refsnp JSON endpoint.
+
+    Requests go through the `HostLimiter`, which spaces them to REFSNP_RATE
+    per second unless its own rate is set.
+    """
+
+    def __init__(self, base_url=REFSNP_URL, maxsize=4, timeout=30, limiter=None):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.limiter = limiter
+        if limiter:
+            limiter.default_rate(self.base_url, REFSNP_RATE)
+        retries = urllib3.Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+        self.http = urllib3.PoolManager(maxsize=maxsize, retries=retries, timeout=timeout)
+
+    def record(self, snp):
+        url = self.base_url + snp.lower().replace('rs', '', 1)
+        with self.limiter.slot(url) if self.limiter else nullcontext(Slot()) as slot:
+            response = self.http.request('GET', url)
+            slot.outcome = http_outcome(response)
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise RuntimeError(f'refsnp {snp} returned HTTP {response.status}')
+        return json.loads(response.data.decode('utf-8'))
+
+    def positions(self, snp):
+        """Return (grch38, grch37) strings, None for assemblies the record has no placement on."""
+        found = {}
+        record = self.record(snp)
+        if not record or 'primary_snapshot_data' not in record:
+            logging.warning(f'refsnp {snp}: no primary snapshot data')
+            return None, None
+
+        for placement in record['primary_snapshot_data'].get('placements_with_allele', []):
+            for traits in placement.get('placement_annot', {}).get('seq_id_traits_by_assembly', []):
+                assembly = traits.get('assembly_name', '').split('.')[0]
+                if assembly in ('GRCh38', 'GRCh37') and traits.get('is_chromosome') and assembly not in found:
+                    alleles = placement.get('alleles') or []
+                    if alleles:
+                        found[assembly] = format_position(alleles[0]['allele']['spdi'], assembly)
+
+        return found.get('GRCh38'), found.get('GRCh37')
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio, html, json, logging, re, threading
+from contextlib import nullcontext
+from html.parser import HTMLParser
+
+from genebots.metrics import METRICS
+from genebots.workers import Slot
+
+# 回應中可能放結果列的 JSON 欄位（DataTables 用 data / aaData）
+ROW_KEYS = ('rows', 'data', 'aaData')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ShapeMismatch(Exception):
+    """The replayed response does not look like the result table the browser path reads."""
+
+
+def cell_text(value):
+    """Plain text of one cell, close to the browser's innerText: tags dropped, <br> as a newline."""
+    if value is None:
+        return ''
+    text = re.sub(r'<br\s*/?>', '\n', str(value), flags=re.IGNORECASE)
+    return html.unescape(re.sub(r'<[^>]+>', '', text)).strip()
+
+
+class TableParser(HTMLParser):
+    """Collect every <tr> as {'th': [...], 'td': [...]}, nested tables giving their own rows.
+
+    `text` keeps the visible text only, so empty markers inside scripts do not count.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self.text = []
+        self._open = []
+        self._hidden = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self._hidden += 1
+        elif tag == 'tr':
+            self._open.append({'th': [], 'td': [], 'cell': None})
+        elif tag in ('th', 'td') and self._open:
+            row = self._open[-1]
+            row[tag].append('')
+            row['cell'] = tag
+        elif tag == 'br':
+            self.handle_data('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self._hidden = max(0, self._hidden - 1)
+        elif tag == 'tr' and self._open:
+            row = self._open.pop()
+            self.rows.append({'th': [text.strip() for text in row['th']], 'td': [text.strip() for text in row['td']]})
+        elif tag in ('th', 'td') and self._open:
+            self._open[-1]['cell'] = None
+
+    def handle_data(self, data):
+        if self._hidden:
+            return
+        self.text.append(data)
+        if self._open and self._open[-1]['cell']:
+            row = self._open[-1]
+            row[row['cell']][-1] += data
+
+
+def json_rows(data):
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ROW_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key]
+    raise ShapeMismatch('JSON response has no result rows')
+
+
+def parse_rows(body, content_type, width, empty_markers=()):
+    """Result rows of a replayed search in `table_rows()` form; [] when the site reports no data.
+
+    JSON rows (a list, or under `rows`/`data`/`aaData`) and HTML tables are
+    both accepted. Rows with fewer than `width` cells are dropped; if nothing
+    is left and no empty marker appears, the shape does not match.
+    """
+    if 'json' in content_type or body.lstrip()[:1] in ('{', '['):
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise ShapeMismatch(f'invalid JSON: {e}')
+        rows = []
+        for row in json_rows(data):
+            cells = list(row.values()) if isinstance(row, dict) else row
+            if not isinstance(cells, list):
+                raise ShapeMismatch('JSON result row is not a list or object')
+            rows.append({'th': [], 'td': [cell_text(cell) for cell in cells]})
+        text = ' '.join(cell for row in rows for cell in row['td'])
+        if not rows:
+            return []
+    else:
+        parser = TableParser()
+        parser.feed(body)
+        parser.close()
+        rows = [row for row in parser.rows if row['td']]
+        text = ''.join(parser.text)
+
+    found = [row for row in rows if len(row['th']) + len(row['td']) >= width]
+    if found:
+        return found
+    if any(marker in text for marker in empty_markers):
+        return []
+    raise ShapeMismatch(f'no result rows with {width} cells')
+
+
+class FormReplayClient:
+    """Send a site's search request directly with aiohttp instead of filling the form in Chrome.
+
+    One event loop in a background thread owns a keep-alive session; worker
+    threads call `rows(params)`, asyncio code can await `fetch(params)`.
+    429/5xx answers are retried with backoff and then raise, so the lookup is
+    retried later. After `mismatch_limit` shape mismatches in a row the
+    client is `disabled` and callers go straight to the browser.
+    """
+
+    def __init__(self, url, source, width, method='GET', empty_markers=(), maxsize=4, timeout=30,
+                 retries=3, backoff=1.0, limiter=None, mismatch_limit=3):
+        import aiohttp
+
+        self.url = url
+        self.source = source
+        self.width = width
+        self.method = method.upper()
+        self.empty_markers = empty_markers
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = limiter
+        self.mismatch_limit = mismatch_limit
+        self.mismatches = 0
+        self.disabled = False
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f'{source}-replay', daemon=True)
+        self._thread.start()
+
+        async def open_session():
+            connector = aiohttp.TCPConnector(limit=maxsize, keepalive_timeout=60)
+            return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+        self._session = asyncio.run_coroutine_threadsafe(open_session(), self._loop).result()
+
+    async def fetch(self, params):
+        """Return (status, content type, body, throttled) of the search request, retrying 429/5xx."""
+        throttled = False
+        for attempt in range(self.retries + 1):
+            request = {'params': params} if self.method == 'GET' else {'data': params}
+            async with self._session.request(self.method, self.url, **request) as response:
+                body = await response.text()
+                if response.status not in RETRY_STATUSES or attempt == self.retries:
+                    return response.status, response.headers.get('Content-Type', ''), body, throttled
+            throttled = True
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    def rows(self, params):
+        """Result rows for one search, [] when the site has no data; raises ShapeMismatch or on HTTP errors."""
+        with self.limiter.slot(self.url) if self.limiter else nullcontext(Slot()) as slot:
+            with METRICS.timer('load', self.source):
+                status, content_type, body, throttled = asyncio.run_coroutine_threadsafe(self.fetch(params), self._loop).result()
+            if throttled or status in RETRY_STATUSES:
+                slot.outcome = 'throttled'
+            if status == 429 or status >= 500:
+                raise RuntimeError(f'{self.source} search returned HTTP {status}')
+            try:
+                if status != 200:
+                    raise ShapeMismatch(f'HTTP {status}')
+                with METRICS.timer('extract', self.source):
+                    rows = parse_rows(body, content_type, self.width, self.empty_markers)
+            except ShapeMismatch:
+                self._mismatch()
+                raise
+            with self._lock:
+                self.mismatches = 0
+            if not rows and slot.outcome == 'ok':
+                slot.outcome = 'empty'
+            return rows
+
+    def _mismatch(self):
+        with self._lock:
+            self.mismatches += 1
+            if self.mismatches >= self.mismatch_limit and not self.disabled:
+                self.disabled = True
+                logging.warning(f"{self.source} | {self.mismatches} replayed responses in a row did not match, using the browser for the rest of the run")
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def replayed(client, params, key, fallback=True):
+    """Rows from `client`, or None when `key` should go through the browser instead.
+
+    A response that does not match the result table falls back to the
+    browser, or counts as an error with `fallback` off.
+    """
+    if client is None or client.disabled:
+        return None
+    try:
+        return client.rows(params)
+    except ShapeMismatch as e:
+        if not fallback:
+            raise
+        logging.info(f"{key} | replayed response did not match ({e}), falling back to the browser")
+        return None
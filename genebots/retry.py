@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json, logging, os, random, threading, time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlparse
+
+from genebots.metrics import METRICS
+from genebots.workers import run_ordered
+
+
+class CircuitBreaker:
+    """Stop sending lookups to a host after `threshold` consecutive failures.
+
+    An open circuit lets one trial lookup through after `reset_after`
+    seconds (half-open); it closes again when the trial succeeds and
+    re-opens if the trial fails. Other lookups that finish while the circuit
+    is open (they started before it opened) do not close it.
+    """
+
+    def __init__(self, threshold=5, reset_after=60.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.opened = Counter()
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        return self._hosts.setdefault(host, {'failures': 0, 'opened_at': None, 'trial': False})
+
+    def allow(self, host):
+        with self._lock:
+            state = self._state(host)
+            if state['opened_at'] is None:
+                return True
+            if not state['trial'] and time.monotonic() - state['opened_at'] >= self.reset_after:
+                state['trial'] = True
+                return True
+            return False
+
+    def record(self, host, failed):
+        with self._lock:
+            state = self._state(host)
+            if not failed:
+                if state['opened_at'] is None:
+                    state['failures'] = 0
+                elif state['trial']:
+                    logging.info(f'Circuit {host}: closed')
+                    state.update(failures=0, opened_at=None, trial=False)
+                return
+            state['failures'] += 1
+            if state['trial'] or (state['opened_at'] is None and state['failures'] >= self.threshold):
+                state.update(opened_at=time.monotonic(), trial=False)
+                self.opened[host] += 1
+                logging.warning(f'Circuit {host}: open after {state["failures"]} consecutive failures, '
+                                f'pausing lookups for {self.reset_after:.0f}s')
+
+    def wait_time(self, host):
+        """Seconds until an open circuit lets a trial lookup through (0 when closed)."""
+        with self._lock:
+            opened_at = self._state(host)['opened_at']
+        if opened_at is None:
+            return 0
+        return max(0.0, opened_at + self.reset_after - time.monotonic())
+
+
+class RetryQueue:
+    """Hold back failed lookups and retry them at the end of the run.
+
+    `guard(lookup)` wraps a lookup for `run_ordered`: it yields
+    `(item, result, reason)`, where `reason` is None on success, 'error' when
+    `failed(result)` is true, or 'circuit-open' when the host's circuit
+    breaker skipped the call. Failed items are `add`ed by the caller and
+    `drain` retries them in rounds, waiting `base_delay * 2**n` seconds
+    (capped at `max_delay`, with +/-50% jitter) before each round, up to
+    `max_attempts` attempts in total. Results for which `empty(result)` is
+    true are recorded as "no result" and not retried. Outcomes, retries and
+    lookup times are counted in METRICS under `source` (default: the host).
+    """
+
+    def __init__(self, host, failed, empty=None, key=str, max_attempts=3, base_delay=5.0, max_delay=120.0, breaker=None, source=None):
+        self.host = urlparse(host).netloc or host
+        self.source = source or self.host
+        self.failed = failed
+        self.empty = empty or (lambda result: False)
+        self.key = key
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.pending = []
+        self.failures = []
+        self.no_result = set()
+        self._lock = threading.Lock()
+
+    def call(self, lookup, item):
+        if not self.breaker.allow(self.host):
+            METRICS.count('circuit_open', self.source)
+            return None, 'circuit-open'
+        with METRICS.timer('lookup', self.source):
+            result = lookup(item)
+        failed = self.failed(result)
+        self.breaker.record(self.host, failed)
+        if failed:
+            METRICS.count('error', self.source)
+            return result, 'error'
+        if self.empty(result):
+            METRICS.count('empty', self.source)
+            self.note_empty(item)
+        else:
+            METRICS.count('result', self.source)
+        return result, None
+
+    def wait_time(self):
+        """Seconds until the host's circuit breaker lets a lookup through."""
+        return self.breaker.wait_time(self.host)
+
+    def note_empty(self, item):
+        with self._lock:
+            self.no_result.add(str(self.key(item)))
+
+    def guard(self, lookup):
+        return lambda item: (item, *self.call(lookup, item))
+
+    def add(self, item, reason, result=None, attempts=1):
+        self.pending.append((item, reason, result, attempts))
+
+    def drain(self, lookup, workers=1):
+        """Retry pending items and yield (item, result, reason) once per item.
+
+        `reason` is None when the item finally succeeded; otherwise `result`
+        is its last failed result (None if the circuit breaker never let it
+        through) and the item is listed in the failure manifest.
+        """
+        rounds = 0
+        while self.pending:
+            retry = [entry for entry in self.pending if entry[3] < self.max_attempts]
+            for item, reason, result, attempts in self.pending:
+                if attempts >= self.max_attempts:
+                    self.failures.append({'key': str(self.key(item)), 'reason': reason, 'attempts': attempts})
+                    yield item, result, reason
+            self.pending = []
+            if not retry:
+                break
+
+            delay = min(self.max_delay, self.base_delay * 2 ** rounds) * random.uniform(0.5, 1.5)
+            delay = max(delay, self.wait_time())
+            logging.info(f'Retry round {rounds + 1}: {len(retry)} items in {delay:.1f}s')
+            time.sleep(delay)
+            rounds += 1
+            METRICS.count('retry', self.source, len(retry))
+
+            attempts_of = {self.key(item): attempts for item, reason, result, attempts in retry}
+            items = [item for item, reason, result, attempts in retry]
+            for item, result, reason in run_ordered(self.guard(lookup), items, workers):
+                if reason:
+                    self.add(item, reason, result, attempts_of[self.key(item)] + 1)
+                else:
+                    yield item, result, None
+
+    def write_manifest(self, path, source):
+        manifest = {
+            'source': source,
+            'host': self.host,
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'max_attempts': self.max_attempts,
+            'circuit_opened': self.breaker.opened[self.host],
+            'failed': self.failures,
+            'no_result': sorted(self.no_result),
+        }
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+        logging.info(f'Failure manifest: {len(self.failures)} failed, {len(self.no_result)} without results -> {path}')
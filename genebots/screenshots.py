@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import base64, logging, os, queue, shutil, threading, time, zlib
+
+from genebots.metrics import METRICS
+
+POLICIES = ['always', 'on-failure', 'sampled', 'off']
+
+
+class ScreenshotWriter:
+    """Take screenshots according to a policy and write them on a background thread.
+
+    Policies: `always`, `on-failure` (only captures made with failed=True),
+    `sampled` (every screenshot of 1 in `sample` rows, chosen by key, plus
+    failures) and `off`. With `quality` set, Chrome encodes a JPEG instead of
+    a full-size PNG. Only grabbing the image stays on the crawl thread.
+    """
+
+    def __init__(self, directory, policy='always', sample=10, quality=None, queue_size=64):
+        self.directory = directory
+        self.policy = policy
+        self.sample = max(1, sample)
+        self.quality = quality
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        if policy != 'off':
+            os.makedirs(directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='screenshot-writer', daemon=True)
+            self._thread.start()
+
+    def wanted(self, key=None, failed=False):
+        if self.policy == 'off':
+            return False
+        if self.policy == 'always' or failed:
+            return True
+        if self.policy == 'sampled':
+            return zlib.crc32(str(key).encode('utf-8')) % self.sample == 0
+        return False
+
+    def capture(self, driver, name, key=None, failed=False):
+        if not self.wanted(key, failed):
+            return
+        start = time.monotonic()
+        try:
+            if self.quality:
+                name = os.path.splitext(name)[0] + '.jpg'
+                data = driver.execute_cdp_cmd('Page.captureScreenshot', {'format': 'jpeg', 'quality': self.quality})['data']
+            else:
+                data = driver.get_screenshot_as_base64()
+        except Exception as e:
+            logging.warning(f'Screenshot {name} failed: {e}')
+            return
+        self._queue.put((os.path.join(self.directory, name), data))
+        METRICS.observe('screenshot', None, time.monotonic() - start)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, data = item
+            try:
+                with open(path, 'wb') as f:
+                    f.write(base64.b64decode(data))
+                logging.info(f'Screenshot saved: {path}')
+            except Exception as e:
+                logging.warning(f'Screenshot {path} could not be written: {e}')
+
+    def close(self):
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+def directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def rotate_screenshot_dirs(root, max_bytes, keep=None):
+    """Delete the oldest per-date screenshot directories until `root` fits in `max_bytes`.
+
+    Directory names start with the run date (e.g. `2025-06-16_dbsnp_screenshot`),
+    so sorting by name is oldest first. `keep` is never deleted.
+    """
+    if not max_bytes or not os.path.isdir(root):
+        return
+    dirs = sorted(os.path.join(root, name) for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    sizes = {path: directory_size(path) for path in dirs}
+    total = sum(sizes.values())
+    for path in dirs:
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= sizes[path]
+        logging.info(f'Removed old screenshot directory: {path}')
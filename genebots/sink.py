@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv, glob, logging, os, time
+
+from genebots.metrics import METRICS
+
+
+# Result cells of a failed lookup hold this marker; resume re-queues their keys
+ERROR = 'error'
+# Parquet outputs with typed columns mark failed rows here, since a number column cannot hold ERROR
+STATUS_COLUMN = 'status'
+
+
+# 轉換失敗時拋出 ValueError，不默默寫成 null
+def to_int(value):
+    if value is None or value == '':
+        return None
+    return int(float(value))
+
+
+def to_float(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def to_float_list(value):
+    if value is None or value == '':
+        return None
+    return [to_float(item.strip()) for item in str(value).split(',')]
+
+
+def to_string(value):
+    return None if value is None else str(value)
+
+
+CONVERTERS = {
+    'string': to_string,
+    'int64': to_int,
+    'float64': to_float,
+    'list<float64>': to_float_list,
+}
+
+
+def is_parquet(path):
+    return path.endswith('.parquet')
+
+
+def arrow_schema(columns, types):
+    import pyarrow as pa
+
+    arrow_types = {
+        'string': pa.string(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'list<float64>': pa.list_(pa.float64()),
+    }
+    return pa.schema([(column, arrow_types[types.get(column, 'string')]) for column in columns])
+
+
+class OutputSink:
+    """Buffer result rows and write them to the output in batches.
+
+    A path ending in `.parquet` is written as a directory of Parquet part
+    files with typed columns (`types` maps column name to one of CONVERTERS);
+    anything else is appended to a CSV file. With typed columns the Parquet
+    output gets a `status` column set to 'error' for rows with an 'error'
+    cell, which are stored as null; any other value that does not convert
+    raises ValueError. Rows are flushed every
+    `flush_rows` rows or `flush_interval` seconds. With a checkpoint, the
+    file is fsync'ed before the flushed keys are recorded in it.
+    """
+
+    def __init__(self, path, columns, types=None, checkpoint=None, flush_rows=100, flush_interval=10.0):
+        self.path = path
+        self.columns = columns
+        self.types = types or {}
+        self.checkpoint = checkpoint
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._keys = []
+        self._last_flush = time.monotonic()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._status = is_parquet(path) and any(self.types.get(column, 'string') != 'string' for column in columns)
+        if is_parquet(path):
+            os.makedirs(path, exist_ok=True)
+            self._schema = arrow_schema(columns + [STATUS_COLUMN] if self._status else columns, self.types)
+            self._part = len(glob.glob(os.path.join(path, 'part-*.parquet')))
+        elif not os.path.exists(path) or os.path.getsize(path) == 0:
+            # 若 CSV 檔案不存在，則寫入標題行
+            with open(path, 'w', newline='') as f:
+                csv.writer(f).writerow(columns)
+
+    def write(self, rows, key=None):
+        """Queue output rows; `key` is recorded in the checkpoint once they are on disk."""
+        self._rows.extend(rows)
+        if key is not None:
+            self._keys.append(key)
+        if len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._rows and not self._keys:
+            return
+        with METRICS.timer('write'):
+            if is_parquet(self.path):
+                self._write_parquet()
+            else:
+                self._write_csv()
+        if self.checkpoint:
+            for key in self._keys:
+                self.checkpoint.add(key)
+        self._rows, self._keys = [], []
+
+    def _write_csv(self):
+        with open(self.path, 'a', newline='') as f:
+            csv.writer(f).writerows(self._rows)
+            if self.checkpoint:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        data = {column: [] for column in self._schema.names}
+        for row in self._rows:
+            failed = ERROR in row
+            for column, value in zip(self.columns, row):
+                kind = self.types.get(column, 'string')
+                if failed and value == ERROR and kind != 'string':
+                    # 型別欄位放不下 'error'，改記在 status 欄
+                    data[column].append(None)
+                    continue
+                try:
+                    data[column].append(CONVERTERS[kind](value))
+                except (TypeError, ValueError):
+                    raise ValueError(f'{self.path}: {column}={value!r} is not {kind}; declare the column as string or write CSV')
+            if self._status:
+                data[STATUS_COLUMN].append(ERROR if failed else None)
+        table = pa.Table.from_pydict(data, schema=self._schema)
+        part_path = os.path.join(self.path, f'part-{self._part:05d}.parquet')
+        pq.write_table(table, f'{part_path}.tmp', compression='zstd')
+        os.replace(f'{part_path}.tmp', part_path)
+        self._part += 1
+        logging.info(f'Wrote {len(self._rows)} rows to {part_path}')
+
+    def close(self):
+        self.flush()
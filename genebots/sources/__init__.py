@@ -0,0 +1,9 @@
+# coding: utf-8
+# Site plugins for the `genebots run` CLI, keyed by the name used in --sources.
+
+from genebots.sources.base import Source
+from genebots.sources.dbsnp import DbSnpSource
+from genebots.sources.taiwanview import TaiwanViewSource
+from genebots.sources.vietnamese import VietnameseSource
+
+SOURCES = {source.name: source for source in (DbSnpSource, TaiwanViewSource, VietnameseSource)}
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+
+class Source:
+    """One site the `genebots run` CLI can query by rsID.
+
+    Subclasses set `name`, `base_url`, `columns` and the cache `build`, and
+    implement `search(number, rsid)`, returning a list of rows of values in
+    `columns` order: one row of None when the site has no data and one row of
+    'error' when the lookup failed. Sites that answer with one row per rsID
+    cache that row, those with several rows (`multi_row`) cache the list, so
+    the cache is shared with the per-site scripts. `base_url` points a source
+    at another server, e.g. the benchmark stand-in.
+    """
+
+    name = None
+    base_url = None
+    columns = []
+    build = None
+    multi_row = False
+    client = None
+
+    def __init__(self, pool, limiter, screenshots, warm=False, base_url=None):
+        self.base_url = base_url or self.base_url
+        self.pool = pool
+        self.limiter = limiter
+        self.screenshots = screenshots
+        self.warm = warm
+
+    def search(self, number, rsid):
+        raise NotImplementedError
+
+    def lookup(self, number, rsid, cache=None):
+        if cache:
+            hit = cache.get(self.name, rsid, self.build)
+            if hit is not None:
+                logging.info(f"{self.name} | {rsid} | cache hit")
+                return hit if self.multi_row else [hit]
+        rows = self.search(number, rsid)
+        if cache and not self.failed(rows) and not self.empty(rows):
+            cache.put(self.name, rsid, rows if self.multi_row else rows[0], self.build)
+        return rows
+
+    def failed(self, rows):
+        return any('error' in row for row in rows)
+
+    def empty(self, rows):
+        return all(value is None for row in rows for value in row)
+
+    def prewarm_urls(self):
+        """Pages to load once per browser at pool start; none when an HTTP client serves the lookups."""
+        return [] if self.client else [self.base_url]
+
+    def error_rows(self):
+        return [['error'] * len(self.columns)]
+
+    def close(self):
+        pass
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from genebots.metrics import METRICS
+from genebots.refsnp import REFSNP_URL, RefSnpClient
+from genebots.sources.base import Source
+from genebots.waits import ready_outcome, wait_ready
+
+BASE_URL = 'https://www.ncbi.nlm.nih.gov/snp/'
+
+
+def lookup_snp(pool, limiter, base_url, screenshots, num, snp):
+    logging.info("")
+    grch38, grch37 = None, None
+
+    driver = None
+    try:
+        driver = pool.acquire()
+        with limiter.slot(base_url) as slot:
+            with METRICS.timer('load', 'dbsnp'):
+                driver.get(base_url)
+
+            search_box = WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.ID, "term")))
+            search_box.clear()
+            search_box.send_keys(snp)
+            search_box.send_keys(Keys.RETURN)
+
+            # 等到 Chromosome 欄位或查無結果的訊息出現
+            ready = wait_ready(driver, 'dbsnp')
+            slot.outcome = ready_outcome(ready)
+
+            driver.set_window_size(1920, 1920)
+            screenshots.capture(driver, f"{num}-{snp}_search_results.png", key=snp)
+
+            if ready == 'empty':
+                logging.warning(f"No results found for SNP {snp}.")
+            else:
+                try:
+                    with METRICS.timer('extract', 'dbsnp'):
+                        chromosome_label = driver.find_element(By.XPATH, "//dt[contains(text(), 'Chromosome:')]")
+                        chromosome_values = chromosome_label.find_element(By.XPATH, "following-sibling::dd").text
+                    chromosome_list = chromosome_values.split("\n")
+
+                    if len(chromosome_list) >= 2:
+                        grch38 = chromosome_list[0].strip()
+                        grch37 = chromosome_list[1].strip()
+                    else:
+                        logging.warning(f"No Chromosome results found for SNP {snp}.")
+                        screenshots.capture(driver, f"{num}-{snp}_no_chromosome.png", key=snp, failed=True)
+
+                except Exception as e:
+                    # 頁面沒有 Chromosome 欄位（未載入或版面不同），記為 error 稍後重試
+                    logging.error(f'Error: {e}')
+                    grch38, grch37 = 'error', 'error'
+                    screenshots.capture(driver, f"{num}-{snp}_error.png", key=snp, failed=True)
+
+    except Exception as e:
+        # 取得瀏覽器或載入頁面失敗
+        logging.error(f"Error processing {snp}: {e}")
+        grch38, grch37 = 'error', 'error'
+        if driver:
+            screenshots.capture(driver, f"{num}-{snp}_error.png", key=snp, failed=True)
+
+    finally:
+        pool.release(driver)
+
+    return [num, snp, grch38, grch37]
+
+
+def lookup_snp_http(client, pool, limiter, base_url, screenshots, num, snp, fallback=True):
+    try:
+        grch38, grch37 = client.positions(snp)
+    except Exception as e:
+        logging.error(f'refsnp API error for {snp}: {e}')
+        grch38, grch37 = 'error', 'error'
+
+    if (grch38, grch37) in ((None, None), ('error', 'error')) and fallback:
+        # API 無法解析時改用瀏覽器查詢
+        logging.info(f"{snp} not resolved by the refsnp API, falling back to browser")
+        return lookup_snp(pool, limiter, base_url, screenshots, num, snp)
+
+    logging.info(f"{snp} | GRCh38: {grch38} | GRCh37: {grch37}")
+    return [num, snp, grch38, grch37]
+
+
+class DbSnpSource(Source):
+    """GRCh38/GRCh37 positions from the dbSNP page, or the refsnp API with `engine='http'`."""
+
+    name = 'dbsnp'
+    base_url = BASE_URL
+    columns = ['GRCh38', 'GRCh37']
+    build = 'GRCh38/GRCh37'
+
+    def __init__(self, pool, limiter, screenshots, warm=False, base_url=None, engine='browser', refsnp_url=REFSNP_URL, fallback=True, maxsize=4):
+        super().__init__(pool, limiter, screenshots, warm, base_url)
+        self.page_url = self.base_url
+        self.fallback = fallback
+        self.client = None
+        if engine == 'http':
+            self.client = RefSnpClient(refsnp_url, maxsize=maxsize, limiter=limiter)
+            self.base_url = refsnp_url
+
+    def search(self, number, rsid):
+        if self.client:
+            result = lookup_snp_http(self.client, self.pool, self.limiter, self.page_url, self.screenshots, number, rsid, self.fallback)
+        else:
+            result = lookup_snp(self.pool, self.limiter, self.page_url, self.screenshots, number, rsid)
+        return [result[2:]]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
+
+from genebots.core import next_step
+from genebots.extract import table_rows
+from genebots.forms import clear_nodes, selected_texts, warm_form
+from genebots.metrics import METRICS
+from genebots.replay import FormReplayClient, replayed
+from genebots.sources.base import Source
+from genebots.waits import LATENCY, ready_outcome, wait_ready
+
+BASE_URL = 'https://taiwanview.twbiobank.org.tw/variant.php'
+
+# 表單固定欄位：資料庫與查詢方式
+FORM_STATE = {'database': "Whole genome sequence: Illumina (GRCh38)", 'searchBy': "RS ID"}
+RESULT_ROWS = "//div[@id='datatable']/table/tbody/tr"
+# 結果列至少 6 欄（第 3 欄 gene、第 6 欄 freq）；DataTables 查無資料時的訊息
+RESULT_WIDTH = 6
+EMPTY_MARKERS = ('No data available',)
+
+
+def setup_form(driver, base_url):
+    with METRICS.timer('load', 'taiwanview'):
+        driver.get(base_url)
+
+        # 選擇 "Whole genome sequence: Illumina (GRCh38)"
+        database = Select(driver.find_element("id", "database"))
+        database.select_by_visible_text(FORM_STATE['database'])
+
+        # 選擇 "RS ID"
+        searchby = Select(driver.find_element("id", "searchBy"))
+        searchby.select_by_visible_text(FORM_STATE['searchBy'])
+
+
+def search_rsid(driver, base_url, screenshots, id, warm=False, slot=None):
+    if warm:
+        # 表單設定仍在就只換掉查詢值，否則重新載入頁面
+        warm_form(driver, 'taiwanview', lambda driver: setup_form(driver, base_url),
+                  check=lambda driver: selected_texts(driver, FORM_STATE) == FORM_STATE)
+    else:
+        setup_form(driver, base_url)
+
+    # 填入 RS ID
+    search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "geneOrVariant")))
+    search_box.clear()
+    search_box.send_keys(id)
+
+    # 儲存搜索頁面的截圖
+    driver.set_window_size(1920, 1920)
+    screenshots.capture(driver, next_step(f"{id}_search.png"), key=id)
+
+    # 提交搜索；先移除舊的結果列，避免讀到前一次的表格
+    clear_nodes(driver, RESULT_ROWS)
+    submit = driver.find_element(By.XPATH, "//button[@type='submit']")
+    submit.click()
+
+    # 等到結果表格或「無資料」標記出現
+    ready = wait_ready(driver, 'taiwanview')
+    if slot:
+        slot.outcome = ready_outcome(ready)
+
+    # 儲存結果頁面的截圖
+    screenshots.capture(driver, next_step(f"{id}_result.png"), key=id)
+
+    # 一次取回整個結果表格，檢查 `tbody` 是否為空
+    with METRICS.timer('extract', 'taiwanview'):
+        rows = [] if ready == 'empty' else table_rows(driver, RESULT_ROWS)
+    if ready is None and not rows:
+        raise TimeoutException(f"results not loaded after {LATENCY.timeout('taiwanview'):.0f}s")
+    return rows
+
+
+def rsid_result(id, rows):
+    gene, all_freq = None, None
+    if not rows:
+        # 若 `tbody` 為空，設定 `gene` 和 `all_freq` 為 None
+        logging.info(f"{id} | No data available.")
+    else:
+        # 提取 gene 資料
+        gene = rows[0]['td'][2]
+        gene = gene.replace("\n", " ")
+        logging.info(f"{id} | GENE: {gene}")
+
+        # 提取 freq 資料
+        freqs = [row['td'][5].replace("\n", " ") for row in rows if len(row['td']) > 5]
+
+        all_freq = ",".join(freqs)
+        logging.info(f"{id} | All FREQ: {all_freq}")
+    return gene, all_freq
+
+
+def replay_client(url, source='taiwanview', method='GET', maxsize=4, limiter=None):
+    """FormReplayClient for `url`, the request the TaiwanView form sends, as seen in the browser network panel."""
+    return FormReplayClient(url, source, RESULT_WIDTH, method=method, empty_markers=EMPTY_MARKERS, maxsize=maxsize, limiter=limiter)
+
+
+def lookup_rsid(pool, limiter, base_url, screenshots, number, id, warm=False, client=None, fallback=True):
+    # 從 pool 取得 WebDriver 並訪問網站
+    logging.info("")
+    gene, all_freq = None, None
+
+    driver = None
+    try:
+        # 有 client 時直接重送表單請求，回應格式不符才開瀏覽器
+        rows = replayed(client, {**FORM_STATE, 'geneOrVariant': id}, id, fallback)
+        if rows is None:
+            driver = pool.acquire()
+            with limiter.slot(base_url) as slot:
+                rows = search_rsid(driver, base_url, screenshots, id, warm, slot)
+        gene, all_freq = rsid_result(id, rows)
+
+    except Exception as e:
+        # 若發生錯誤，設定 `gene` 和 `all_freq` 為 'error'，稍後重試
+        gene = 'error'
+        all_freq = 'error'
+        logging.error(f"Error processing {id}: {e}")
+        if driver:
+            screenshots.capture(driver, next_step(f"{id}_error.png"), key=id, failed=True)
+
+    finally:
+        pool.release(driver)
+
+    return [number, id, gene, all_freq]
+
+
+class TaiwanViewSource(Source):
+    """Gene and allele frequencies from the TaiwanView GRCh38 whole-genome table; `engine='http'` replays the search request."""
+
+    name = 'taiwanview'
+    base_url = BASE_URL
+    columns = ['gene', 'freq']
+    build = 'GRCh38'
+
+    def __init__(self, pool, limiter, screenshots, warm=False, base_url=None, engine='browser', replay_url=None, replay_method='GET', fallback=True, maxsize=4):
+        super().__init__(pool, limiter, screenshots, warm, base_url)
+        self.fallback = fallback
+        self.client = None
+        if engine == 'http':
+            if not replay_url:
+                raise ValueError(f"engine='http' needs replay_url, the URL the {self.name} search form submits to")
+            self.client = replay_client(replay_url, method=replay_method, maxsize=maxsize, limiter=limiter)
+
+    def search(self, number, rsid):
+        return [lookup_rsid(self.pool, self.limiter, self.base_url, self.screenshots, number, rsid, self.warm, self.client, self.fallback)[2:]]
+
+    def close(self):
+        if self.client:
+            self.client.close()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from genebots.core import next_step
+from genebots.extract import table_rows
+from genebots.forms import clear_nodes, warm_form
+from genebots.metrics import METRICS
+from genebots.replay import FormReplayClient, replayed
+from genebots.sources.base import Source
+from genebots.waits import LATENCY, ready_outcome, wait_ready
+
+BASE_URL = 'https://genomes.vn/'
+
+RESULT_ROWS = "//div[@id='result']/div/table/tbody/tr[5]/td/table/tbody/tr"
+# 查詢固定用 GRCh37；結果列為 ALT 加 6 欄，查無資料時的訊息
+REFERENCE = 'GRCh37'
+RESULT_WIDTH = 7
+EMPTY_MARKERS = ('No data', 'No result', 'not found')
+
+
+def setup_form(driver, base_url):
+    with METRICS.timer('load', 'vietnamese'):
+        driver.get(base_url)
+        driver.set_window_size(1920, 1920)
+
+        # 選擇 "GRCh37"
+        ref_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.NAME, "ref")))
+        ref_button.click()
+
+
+def search_rsid(driver, base_url, screenshots, id, warm=False, slot=None):
+    if warm:
+        # 頁面未重新載入就沿用已切換 GRCh37 的表單，只換掉查詢值
+        warm_form(driver, 'vietnamese', lambda driver: setup_form(driver, base_url))
+        clear_nodes(driver, "//div[@id='result']/*")
+    else:
+        setup_form(driver, base_url)
+
+    # 填入 RS ID
+    search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "query")))
+    search_box.clear()
+    search_box.send_keys(id)
+
+    # submit
+    submit = driver.find_element(By.XPATH, "//button[@id='search-btn']/i")
+    submit.click()
+
+    # 等到結果表格或查無資料的訊息出現
+    ready = wait_ready(driver, 'vietnamese')
+    if slot:
+        slot.outcome = ready_outcome(ready)
+
+    screenshots.capture(driver, next_step(f"{id}_result.png"), key=id)
+
+    # 一次取回所有行
+    with METRICS.timer('extract', 'vietnamese'):
+        rows = [] if ready == 'empty' else table_rows(driver, RESULT_ROWS)
+    if ready is None and not rows:
+        raise TimeoutException(f"results not loaded after {LATENCY.timeout('vietnamese'):.0f}s")
+    return rows
+
+
+def replay_client(url, source='vietnamese', method='GET', maxsize=4, limiter=None):
+    """FormReplayClient for `url`, the request the genomes.vn search sends, as seen in the browser network panel."""
+    return FormReplayClient(url, source, RESULT_WIDTH, method=method, empty_markers=EMPTY_MARKERS, maxsize=maxsize, limiter=limiter)
+
+
+def lookup_rsid(pool, limiter, base_url, screenshots, id, warm=False, client=None, fallback=True):
+    results = []
+
+    driver = None
+    try:
+        logging.info("")
+        # 有 client 時直接重送查詢請求（GRCh37），回應格式不符才開瀏覽器
+        rows = replayed(client, {'query': id, 'ref': REFERENCE}, id, fallback)
+        if rows is None:
+            # 從 pool 取得 WebDriver 並訪問網站
+            driver = pool.acquire()
+            with limiter.slot(base_url) as slot:
+                rows = search_rsid(driver, base_url, screenshots, id, warm, slot)
+
+        if not rows:
+            # 若 `tbody` 為空，設定為 None
+            logging.warning(f"{id} | No data available.")
+            alt, khv, khvg, region, gene, impact, aachange = None, None, None, None, None, None, None
+            results.append([id, alt, khv, khvg, region, gene, impact, aachange])
+        else:
+            for row in rows:
+                try:
+                    # 瀏覽器的列是 ALT 的 th 加 6 個 td，重送請求的 JSON 列則是 7 個 td
+                    cells = row['th'] + row['td']
+                    alt = cells[0]
+                    khv, khvg, region, gene, impact, aachange = cells[1:7]
+
+                    logging.info(f"{id} | ALT: {alt} | KHV: {khv} | KHV-G: {khvg} | Region: {region} | Gene: {gene} | Impact: {impact} | AA Change: {aachange}")
+                    results.append([id, alt, khv, khvg, region, gene, impact, aachange])
+                except Exception as row_e:
+                    logging.error(f"Error processing row for {id}: {row_e}")
+                    if driver:
+                        screenshots.capture(driver, next_step(f"{id}_row_error.png"), key=id, failed=True)
+                    alt, khv, khvg, region, gene, impact, aachange = 'error', 'error', 'error', 'error', 'error', 'error', 'error'
+                    results.append([id, alt, khv, khvg, region, gene, impact, aachange])
+                    continue
+
+    except Exception as e:
+        logging.error(f"Error processing {id}: {e}")
+        if driver:
+            screenshots.capture(driver, next_step(f"{id}_error.png"), key=id, failed=True)
+        alt, khv, khvg, region, gene, impact, aachange = 'error', 'error', 'error', 'error', 'error', 'error', 'error'
+        results.append([id, alt, khv, khvg, region, gene, impact, aachange])
+
+    finally:
+        pool.release(driver)
+
+    return results
+
+
+class VietnameseSource(Source):
+    """One row per ALT allele from the genomes.vn (KHV) GRCh37 variant table; `engine='http'` replays the search request."""
+
+    name = 'vietnamese'
+    base_url = BASE_URL
+    columns = ["ALT", "KHV", "KHV-G", "Region", "Gene", "Impact", "AA Change"]
+    build = 'GRCh37'
+    multi_row = True
+
+    def __init__(self, pool, limiter, screenshots, warm=False, base_url=None, engine='browser', replay_url=None, replay_method='GET', fallback=True, maxsize=4):
+        super().__init__(pool, limiter, screenshots, warm, base_url)
+        self.fallback = fallback
+        self.client = None
+        if engine == 'http':
+            if not replay_url:
+                raise ValueError(f"engine='http' needs replay_url, the URL the {self.name} search form submits to")
+            self.client = replay_client(replay_url, method=replay_method, maxsize=maxsize, limiter=limiter)
+
+    def search(self, number, rsid):
+        return [result[1:] for result in lookup_rsid(self.pool, self.limiter, self.base_url, self.screenshots, rsid, self.warm, self.client, self.fallback)]
+
+    def close(self):
+        if self.client:
+            self.client.close()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, threading, time
+from collections import deque
+
+from selenium.common.exceptions import WebDriverException
+
+from genebots.metrics import METRICS, percentile
+
+# XPaths that tell a page is ready to be read, per source: results rendered or an empty-result marker
+READY_CONDITIONS = {
+    'clinvar': {
+        'results': "//a[text()='Download']",
+        'empty': "//*[contains(text(), 'No items found')]",
+    },
+    'clinvar-download': {
+        'dialog': "//*[@id='file_sort']",
+    },
+    'dbsnp': {
+        'results': "//dt[contains(text(), 'Chromosome:')]",
+        'empty': "//*[contains(text(), 'No items found') or contains(text(), 'was not found')]",
+    },
+    'taiwanview': {
+        'results': "//div[@id='datatable']/table/tbody/tr[td[not(contains(@class, 'dataTables_empty'))]]",
+        # DataTables 的「無資料」列，或新繪出但沒有任何列的 tbody（clear_nodes 清空的舊 tbody 除外）
+        'empty': "//div[@id='datatable']//td[contains(@class, 'dataTables_empty')] | //div[@id='datatable']/table/tbody[not(tr)][not(@data-cleared)]",
+    },
+    'vietnamese': {
+        'results': "//div[@id='result']/div/table/tbody/tr[5]/td/table/tbody/tr",
+        'empty': "//div[@id='result']//*[contains(text(), 'No data') or contains(text(), 'No result') or contains(text(), 'not found')]",
+    },
+}
+
+READY_JS = """
+const [conditions, url] = arguments;
+if (url && !location.href.includes(url)) return null;
+for (const [name, xpath] of conditions) {
+    if (document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue) return name;
+}
+return null;
+"""
+
+
+class LatencyTracker:
+    """Recent page-ready latencies per source, used to derive wait timeouts.
+
+    Until a source has `min_samples` observations its timeout is `max_wait`;
+    after that it is `factor` times the p95 of the last `window` latencies,
+    clamped to [`min_wait`, `max_wait`].
+    """
+
+    def __init__(self, window=200, min_samples=20, factor=3.0, min_wait=2.0, max_wait=30.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.factor = factor
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.timeouts = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, source, seconds):
+        with self._lock:
+            self._latencies.setdefault(source, deque(maxlen=self.window)).append(seconds)
+
+    def timed_out(self, source):
+        with self._lock:
+            self.timeouts[source] = self.timeouts.get(source, 0) + 1
+
+    def timeout(self, source):
+        with self._lock:
+            latencies = list(self._latencies.get(source, ()))
+        if len(latencies) < self.min_samples:
+            return self.max_wait
+        return min(self.max_wait, max(self.min_wait, self.factor * percentile(latencies, 95)))
+
+    def summary(self):
+        with self._lock:
+            latencies = {source: list(values) for source, values in self._latencies.items()}
+        for source, values in sorted(latencies.items()):
+            logging.info(f'Waits: {source} n={len(values)} p50={percentile(values, 50):.2f}s '
+                         f'p95={percentile(values, 95):.2f}s timeouts={self.timeouts.get(source, 0)} '
+                         f'next timeout={self.timeout(source):.1f}s')
+
+
+LATENCY = LatencyTracker()
+
+
+def wait_ready(driver, source, conditions=None, url=None, timeout=None, poll_interval=0.1, tracker=LATENCY):
+    """Poll the page until one of the readiness conditions of `source` holds.
+
+    Returns the name of the condition that matched (e.g. 'results' or
+    'empty'), or None when the timeout derived from recent latencies ran out.
+    With `url`, conditions only count once the page address contains it.
+    """
+    conditions = conditions or READY_CONDITIONS[source]
+    timeout = timeout or tracker.timeout(source)
+    start = time.monotonic()
+    while True:
+        try:
+            found = driver.execute_script(READY_JS, list(conditions.items()), url)
+        except WebDriverException:
+            # 頁面切換中，稍後再試
+            found = None
+        elapsed = time.monotonic() - start
+        if found:
+            tracker.record(source, elapsed)
+            METRICS.observe('wait', source, elapsed)
+            return found
+        if elapsed >= timeout:
+            tracker.timed_out(source)
+            METRICS.observe('wait', source, elapsed)
+            logging.warning(f'{source}: page not ready after {elapsed:.1f}s')
+            return None
+        time.sleep(poll_interval)
+
+
+def ready_outcome(ready):
+    """Map a `wait_ready` result to a `HostLimiter` slot outcome."""
+    if ready is None:
+        return 'timeout'
+    return 'empty' if ready == 'empty' else 'ok'
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging, threading, time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from statistics import median
+from urllib.parse import urlparse
+
+
+def run_ordered(func, items, workers=1):
+    """Yield func(item) for every item, in input order, using N worker threads.
+
+    At most `workers * 4` items are in flight, so the caller can write each
+    result as soon as every earlier row is done.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class RateLimiter:
+    """Space out calls so that at most `rate` of them start per second (shared by all threads).
+
+    Up to `burst` calls may start back to back after an idle spell; the
+    average never exceeds `rate`.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.interval = 1.0 / rate if rate else 0
+        self.burst = max(1, burst or 1)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            due = max(now, self._next)
+            start = max(now, due - (self.burst - 1) * self.interval)
+            self._next = due + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Slot:
+    """One lookup inside `HostLimiter.slot()`; set `outcome` to 'empty', 'timeout' or 'throttled' when it applies."""
+
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+def http_outcome(response):
+    """Slot outcome of a urllib3 response, counting 429/5xx answers that were retried along the way."""
+    retried = response.retries.history if response.retries else ()
+    if response.status == 429 or response.status >= 500 or any(attempt.status in (429, 500, 502, 503, 504) for attempt in retried):
+        return 'throttled'
+    return 'empty' if response.status == 404 else 'ok'
+
+
+class HostState:
+    def __init__(self, host, limit, rate_limiter):
+        self.host = host
+        self.limit = float(limit)
+        self.rate_limiter = rate_limiter
+        self.in_flight = 0
+        self.counts = Counter()
+        self.latencies = deque(maxlen=50)
+        self.outcomes = deque(maxlen=20)
+        self.last_decrease = 0.0
+        self.last_log = time.monotonic()
+        self.condition = threading.Condition()
+
+    def describe(self, ceiling):
+        latency = f'{median(self.latencies):.2f}s' if self.latencies else '-'
+        counts = ' '.join(f'{outcome}={count}' for outcome, count in sorted(self.counts.items()))
+        rate = f' rate={self.rate_limiter.rate:g}/s' if self.rate_limiter else ''
+        return f'Limiter {self.host}: limit={self.limit:.1f}/{ceiling} in_flight={self.in_flight} p50={latency}{rate} {counts}'
+
+
+class HostLimiter:
+    """Cap the number of concurrent lookups against each target host.
+
+    With `rate`, lookups against each host are also spaced by a
+    `RateLimiter` of `rate` per second (bursts of `burst`); `default_rate`
+    sets it for one host when no `rate` is given. With `adaptive`, the cap starts at
+    `min_per_host` and follows an AIMD rule: it grows by about one per round
+    of healthy lookups (latency within `slow_factor` times the recent median)
+    and is halved, at most once per `cooldown` seconds, on an error, timeout,
+    HTTP 429/5xx or when more than `empty_share` of recent pages were empty.
+    `max_per_host` is the ceiling. The state of every host is logged every
+    `log_interval` seconds and on each decrease.
+    """
+
+    def __init__(self, max_per_host=1, rate=None, burst=None, adaptive=False, min_per_host=1,
+                 slow_factor=2.0, empty_share=0.8, cooldown=5.0, log_interval=30.0):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self.min_per_host = min(min_per_host, max_per_host)
+        self.slow_factor = slow_factor
+        self.empty_share = empty_share
+        self.cooldown = cooldown
+        self.log_interval = log_interval
+        self._rates = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def default_rate(self, url, rate):
+        """Space lookups against the host of `url` to `rate` per second unless `rate` was given for every host."""
+        host = urlparse(url).netloc or url
+        with self._lock:
+            if rate and not self.rate and host not in self._hosts:
+                self._rates[host] = rate
+
+    def _state(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                limit = self.min_per_host if self.adaptive else self.max_per_host
+                rate = self._rates.get(host, self.rate)
+                self._hosts[host] = HostState(host, limit, RateLimiter(rate, self.burst) if rate else None)
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        state = self._state(urlparse(url).netloc or url)
+        with state.condition:
+            while state.in_flight >= max(1, int(state.limit)):
+                state.condition.wait()
+            state.in_flight += 1
+        if state.rate_limiter:
+            state.rate_limiter.wait()
+
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            slot.outcome = 'error'
+            raise
+        finally:
+            self._release(state, slot.outcome, time.monotonic() - start)
+
+    def _release(self, state, outcome, seconds):
+        with state.condition:
+            state.in_flight -= 1
+            state.counts[outcome] += 1
+            state.outcomes.append(outcome)
+            if self.adaptive:
+                self._adjust(state, outcome, seconds)
+            if outcome == 'ok':
+                state.latencies.append(seconds)
+            state.condition.notify_all()
+
+            now = time.monotonic()
+            if now - state.last_log >= self.log_interval:
+                state.last_log = now
+                logging.info(state.describe(self.max_per_host))
+
+    def _adjust(self, state, outcome, seconds):
+        now = time.monotonic()
+        empties = state.outcomes.count('empty')
+        too_empty = len(state.outcomes) >= 10 and empties > self.empty_share * len(state.outcomes)
+        if outcome in ('error', 'timeout', 'throttled') or (outcome == 'empty' and too_empty):
+            if now - state.last_decrease >= self.cooldown and state.limit > self.min_per_host:
+                state.limit = max(self.min_per_host, state.limit / 2)
+                state.last_decrease = now
+                logging.warning(f'{state.describe(self.max_per_host)} (backing off after {outcome})')
+        elif outcome == 'ok':
+            healthy = not state.latencies or seconds <= self.slow_factor * median(state.latencies)
+            if healthy:
+                state.limit = min(self.max_per_host, state.limit + 1 / state.limit)
+
+    def log_state(self):
+        with self._lock:
+            states = list(self._hosts.values())
+        for state in states:
+            logging.info(state.describe(self.max_per_host))
@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import glob, json, logging, os, random, socket, sqlite3, threading, time, uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from genebots.sink import OutputSink, is_parquet
+from genebots.workers import run_ordered
+
+STATES = ('pending', 'leased', 'done', 'failed')
+
+
+class WorkQueue:
+    """SQLite work queue that splits one job across crawler processes and containers.
+
+    `enqueue` stores every input row and one task per distinct key, so a key
+    repeated in the input is looked up once. Workers `claim` batches of
+    tasks under a lease that a background thread renews every `lease / 3`
+    seconds; when a worker dies its leases expire and the tasks go to the
+    next claimer. `complete` stores a task's result, `release` puts a failed
+    task back after an exponential backoff until it has been claimed
+    `max_attempts` times, and `export` writes the output in input order.
+    A task skipped by an open circuit breaker is not an attempt: it waits
+    until the circuit lets a lookup through and keeps its attempts.
+
+    Every worker opens the same file, so it must be on storage they all can
+    lock, e.g. a volume shared by the containers of one host; SQLite locking
+    is not reliable over NFS.
+    """
+
+    def __init__(self, path, job, lease=300.0, max_attempts=3, base_delay=5.0, max_delay=120.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.job = job
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        # isolation_level=None：交易由 _transaction() 以 BEGIN IMMEDIATE 明確控制
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._transaction():
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                                    job TEXT PRIMARY KEY, sealed INTEGER DEFAULT 0, created REAL,
+                                    exported_by TEXT, exported REAL)''')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS tasks (
+                                    job TEXT, key TEXT, seq INTEGER, row TEXT,
+                                    state TEXT DEFAULT 'pending', owner TEXT, lease_until REAL,
+                                    not_before REAL DEFAULT 0, attempts INTEGER DEFAULT 0,
+                                    reason TEXT, empty INTEGER DEFAULT 0, result TEXT,
+                                    PRIMARY KEY (job, key))''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (job, state, seq)')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS rows (
+                                    job TEXT, seq INTEGER, key TEXT, row TEXT,
+                                    PRIMARY KEY (job, seq))''')
+            self._conn.execute('INSERT OR IGNORE INTO jobs (job, created) VALUES (?, ?)', (job, time.time()))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def enqueue(self, rows, key, chunk=1000):
+        """Store the input rows and one task per distinct `key(row)`, then seal the job.
+
+        Rows are numbered by input position, so running it again with the
+        same input adds nothing. Workers wait for the seal before deciding
+        the job is finished.
+        """
+        added = [0, 0]
+
+        def insert(batch):
+            with self._transaction():
+                for seq, row in batch:
+                    task = key(row)
+                    data = json.dumps(list(row))
+                    added[0] += self._conn.execute('INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?)',
+                                                   (self.job, seq, task, data)).rowcount
+                    added[1] += self._conn.execute('INSERT OR IGNORE INTO tasks (job, key, seq, row) VALUES (?, ?, ?, ?)',
+                                                   (self.job, task, seq, data)).rowcount
+
+        batch = []
+        for seq, row in enumerate(rows):
+            batch.append((seq, row))
+            if len(batch) >= chunk:
+                insert(batch)
+                batch = []
+        insert(batch)
+        with self._transaction():
+            self._conn.execute('UPDATE jobs SET sealed=1 WHERE job=?', (self.job,))
+        logging.info(f'Queue {self.job}: enqueued {added[0]} rows, {added[1]} new tasks')
+
+    def claim(self, size):
+        """Lease up to `size` pending or expired tasks to this worker and return their (key, row) pairs."""
+        now = time.time()
+        with self._transaction():
+            found = self._conn.execute('''SELECT key, row, state, attempts FROM tasks
+                                          WHERE job=? AND ((state='pending' AND not_before<=?) OR (state='leased' AND lease_until<?))
+                                          ORDER BY seq LIMIT ?''', (self.job, now, now, size)).fetchall()
+            claimed, expired = [], 0
+            for key, row, state, attempts in found:
+                if state == 'leased':
+                    expired += 1
+                    # 該 worker 已消失；重複讓 worker 當掉的 key 不再發出
+                    if attempts >= self.max_attempts:
+                        self._conn.execute("UPDATE tasks SET state='failed', reason='lease-expired', owner=NULL WHERE job=? AND key=?",
+                                           (self.job, key))
+                        continue
+                self._conn.execute("UPDATE tasks SET state='leased', owner=?, lease_until=?, attempts=attempts+1 WHERE job=? AND key=?",
+                                   (self.owner, now + self.lease, self.job, key))
+                claimed.append((key, tuple(json.loads(row))))
+        if expired:
+            logging.warning(f'Queue {self.job}: reclaimed {expired} tasks whose lease expired')
+        if claimed and self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, name=f'{self.job}-heartbeat', daemon=True)
+            self._heartbeat.start()
+        return claimed
+
+    def _beat(self):
+        while not self._stop.wait(self.lease / 3):
+            try:
+                with self._transaction():
+                    self._conn.execute("UPDATE tasks SET lease_until=? WHERE job=? AND owner=? AND state='leased'",
+                                       (time.time() + self.lease, self.job, self.owner))
+            except sqlite3.Error as e:
+                logging.warning(f'Queue {self.job}: heartbeat failed ({e}), retrying in {self.lease / 3:.0f}s')
+
+    def complete(self, key, result, empty=False):
+        # 租約過期後才完成也照樣記錄；結果與接手的 worker 相同
+        with self._transaction():
+            self._conn.execute("UPDATE tasks SET state='done', result=?, empty=?, reason=NULL, owner=NULL, lease_until=NULL WHERE job=? AND key=? AND state!='done'",
+                               (json.dumps(result), int(empty), self.job, key))
+
+    def release(self, key, reason, result=None, wait=0.0):
+        """Put a failed task back with backoff, or mark it failed once its attempts are used up.
+
+        A 'circuit-open' task was never looked up: its attempt is given back
+        and it waits `wait` seconds (at least `base_delay`), the time until
+        the circuit breaker lets a trial lookup through.
+        """
+        with self._transaction():
+            row = self._conn.execute('SELECT attempts, state, owner FROM tasks WHERE job=? AND key=?', (self.job, key)).fetchone()
+            if row is None or row[1] != 'leased' or row[2] != self.owner:
+                # 租約已被其他 worker 接手
+                return
+            attempts = row[0]
+            if reason == 'circuit-open':
+                self._conn.execute("UPDATE tasks SET state='pending', reason=?, owner=NULL, lease_until=NULL, not_before=?, attempts=attempts-1 WHERE job=? AND key=?",
+                                   (reason, time.time() + max(wait, self.base_delay), self.job, key))
+                return
+            if attempts >= self.max_attempts:
+                self._conn.execute("UPDATE tasks SET state='failed', reason=?, result=?, owner=NULL, lease_until=NULL WHERE job=? AND key=?",
+                                   (reason, json.dumps(result), self.job, key))
+                return
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+            self._conn.execute("UPDATE tasks SET state='pending', reason=?, owner=NULL, lease_until=NULL, not_before=? WHERE job=? AND key=?",
+                               (reason, time.time() + delay, self.job, key))
+
+    def counts(self):
+        with self._lock:
+            found = dict(self._conn.execute('SELECT state, COUNT(*) FROM tasks WHERE job=? GROUP BY state', (self.job,)).fetchall())
+        return {state: found.get(state, 0) for state in STATES}
+
+    def sealed(self):
+        with self._lock:
+            return bool(self._conn.execute('SELECT sealed FROM jobs WHERE job=?', (self.job,)).fetchone()[0])
+
+    def finished(self):
+        counts = self.counts()
+        return self.sealed() and not counts['pending'] and not counts['leased']
+
+    def tasks(self, batch_size=50, poll=5.0):
+        """Yield claimed (key, row) pairs, one batch at a time, until nothing can be claimed right now."""
+        while True:
+            batch = self.claim(batch_size)
+            if not batch:
+                if self.sealed():
+                    return
+                logging.info(f'Queue {self.job}: waiting for the input to be enqueued')
+                time.sleep(poll)
+                continue
+            yield from batch
+
+    def run(self, lookup, workers=1, batch_size=50, poll=5.0, empty=None, wait=None):
+        """Run `lookup` (a `RetryQueue.guard`) over claimed tasks until the job is finished.
+
+        Tasks held by other workers or waiting for their retry delay are
+        waited for, so every task is done or failed when this returns.
+        `wait()` gives the seconds until an open circuit breaker lets a
+        lookup through, e.g. `RetryQueue.wait_time`.
+        """
+        empty = empty or (lambda result: False)
+        wait = wait or (lambda: 0.0)
+        while True:
+            for key, (row, result, reason) in run_ordered(lambda task: (task[0], lookup(task[1])), self.tasks(batch_size, poll), workers):
+                if reason:
+                    self.release(key, reason, result, wait() if reason == 'circuit-open' else 0.0)
+                else:
+                    self.complete(key, result, empty(result))
+            if self.finished():
+                break
+            counts = self.counts()
+            logging.info(f"Queue {self.job}: {counts['leased']} tasks leased by other workers, {counts['pending']} waiting to be retried")
+            time.sleep(poll)
+
+    def claim_export(self, force=False):
+        """True for exactly one worker once the job is finished (or always with `force`)."""
+        if not self.finished():
+            if force:
+                logging.warning(f'Queue {self.job}: not finished yet, nothing exported')
+            return False
+        with self._transaction():
+            claimed = self._conn.execute('UPDATE jobs SET exported_by=?, exported=? WHERE job=? AND (exported_by IS NULL OR ?)',
+                                         (self.owner, time.time(), self.job, int(force))).rowcount
+        return bool(claimed)
+
+    def results(self):
+        """Yield (row, result) for every input row in input order; result is the last failed one (or None) for failed tasks."""
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            cursor = conn.execute('''SELECT r.row, t.result FROM rows r JOIN tasks t ON t.job=r.job AND t.key=r.key
+                                     WHERE r.job=? ORDER BY r.seq''', (self.job,))
+            for row, result in cursor:
+                yield tuple(json.loads(row)), json.loads(result) if result else None
+        finally:
+            conn.close()
+
+    def export(self, path, columns, fan_out, types=None, flush_rows=1000):
+        """Replace `path` (CSV or Parquet) with `fan_out(row, result)` rows for every input row."""
+        if is_parquet(path):
+            for part in glob.glob(os.path.join(path, 'part-*.parquet')):
+                os.remove(part)
+        elif os.path.exists(path):
+            os.remove(path)
+        sink = OutputSink(path, columns, types=types, flush_rows=flush_rows, flush_interval=float('inf'))
+        count = 0
+        for row, result in self.results():
+            sink.write(fan_out(row, result))
+            count += 1
+        sink.close()
+        logging.info(f'Queue {self.job}: exported {count} rows to {path}')
+
+    def write_manifest(self, path, source):
+        """Failure manifest of the whole job, in the same format as `RetryQueue.write_manifest`."""
+        with self._lock:
+            failed = self._conn.execute("SELECT key, reason, attempts FROM tasks WHERE job=? AND state='failed' ORDER BY seq",
+                                        (self.job,)).fetchall()
+            empty = self._conn.execute("SELECT key FROM tasks WHERE job=? AND state='done' AND empty=1 ORDER BY key",
+                                       (self.job,)).fetchall()
+        manifest = {
+            'source': source,
+            'queue': self.path,
+            'job': self.job,
+            'written_at': datetime.now().isoformat(timespec='seconds'),
+            'max_attempts': self.max_attempts,
+            'failed': [{'key': key, 'reason': reason, 'attempts': attempts} for key, reason, attempts in failed],
+            'no_result': [key for key, in empty],
+        }
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+        logging.info(f'Failure manifest: {len(failed)} failed, {len(empty)} without results -> {path}')
+
+    def log_state(self):
+        counts = self.counts()
+        logging.info(f'Queue {self.job} ({self.path}): ' + ', '.join(f'{state}={count}' for state, count in counts.items()))
+
+    def close(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        with self._lock:
+            # 尚未完成的租約立即交回，其他 worker 不必等到過期
+            self._conn.execute("UPDATE tasks SET state='pending', owner=NULL, lease_until=NULL WHERE job=? AND owner=? AND state='leased'",
+                               (self.job, self.owner))
+            self._conn.close()
+
+
+def queue_status(path):
+    """Task counts per job and state of a queue file, with the number of expired leases."""
+    conn = sqlite3.connect(path, timeout=60)
+    try:
+        now = time.time()
+        status = {}
+        for job, sealed in conn.execute('SELECT job, sealed FROM jobs ORDER BY job'):
+            counts = dict(conn.execute('SELECT state, COUNT(*) FROM tasks WHERE job=? GROUP BY state', (job,)).fetchall())
+            rows = conn.execute('SELECT COUNT(*) FROM rows WHERE job=?', (job,)).fetchone()[0]
+            expired = conn.execute("SELECT COUNT(*) FROM tasks WHERE job=? AND state='leased' AND lease_until<?", (job, now)).fetchone()[0]
+            owners = conn.execute("SELECT COUNT(DISTINCT owner) FROM tasks WHERE job=? AND state='leased' AND lease_until>=?", (job, now)).fetchone()[0]
+            status[job] = dict({state: counts.get(state, 0) for state in STATES},
+                               rows=rows, sealed=bool(sealed), expired=expired, workers=owners)
+        return status
+    finally:
+        conn.close()
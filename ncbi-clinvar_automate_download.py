@@ -1,206 +1,281 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import tempfile, json, logging, time, re, os, zipfile, sys, argparse, configparser
-import smtplib
-from email.mime.text import MIMEText
-from threading import Thread
-from datetime import datetime, timedelta
+import logging, os, argparse
 from glob import glob
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import Select
+from genebots import Checkpoint, EUtilsClient, MergedDataset, RunContext, add_common_args, prefix_column, read_lines, run_ordered, wait_for_download
+from genebots.core import next_step, setup_logging
+from genebots.metrics import METRICS
+from genebots.waits import ready_outcome, wait_ready
+from genebots.eutils import EUTILS_URL
+
+CLINVAR_URL = 'https://www.ncbi.nlm.nih.gov/clinvar/'
+
+
+def download_disease(pool, limiter, base_url, screenshots, download_rename_path, disease):
+    logging.info("")
+    status = 'ok'
+
+    driver = None
+    try:            
+        driver = pool.acquire()
+        download_path = driver.download_dir
+        with limiter.slot(base_url) as slot:
+            with METRICS.timer('load', 'clinvar'):
+                driver.get(base_url)
+            search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "term")))
+            search_box.clear()
+            search_box.send_keys(disease)
+            search_box.send_keys(Keys.RETURN)
+            
+            # Wait for the result list or the "No items found" message
+            ready = wait_ready(driver, 'clinvar', url='term=')
+            slot.outcome = ready_outcome(ready)
 
+            driver.set_window_size(1920, 1920)
+            screenshots.capture(driver, next_step(f"{disease}_search_results.png"), key=disease)
 
+            if ready == 'empty':
+                logging.info(f"No items found for {disease}. No download will be performed.")
+                return 'no_results'
 
-def next_step(tag_name):
-    global step_counter
-    step_counter += 1    
-    
-    return f'{step_counter:02d}-{tag_name}'
+            # If results are found, look for the download link and click it
+            download_link = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.LINK_TEXT, "Download")))
+            download_link.click()
+            screenshots.capture(driver, next_step(f"{disease}_click_download.png"), key=disease)
 
+            wait_ready(driver, 'clinvar-download')
 
-def init_driver(driverpath, download_dir=None, implicit_wait=30):
-    logging.info('Initializing driver')
-    
-    options = webdriver.ChromeOptions()
-    options.add_argument('--no-sandbox')
-    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
-    options.add_argument('--disable-dev-shm-usage')
+            # Wait for the file_sort element to be present
+            file_sort_link = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "file_sort")))
+            file_sort_link.click()
+            screenshots.capture(driver, next_step(f"{disease}_click_filesort.png"), key=disease)
 
-    if download_dir is None:
-        download_dir = tempfile.gettempdir()
-        
-    prefs = {
-        "download.default_directory": download_dir,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    
-    service = Service(driverpath)
-    options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(implicit_wait)
-    logging.info('Driver initialized successfully')
-    
-    return driver
+            # Select the "Relevance" option from the dropdown
+            select = Select(file_sort_link)
+            select.select_by_visible_text("Relevance")
+            screenshots.capture(driver, next_step(f"{disease}_select_relevance.png"), key=disease)
+
+            files_in_download_path = glob(os.path.join(download_path, "*"))
+            if len(files_in_download_path) != 0:
+                for file_path in files_in_download_path:
+                    os.remove(file_path)
+                    logging.info(f'Removed file: {file_path}')
+
+            # Now click the button to submit the request
+            create_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.NAME, "EntrezSystem2.PEntrez.clinVar.clinVar_Entrez_ResultsPanel.Entrez_DisplayBar.SendToSubmit")))
+            create_button.click()
+            screenshots.capture(driver, next_step(f"{disease}_download_results.png"), key=disease)
 
+        # 匯出請求已送出；等待下載時先交還 slot，讓其他疾病可以開始查詢
+        with METRICS.timer('download', 'clinvar'):
+            ori_file_path = wait_for_download(download_path, "*.txt", timeout=args.download_timeout)
 
+        try:
+            if ori_file_path is None:
+                raise TimeoutException(f'{disease} download not finished after {args.download_timeout}s')
+            new_file_path = os.path.join(download_rename_path, disease_file_name(disease))
+
+            # 逐行加上疾病名稱欄位，直接寫入目的檔，不需整個檔案讀進記憶體
+            prefix_column(ori_file_path, new_file_path, 'Disease Name', disease)
+
+            logging.info(f'Renamed and updated file: {new_file_path}')
+        
+        except:
+            logging.warning(f'{disease} Renamed and updated file Failed!!!!')
+            status = 'failed'
+            
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        logging.warning(f'{disease} Something Failed when ckicking!!!!')
+        if driver:
+            screenshots.capture(driver, next_step(f"{disease}_error.png"), key=disease, failed=True)
+        status = 'failed'
+
+    finally:
+        pool.release(driver)
+
+    return status
+
+
+# Columns of the ClinVar "Tabular (text)" download that the E-utilities engine reproduces
+CLINVAR_COLUMNS = ["Name", "Gene(s)", "Protein change", "Condition(s)", "Accession",
+                   "GRCh37Chromosome", "GRCh37Location", "GRCh38Chromosome", "GRCh38Location",
+                   "VariationID", "dbSNP ID", "Canonical SPDI", "Variant type", "Molecular consequence",
+                   "Germline classification", "Germline date last evaluated", "Germline review status"]
+
+
+def disease_file_name(disease):
+    rename_disease = disease.replace(","," ").replace(" ","_").replace("/","_")
+    return f"{rename_disease}.txt"
+
+
+def clinvar_summary_row(doc):
+    variation = (doc.get('variation_set') or [{}])[0]
+    locations = {loc.get('assembly_name'): loc for loc in variation.get('variation_loc', [])
+                 if loc.get('status', 'current') == 'current'}
+    grch37, grch38 = locations.get('GRCh37', {}), locations.get('GRCh38', {})
+
+    def position(loc):
+        start, stop = loc.get('start', ''), loc.get('stop', '')
+        return start if start == stop else f"{start} - {stop}"
+
+    dbsnp = [f"rs{xref['db_id']}" for xref in variation.get('variation_xrefs', []) if xref.get('db_source') == 'dbSNP']
+    classification = doc.get('germline_classification') or {}
+    conditions = [trait.get('trait_name', '') for trait in classification.get('trait_set', [])]
+
+    row = [doc.get('title', ''),
+           '|'.join(gene.get('symbol', '') for gene in doc.get('genes', [])),
+           doc.get('protein_change', ''),
+           '|'.join(conditions),
+           doc.get('accession_version') or doc.get('accession', ''),
+           grch37.get('chr', ''), position(grch37),
+           grch38.get('chr', ''), position(grch38),
+           doc.get('uid', ''),
+           '|'.join(dbsnp),
+           variation.get('canonical_spdi', ''),
+           variation.get('variant_type', ''),
+           '|'.join(doc.get('molecular_consequence_list', [])),
+           classification.get('description', ''),
+           classification.get('last_evaluated', ''),
+           classification.get('review_status', '')]
+    return [str(value).replace("\t", " ").replace("\n", " ") for value in row]
+
+
+def fetch_disease_eutils(client, download_rename_path, disease):
+    logging.info("")
+    try:
+        ids = client.search('clinvar', disease)
+        if not ids:
+            logging.info(f"No items found for {disease}. No download will be performed.")
+            return 'no_results'
+
+        new_file_path = os.path.join(download_rename_path, disease_file_name(disease))
+        part_file_path = f"{new_file_path}.part"
+        with open(part_file_path, 'w') as file:
+            file.write("Disease Name\t" + "\t".join(CLINVAR_COLUMNS) + "\n")
+            for doc in client.summaries('clinvar', ids):
+                file.write(f"{disease}\t" + "\t".join(clinvar_summary_row(doc)) + "\n")
+        os.replace(part_file_path, new_file_path)
+
+        logging.info(f'Saved E-utilities results: {new_file_path}')
+        return 'ok'
+
+    except Exception as e:
+        logging.warning(f'{disease} E-utilities fetch failed: {e}')
+        return 'failed'
 
 
 def main():
-    driver_path = './chromedriver-linux64/chromedriver'
-    base_url = 'https://www.ncbi.nlm.nih.gov/clinvar/'   
-    download_path = f'{script_dir}/outputs/clinvar_download'
-    download_rename_path = f'{script_dir}/outputs/rename_clinvar_download'
-    screenshot_dir_path = f'{script_dir}/screenshots/{log_time}_clinvar_screenshot' 
+    base_url = args.base_url
+    download_path = f'{output_dir}/clinvar_download'
+    download_rename_path = f'{output_dir}/rename_clinvar_download'
 
     os.makedirs(download_path, exist_ok=True)
     os.makedirs(download_rename_path, exist_ok=True)
-    os.makedirs(screenshot_dir_path, exist_ok=True)
-
-    disease_list = []
-    no_results_list = [] 
-    download_failed_list = [] 
-    
-    with open(args.input, 'r') as file:
-        for line in file:
-            disease_list.append(line.strip())
-    
-
-    for disease in disease_list:
-        logging.info("")
-        driver = init_driver(driver_path, download_path)
-        driver.get(base_url)           
-        try:            
-            search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "term")))
-            search_box.clear()
-            search_box.send_keys(disease)
-            search_box.send_keys(Keys.RETURN)
-            
-            time.sleep(5)  # Give the page time to load
 
-            driver.set_window_size(1920, 1920)
-            file_name = next_step(f"{disease}_search_results.png")
-            screenshot_path = f"{screenshot_dir_path}/{file_name}"
-            driver.save_screenshot(screenshot_path)
-            logging.info(f'Screenshot saved: {screenshot_path}')
-
-            # Check for "No items found" message
-            no_items_found = driver.find_elements(By.XPATH, "//*[contains(text(), 'No items found')]")
-            if no_items_found:
-                logging.info(f"No items found for {disease}. No download will be performed.")
-                # no_results_list.append(disease)  # Store the disease with no results
-                with open('./no_results_disease_list.txt', 'a') as f:
-                    f.write(disease + '\n')
+    # 每個 browser session 使用 download_path 下自己的下載資料夾
+    with RunContext(args, 'clinvar', script_dir, log_time, download_dir=download_path) as run:
+        if args.engine == 'browser':
+            run.prewarm([base_url])
+
+        # 逐行讀取疾病清單（可為 gzip），空行略過
+        disease_list = read_lines(args.input)
+
+        # 所有疾病串流合併成一個 Parquet dataset（每個 row group 依 Disease Name、Name 排序）
+        merged = MergedDataset(args.merged) if args.merged else None
+        if merged:
+            run.on_close(merged.close)
+
+        # 續跑：略過已下載或已確認無結果的疾病
+        checkpoint = run.checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+        finished = set()
+        if args.resume:
+            finished = set(checkpoint.keys) if checkpoint else set()
+            if merged:
+                finished |= merged.diseases()
+            logging.info(f'Resume: skipping {len(finished)} diseases in the checkpoint or merged dataset and any already downloaded')
+
+        if args.engine == 'eutils':
+            client = EUtilsClient(args.eutils_url, api_key=args.api_key, maxsize=args.workers, limiter=run.limiter)
+            lookup = lambda disease: fetch_disease_eutils(client, download_rename_path, disease)
+        else:
+            lookup = lambda disease: download_disease(run.pool, run.limiter, base_url, run.screenshots, download_rename_path, disease)
+
+        def done(disease, disease_file_path=None):
+            if disease_file_path and args.merged_only:
+                os.remove(disease_file_path)
+            if checkpoint:
+                checkpoint.add(disease)
+
+        def finish(disease, status):
+            if merged and status == 'ok':
+                # 合併的資料寫入 Parquet 後才刪檔與記入 checkpoint，中途當掉不會遺失疾病
+                disease_file_path = os.path.join(download_rename_path, disease_file_name(disease))
+                merged.add_file(disease_file_path, disease, on_merged=lambda: done(disease, disease_file_path))
+            else:
+                done(disease)
+
+        def remaining(diseases):
+            for disease in diseases:
+                if disease in finished:
+                    continue
+                disease_file_path = os.path.join(download_rename_path, disease_file_name(disease))
+                if os.path.exists(disease_file_path):
+                    # 已下載但未寫入合併 dataset（上次在 flush 前中斷）：直接合併，不重新下載
+                    if merged:
+                        finish(disease, 'ok')
+                    continue
+                yield disease
+
+        if args.resume:
+            disease_list = remaining(disease_list)
+
+        # 失敗的疾病留到最後重試；無結果與最終失敗的疾病寫入 failure manifest
+        retry = run.retry(args.eutils_url if args.engine == 'eutils' else base_url, 'clinvar',
+                          failed=lambda status: status == 'failed', empty=lambda status: status == 'no_results')
+
+        for disease, status, reason in run_ordered(retry.guard(lookup), disease_list, args.workers):
+            if reason:
+                retry.add(disease, reason, status)
             else:
-                # If results are found, look for the download link and click it
-                download_link = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.LINK_TEXT, "Download")))
-                download_link.click()
-                file_name = next_step(f"{disease}_click_download.png")
-                screenshot_path = f"{screenshot_dir_path}/{file_name}"
-                driver.save_screenshot(screenshot_path)
-                logging.info(f'Screenshot saved: {screenshot_path}')
-
-                time.sleep(5)
-
-                # Wait for the file_sort element to be present
-                file_sort_link = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "file_sort")))
-                file_sort_link.click()
-                file_name = next_step(f"{disease}_click_filesort.png")
-                screenshot_path = f"{screenshot_dir_path}/{file_name}"
-                driver.save_screenshot(screenshot_path)
-                logging.info(f'Screenshot saved: {screenshot_path}')
-
-                # Select the "Relevance" option from the dropdown
-                select = Select(file_sort_link)
-                select.select_by_visible_text("Relevance")
-                file_name = next_step(f"{disease}_select_relevance.png")
-                screenshot_path = f"{screenshot_dir_path}/{file_name}"
-                driver.save_screenshot(screenshot_path)
-                logging.info(f'Screenshot saved: {screenshot_path}')
-
-                files_in_download_path = glob(os.path.join(download_path, "*"))
-                if len(files_in_download_path) != 0:
-                    for file_path in files_in_download_path:
-                        os.remove(file_path)
-                        logging.info(f'Removed file: {file_path}')
-
-                # Now click the button to submit the request
-                create_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.NAME, "EntrezSystem2.PEntrez.clinVar.clinVar_Entrez_ResultsPanel.Entrez_DisplayBar.SendToSubmit")))
-                create_button.click()
-                file_name = next_step(f"{disease}_download_results.png")
-                screenshot_path = f"{screenshot_dir_path}/{file_name}"
-                driver.save_screenshot(screenshot_path)
-                logging.info(f'Screenshot saved: {screenshot_path}')
-
-                time.sleep(300)
-
-                try:
-                    ori_file_path = glob(os.path.join(download_path, "*.txt"))[0]
-                    rename_disease = disease.replace(","," ").replace(" ","_").replace("/","_")
-                    new_file_path = os.path.join(download_rename_path, f"{rename_disease}.txt")
-
-                    with open(ori_file_path, 'r') as file:
-                        lines = file.readlines()
-
-                    header = lines[0].strip()
-                    new_header = f"Disease Name\t{header}\n"  # Assuming columns are tab-separated
-
-                    # Prepend the disease name to each row starting from the second line
-                    new_content = [new_header]  # Start with the new header
-                    for line in lines[1:]:
-                        new_content.append(f"{disease}\t{line}")
-
-                    # Write the updated content back to the file
-                    with open(ori_file_path, 'w') as file:
-                        file.writelines(new_content)
-
-                    os.rename(ori_file_path, new_file_path)
-
-                    logging.info(f'Renamed and updated file: {new_file_path}')
-                
-                except:
-                    logging.warning(f'{disease} Renamed and updated file Failed!!!!')
-                    with open('./download_failed_disease_list.txt', 'a') as f:
-                        f.write(disease + '\n')
-                    logging.info(f'{disease} saved to download_failed_disease_list.txt')
-                
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            logging.warning(f'{disease} Something Failed when ckicking!!!!')
-            with open('./download_failed_disease_list.txt', 'a') as f:
-                        f.write(disease + '\n')
-            logging.info(f'{disease} saved to download_failed_disease_list.txt')
-
-        driver.quit()
+                finish(disease, status)
+        for disease, status, reason in retry.drain(lookup, args.workers):
+            if reason:
+                logging.warning(f'{disease} failed after {args.retries + 1} attempts')
+            else:
+                finish(disease, status)
+
+    for session_dir in glob(os.path.join(download_path, "session-*")):
+        if not os.listdir(session_dir):
+            os.rmdir(session_dir)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Download diease info from NCBI-Clinvar.')
-    parser.add_argument('--input', help='Input file path. Default="./inputs/ncbi-clinvar_example_list.txt"', default="./inputs/ncbi-clinvar_example_list.txt")
+    parser.add_argument('--input', help='Input disease list, one per line, plain or gzip. Default="./inputs/ncbi-clinvar_example_list.txt"', default="./inputs/ncbi-clinvar_example_list.txt")
+    parser.add_argument('--output-dir', help='Directory for the downloaded and renamed disease files. Default="<script dir>/outputs"', default=None)
+    parser.add_argument('--base-url', help=f'ClinVar search page, e.g. a local stand-in server. Default="{CLINVAR_URL}"', default=CLINVAR_URL)
+    parser.add_argument('--download-timeout', type=int, help='Seconds to wait for each ClinVar download to finish. Default=300', default=300)
+    parser.add_argument('--resume', action='store_true', help='Skip diseases whose renamed download already exists')
+    parser.add_argument('--checkpoint', help='Side-car file recording finished diseases, e.g. "./outputs/clinvar.checkpoint". Default=off', default=None)
+    parser.add_argument('--engine', choices=['browser', 'eutils'], help='Fetch through the ClinVar web UI or the E-utilities API. Default="browser"', default='browser')
+    parser.add_argument('--eutils-url', help=f'E-utilities base URL. Default="{EUTILS_URL}"', default=EUTILS_URL)
+    parser.add_argument('--api-key', help='NCBI API key for E-utilities (raises the rate limit). Default=$NCBI_API_KEY', default=os.environ.get('NCBI_API_KEY'))
+    parser.add_argument('--merged', help='Also append every disease to one zstd Parquet dataset directory, e.g. "./outputs/clinvar_merged.parquet". Default=off', default=None)
+    parser.add_argument('--merged-only', action='store_true', help='With --merged, delete the per-disease .txt files once they are merged')
+    add_common_args(parser, './outputs/clinvar_failures.json', noun='diseases', recycle_after=20, rows=False, dedup=False, resume=False)
     args = parser.parse_args()
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    output_dir = args.output_dir or f'{script_dir}/outputs'
+
+    log_time = setup_logging(script_dir, 'clinvar_automator')
 
-    os.makedirs(f'{script_dir}/logs', exist_ok=True)    
-    log_time = datetime.now().strftime("%Y-%m-%d")
-    logFileName = f'{script_dir}/logs/clinvar_automator_{log_time}.log'
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', 
-                        datefmt='%Y-%m-%d %H:%M:%S',
-                        level=logging.INFO,
-                        handlers=[
-                            logging.FileHandler(logFileName, mode='a'),
-                            logging.StreamHandler()
-                        ])
-
-    # Global step counter
-    step_counter = 0
-    
-    main()
\ No newline at end of file
+    main()
@@ -1,133 +1,79 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import tempfile, json, logging, time, re, os, zipfile, sys, argparse, configparser
-from datetime import datetime, timedelta
-from glob import glob
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import Select
-import pandas as pd
-
-
-def init_driver(driverpath, download_dir=None, implicit_wait=10):
-    logging.info('Initializing driver')
-    
-    options = webdriver.ChromeOptions()
-    options.add_argument('--no-sandbox')
-    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
-    options.add_argument('--disable-dev-shm-usage')
-
-    if download_dir is None:
-        download_dir = tempfile.gettempdir()
-        
-    prefs = {
-        "download.default_directory": download_dir,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    
-    service = Service(driverpath)
-    options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(implicit_wait)
-    logging.info('Driver initialized successfully')
-    
-    return driver
+import os, argparse
+from genebots import RunContext, add_common_args, add_queue_args, read_rows, run_ordered
+from genebots.core import setup_logging
+from genebots.sources.dbsnp import BASE_URL, DbSnpSource
+from genebots.planner import normalize_rsid
+from genebots.refsnp import REFSNP_URL
 
 
 def main():
-    driver_path = './chromedriver-linux64/chromedriver'
-    base_url = 'https://www.ncbi.nlm.nih.gov/snp/'   
-    screenshot_dir_path = f'{script_dir}/screenshots/{log_time}_dbsnp_screenshot' 
-    os.makedirs(screenshot_dir_path, exist_ok=True)
-
-    disease_list = []
-    no_results_list = [] 
-    download_failed_list = []
-
-    df =  pd.read_csv(args.input, header=0)
-    
-    csv_filename = args.output
-    if not os.path.exists(csv_filename) or os.path.getsize(csv_filename) == 0: # 檔案不存在或為空寫入column name
-        with open(csv_filename, 'w', newline='') as f:
-            f.write("Unnamed: 0,#Uploaded_variation,GRCh38,GRCh37\n")
-
-    df['GRCh38'] = None
-    df['GRCh37'] = None
-    
-    for index, snp in enumerate(df['#Uploaded_variation']):
-        logging.info("")
-        num = df.iloc[index]['Unnamed: 0']
-
-        driver = None   
-        try: 
-            driver = init_driver(driver_path)
-            driver.get(base_url)
-
-            search_box = WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.ID, "term")))
-            search_box.clear()
-            search_box.send_keys(snp)
-            search_box.send_keys(Keys.RETURN)
-            
-            # time.sleep(2)  # Give the page time to load
-
-            driver.set_window_size(1920, 1920)
-            file_name = f"{num}-{snp}_search_results.png"
-            screenshot_path = f"{screenshot_dir_path}/{file_name}"
-            driver.save_screenshot(screenshot_path)
-            logging.info(f'Screenshot saved: {screenshot_path}')
-
-            grch38, grch37 = None, None
-
-            try:
-                chromosome_label = driver.find_element(By.XPATH, "//dt[contains(text(), 'Chromosome:')]")
-                chromosome_values = chromosome_label.find_element(By.XPATH, "following-sibling::dd").text
-                chromosome_list = chromosome_values.split("\n")
-
-                if len(chromosome_list) >= 2:
-                    grch38 = chromosome_list[0].strip()
-                    grch37 = chromosome_list[1].strip()
-                else:
-                    logging.warning(f"No Chromosome results found for SNP {snp}.")
-
-            except Exception as e:
-                logging.error(f'Error: {e}')
-        
-        except Exception as e:
-            grch38, grch37 = None, None
-
-        finally:
-            if driver:                   
-                driver.quit()
-        
-        # 逐行寫入 CSV
-        with open(csv_filename, 'a', newline='') as f:
-            pd.DataFrame([[num, snp, grch38, grch37]], columns=['Unnamed: 0','#Uploaded_variation', 'GRCh38', 'GRCh37']).to_csv(f, index=False, header=False)
+    output_file = args.output
+
+    with RunContext(args, 'dbsnp', script_dir, log_time) as run:
+        # dbSNP 網頁或 refsnp JSON API（--engine http）；結果經由共用快取
+        source = run.source(DbSnpSource, base_url=args.base_url, engine=args.engine, refsnp_url=args.refsnp_url,
+                            fallback=args.fallback, maxsize=args.workers)
+        run.prewarm(source.prewarm_urls())
+
+        # 逐列讀取（CSV/TSV，可為 gzip/bgzip），不把整個輸入載入記憶體
+        rows = read_rows(args.input, ['Unnamed: 0', '#Uploaded_variation'], row_number='Unnamed: 0')
+
+        # 工作佇列：多個行程或容器共用 --queue，各自租用一批 rsID；最後完成的 worker 寫出 --output
+        queue = run.work_queue(rows, key=lambda row: normalize_rsid(row[1]))
+
+        # 續跑：略過已完成的 key，error 的列重新排入
+        rows = run.resume(rows, output_file, 'Unnamed: 0', ['GRCh38', 'GRCh37'])
+
+        # 輸出先暫存，批次寫入 CSV 或 Parquet；佇列模式在整個 job 完成後一次寫出
+        columns, types = ['Unnamed: 0', '#Uploaded_variation', 'GRCh38', 'GRCh37'], {'Unnamed: 0': 'int64'}
+        sink = None if queue else run.output(output_file, columns, types)
+
+        # 失敗的查詢留到最後重試；同一網站連續失敗時暫停查詢
+        retry = run.retry(source.base_url, 'dbsnp',
+                          failed=lambda result: 'error' in result[2:], empty=lambda result: result[2] is None and result[3] is None,
+                          key=lambda row: row[1], manifest=not queue)
+
+        lookup = lambda row: [row[0], row[1], *source.lookup(row[0], normalize_rsid(row[1]), run.cache)[0]]
+        fan_out = lambda row, result: [row[0], row[1], *(result[2:] if result else ['error', 'error'])]
+
+        if queue:
+            # 佇列已去重；失敗的 rsID 交回佇列，延遲後由任一 worker 重試
+            if not args.queue_export:
+                queue.run(retry.guard(lookup), args.workers, args.batch_size, empty=retry.empty, wait=retry.wait_time)
+            if queue.claim_export(force=args.queue_export):
+                queue.export(output_file, columns, lambda row, result: [fan_out(row, result)], types=types)
+                queue.write_manifest(args.failure_manifest, 'dbsnp')
+            return
+
+        # 相同 rsID 只查一次，結果再分配回每一列；只記住最近 --dedup-window 個 rsID
+        dedup = run.dedup(lookup, key=lambda row: normalize_rsid(row[1]), fan_out=fan_out, failed=retry.failed)
+        for row, result, reason in run_ordered(retry.guard(dedup), rows, args.workers):
+            if reason:
+                retry.add(row, reason, result)
+                continue
+            # 依輸入順序寫入
+            sink.write([result], key=result[0])
+        for row, result, reason in retry.drain(dedup, args.workers):
+            sink.write([fan_out(row, result)], key=row[0])
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Get SNP GRCh38 GRCh37 position from NCBI-dbSNP.')
-    parser.add_argument('--input', help='Input file path. Default="./inputs/ncbi-dbSNP_example.csv"', default="./inputs/ncbi-dbSNP_example.csv")
-    parser.add_argument('--output', help='Output file path. Default="./outputs/ncbi-dbSNP_example_output.csv"', default="./outputs/ncbi-dbSNP_example_output.csv")
-    args = parser.parse_args()    
+    parser.add_argument('--input', help='Input CSV/TSV file path, plain or gzip/bgzip. Default="./inputs/ncbi-dbSNP_example.csv"', default="./inputs/ncbi-dbSNP_example.csv")
+    parser.add_argument('--output', help='Output file path, .csv or .parquet. Default="./outputs/ncbi-dbSNP_example_output.csv"', default="./outputs/ncbi-dbSNP_example_output.csv")
+    parser.add_argument('--base-url', help=f'dbSNP search page, e.g. a local stand-in server. Default="{BASE_URL}"', default=BASE_URL)
+    parser.add_argument('--engine', choices=['browser', 'http'], help='Look SNPs up in the dbSNP web page or the refsnp JSON API. Default="browser"', default='browser')
+    parser.add_argument('--refsnp-url', help=f'refsnp API base URL. Default="{REFSNP_URL}"', default=REFSNP_URL)
+    parser.add_argument('--no-fallback', dest='fallback', action='store_false', help='Do not fall back to the browser for SNPs the API cannot resolve')
+    add_queue_args(parser, 'dbsnp')
+    add_common_args(parser, './outputs/dbsnp_failures.json', noun='SNPs')
+    args = parser.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    os.makedirs(f'{script_dir}/logs', exist_ok=True)    
-    log_time = datetime.now().strftime("%Y-%m-%d")
-    logFileName = f'{script_dir}/logs/clinvar_automator_{log_time}.log'
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', 
-                        datefmt='%Y-%m-%d %H:%M:%S',
-                        level=logging.INFO,
-                        handlers=[
-                            logging.FileHandler(logFileName, mode='a'),
-                            logging.StreamHandler()
-                        ])
-    
-    main()
\ No newline at end of file
+    log_time = setup_logging(script_dir, 'dbSNP_automator')
+
+    main()
@@ -1,177 +1,78 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import tempfile, json, logging, time, re, os, zipfile, sys, argparse, configparser
-import smtplib
-from email.mime.text import MIMEText
-from threading import Thread
-from datetime import datetime, timedelta
-from glob import glob
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import Select
-import pandas as pd
-import csv
-
-def next_step(tag_name):
-    global step_counter
-    step_counter += 1    
-    
-    return f'{step_counter:02d}-{tag_name}'
-
-
-def init_driver(driverpath, download_dir=None, implicit_wait=30):
-    logging.info('Initializing driver')
-    
-    options = webdriver.ChromeOptions()
-    options.add_argument('--no-sandbox')
-    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
-    options.add_argument('--disable-dev-shm-usage')
-
-    if download_dir is None:
-        download_dir = tempfile.gettempdir()
-        
-    prefs = {
-        "download.default_directory": download_dir,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    
-    service = Service(driverpath)
-    options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(implicit_wait)
-    logging.info('Driver initialized successfully')
-    
-    return driver
-
-
+import os, argparse
+from genebots import RunContext, add_common_args, add_queue_args, add_replay_args, check_replay_args, read_rows, run_ordered
+from genebots.core import setup_logging
+from genebots.sources.taiwanview import BASE_URL, TaiwanViewSource
+from genebots.planner import normalize_rsid
 
 
 def main():
-    driver_path = './chromedriver-linux64/chromedriver'
-    base_url = 'https://taiwanview.twbiobank.org.tw/variant.php'   
-    screenshot_dir_path = f'{script_dir}/screenshots/{log_time}_taiwanview_screenshot' 
-
-    os.makedirs(screenshot_dir_path, exist_ok=True)
-    
-    df = pd.read_csv(args.input, header=0)
-
+    base_url = args.base_url
     output_file = args.output
-    dir_path = os.path.dirname(output_file)
-    os.makedirs(dir_path, exist_ok = True)
-
-    # 若 CSV 檔案不存在，則寫入標題行
-    if not os.path.exists(output_file):
-        with open(output_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["#", "rs ID", "gene", "freq"])
-    
-    for index, row in df.iterrows():
-        id = row['rs ID']
-        # id = 'rs6683165'
-        number = row['#']
-        
-        # 初始化 WebDriver 並訪問網站
-        logging.info("")
-        driver = init_driver(driver_path)
-        driver.implicitly_wait(0)
-        driver.get(base_url)
-
-        # 選擇 "Whole genome sequence: Illumina (GRCh38)"
-        database = Select(driver.find_element("id", "database"))
-        database.select_by_visible_text("Whole genome sequence: Illumina (GRCh38)")
-
-        # 選擇 "RS ID"
-        searchby = Select(driver.find_element("id", "searchBy"))
-        searchby.select_by_visible_text("RS ID")
-
-        # 填入 RS ID
-        search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "geneOrVariant")))
-        search_box.clear()
-        search_box.send_keys(id)
-
-        # 儲存搜索頁面的截圖
-        driver.set_window_size(1920, 1920)
-        file_name = next_step(f"{id}_search.png")
-        screenshot_path = f"{screenshot_dir_path}/{file_name}"
-        driver.save_screenshot(screenshot_path)
-        logging.info(f'Screenshot saved: {screenshot_path}')
-                
-        try:
-            # 提交搜索
-            submit = driver.find_element(By.XPATH, "//button[@type='submit']")
-            submit.click()
-            
-            time.sleep(3)  # 給頁面加載時間
-            
-            # 儲存結果頁面的截圖
-            file_name = next_step(f"{id}_result.png")
-            screenshot_path = f"{screenshot_dir_path}/{file_name}"
-            driver.save_screenshot(screenshot_path)
-            logging.info(f'Screenshot saved: {screenshot_path}')
-            
-            # 檢查 `tbody` 是否為空
-            rows = driver.find_elements("xpath", "//div[@id='datatable']/table/tbody/tr")
-            
-            if not rows:
-                # 若 `tbody` 為空，設定 `gene` 和 `all_freq` 為 None
-                gene = None
-                all_freq = None
-                logging.info(f"{id} | No data available.")
-            else:
-                # 提取 gene 資料
-                gene = driver.find_element("xpath", "//div[@id='datatable']/table/tbody/tr[1]/td[3]").text
-                gene = gene.replace("\n", " ")
-                logging.info(f"{id} | GENE: {gene}")
-
-                # 提取 freq 資料
-                freq_cells = driver.find_elements("xpath", "//div[@id='datatable']/table/tbody/tr/td[6]")
-                freqs = [cell.text.replace("\n", " ") for cell in freq_cells]
-                
-                all_freq = ",".join(freqs)
-                logging.info(f"{id} | All FREQ: {all_freq}")
-
-        except Exception as e:
-            # 若發生錯誤，設定 `gene` 和 `all_freq` 為 None 並記錄錯誤
-            gene = None
-            all_freq = None
-            logging.error(f"Error processing {id}: {e}")
-
-        # 將 number, id, gene 和 all_freq 寫入 CSV
-        with open('./combine_rs_ID_list_update.csv', 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([number, id, gene, all_freq])
-
-        driver.quit()
+
+    with RunContext(args, 'taiwanview', script_dir, log_time) as run:
+        # 直接重送表單的查詢請求（--engine http），回應格式不符時才開瀏覽器；結果經由共用快取
+        source = run.source(TaiwanViewSource, base_url=base_url, engine=args.engine, replay_url=args.replay_url,
+                            replay_method=args.replay_method, fallback=args.fallback, maxsize=args.workers)
+        run.prewarm(source.prewarm_urls())
+
+        # 逐列讀取（CSV/TSV，可為 gzip/bgzip），不把整個輸入載入記憶體
+        rows = read_rows(args.input, ['#', 'rs ID'], row_number='#')
+
+        # 工作佇列：多個行程或容器共用 --queue，各自租用一批 rsID；最後完成的 worker 寫出 --output
+        queue = run.work_queue(rows, key=lambda row: normalize_rsid(row[1]))
+
+        # 續跑：略過已完成的 key，error 的列重新排入
+        rows = run.resume(rows, output_file, '#', ['gene', 'freq'])
+
+        # 輸出先暫存，批次寫入 CSV 或 Parquet；佇列模式在整個 job 完成後一次寫出
+        columns, types = ["#", "rs ID", "gene", "freq"], {'#': 'int64', 'freq': 'list<float64>'}
+        sink = None if queue else run.output(output_file, columns, types)
+
+        # 失敗的查詢留到最後重試；同一網站連續失敗時暫停查詢
+        retry = run.retry(source.base_url, 'taiwanview',
+                          failed=lambda result: 'error' in result[2:], empty=lambda result: result[2] is None and result[3] is None,
+                          key=lambda row: row[1], manifest=not queue)
+
+        lookup = lambda row: [row[0], row[1], *source.lookup(row[0], normalize_rsid(row[1]), run.cache)[0]]
+        fan_out = lambda row, result: [row[0], row[1], *(result[2:] if result else ['error', 'error'])]
+
+        if queue:
+            # 佇列已去重；失敗的 rsID 交回佇列，延遲後由任一 worker 重試
+            if not args.queue_export:
+                queue.run(retry.guard(lookup), args.workers, args.batch_size, empty=retry.empty, wait=retry.wait_time)
+            if queue.claim_export(force=args.queue_export):
+                queue.export(output_file, columns, lambda row, result: [fan_out(row, result)], types=types)
+                queue.write_manifest(args.failure_manifest, 'taiwanview')
+            return
+
+        # 相同 rsID 只查一次，結果再分配回每一列；只記住最近 --dedup-window 個 rsID
+        dedup = run.dedup(lookup, key=lambda row: normalize_rsid(row[1]), fan_out=fan_out, failed=retry.failed)
+        for row, result, reason in run_ordered(retry.guard(dedup), rows, args.workers):
+            if reason:
+                retry.add(row, reason, result)
+                continue
+            # 將 number, id, gene 和 all_freq 依輸入順序寫入
+            sink.write([result], key=result[0])
+        for row, result, reason in retry.drain(dedup, args.workers):
+            sink.write([fan_out(row, result)], key=row[0])
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Get genetic variation info from Taiwan View.')
-    parser.add_argument('--input', help='Input file path. Default="./inputs/taiwanview_example.csv"', default="./inputs/taiwanview_example.csv")
-    parser.add_argument('--output', help='Output file path. Default="./outputs/taiwanview_example_output.csv"', default="./outputs/taiwanview_example_output.csv")
+    parser.add_argument('--input', help='Input CSV/TSV file path, plain or gzip/bgzip. Default="./inputs/taiwanview_example.csv"', default="./inputs/taiwanview_example.csv")
+    parser.add_argument('--output', help='Output file path, .csv or .parquet. Default="./outputs/taiwanview_example_output.csv"', default="./outputs/taiwanview_example_output.csv")
+    parser.add_argument('--base-url', help=f'TaiwanView variant page, e.g. a local stand-in server. Default="{BASE_URL}"', default=BASE_URL)
+    add_replay_args(parser)
+    add_queue_args(parser, 'taiwanview')
+    add_common_args(parser, './outputs/taiwanview_failures.json')
     args = parser.parse_args()
+    check_replay_args(parser, args)
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    os.makedirs(f'{script_dir}/logs', exist_ok=True)    
-    log_time = datetime.now().strftime("%Y-%m-%d")
-    logFileName = f'{script_dir}/logs/taiwanview_automator_{log_time}.log'
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', 
-                        datefmt='%Y-%m-%d %H:%M:%S',
-                        level=logging.INFO,
-                        handlers=[
-                            logging.FileHandler(logFileName, mode='a'),
-                            logging.StreamHandler()
-                        ])
-
-    # Global step counter
-    step_counter = 0
-    
-    main()
\ No newline at end of file
+    log_time = setup_logging(script_dir, 'taiwanview_automator')
+
+    main()
@@ -1,183 +1,344 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import tempfile, json, logging, time, re, os, zipfile, sys, argparse, configparser
-import smtplib
-from email.mime.text import MIMEText
-from threading import Thread
-from datetime import datetime, timedelta
-from glob import glob
-from selenium import webdriver
+import logging, re, os, argparse
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import Select
-import pandas as pd
-import csv
+from genebots import RunContext, add_common_args, add_replay_args, check_replay_args, clear_nodes, read_rows, run_ordered, selected_texts, table_rows, warm_form
+from genebots.core import next_step, setup_logging
+from genebots.metrics import METRICS
+from genebots.waits import LATENCY, ready_outcome, wait_ready
+from genebots.planner import normalize_region, plan_windows
+from genebots.replay import replayed
+from genebots.sources.taiwanview import BASE_URL, replay_client
+
+
+# 表單固定欄位：資料庫與查詢方式
+FORM_STATE = {'database': "Whole genome sequence: Illumina (GRCh38)", 'searchBy': "Region"}
+RESULT_ROWS = "//div[@id='datatable']/table/tbody/tr"
+
+
+def setup_form(driver, base_url):
+    with METRICS.timer('load', 'taiwanview-xy'):
+        driver.get(base_url)
+
+        # 選擇 "Whole genome sequence: Illumina (GRCh38)"
+        database = Select(driver.find_element("id", "database"))
+        database.select_by_visible_text(FORM_STATE['database'])
+
+        # 選擇 "Region"
+        searchby = Select(driver.find_element("id", "searchBy"))
+        searchby.select_by_visible_text(FORM_STATE['searchBy'])
 
-def next_step(tag_name):
-    global step_counter
-    step_counter += 1    
-    
-    return f'{step_counter:02d}-{tag_name}'
 
+def search_region(driver, base_url, screenshots, id, chr, chr_from, chr_to, warm=False, slot=None):
+    if warm:
+        # 表單設定仍在就只換掉查詢值，否則重新載入頁面
+        warm_form(driver, 'taiwanview-region', lambda driver: setup_form(driver, base_url),
+                  check=lambda driver: selected_texts(driver, FORM_STATE) == FORM_STATE)
+    else:
+        setup_form(driver, base_url)
 
-def init_driver(driverpath, download_dir=None, implicit_wait=30):
-    logging.info('Initializing driver')
+    # 填入 chr chrfrom chrto
+    searchby = Select(driver.find_element("id", "chr"))
+    if "X" in chr:
+        searchby.select_by_visible_text("ChrX")
+    else:
+        searchby.select_by_visible_text("ChrY")
     
-    options = webdriver.ChromeOptions()
-    options.add_argument('--no-sandbox')
-    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
-    options.add_argument('--disable-dev-shm-usage')
+    chrFrom_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "chrFrom")))
+    chrFrom_box.clear()
+    chrFrom_box.send_keys(chr_from)
 
-    if download_dir is None:
-        download_dir = tempfile.gettempdir()
+    chrTo_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "chrTo")))
+    chrTo_box.clear()
+    chrTo_box.send_keys(chr_to)
+
+    driver.set_window_size(1920, 1920)
+    screenshots.capture(driver, next_step(f"{id}_search.png"), key=id)
         
-    prefs = {
-        "download.default_directory": download_dir,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
+    # submit；先移除舊的結果列，避免讀到前一次的表格
+    clear_nodes(driver, RESULT_ROWS)
+    submit = driver.find_element(By.XPATH, "//button[@type='submit']")
+    submit.click()
+    
+    # 等到結果表格或「無資料」標記出現
+    ready = wait_ready(driver, 'taiwanview')
+    if slot:
+        slot.outcome = ready_outcome(ready)
     
-    service = Service(driverpath)
-    options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(implicit_wait)
-    logging.info('Driver initialized successfully')
+    # screenshot for result
+    screenshots.capture(driver, next_step(f"{id}_result.png"), key=id)
     
-    return driver
+    # 一次取回整個結果表格
+    with METRICS.timer('extract', 'taiwanview-xy'):
+        rows = [] if ready == 'empty' else table_rows(driver, RESULT_ROWS)
+    if ready is None and not rows:
+        raise TimeoutException(f"results not loaded after {LATENCY.timeout('taiwanview'):.0f}s")
+    return rows
 
 
-def main():
-    driver_path = './chromedriver-linux64/chromedriver'
-    base_url = 'https://taiwanview.twbiobank.org.tw/variant.php'   
-   screenshot_dir_path = f'{script_dir}/screenshots/{log_time}_vietnamese_screenshot'
+def region_params(chr, chr_from, chr_to):
+    # 重送 Region 查詢時送出的表單欄位
+    return {**FORM_STATE, 'chr': "ChrX" if "X" in chr else "ChrY", 'chrFrom': chr_from, 'chrTo': chr_to}
 
-    os.makedirs(screenshot_dir_path, exist_ok=True)
-    
-    df = pd.read_csv(args.input, header=0)
-    output_file = args.output
-    dir_path = os.path.dirname(output_file)
-    os.makedirs(dir_path, exist_ok = True)
-
-    # 若 CSV 檔案不存在，則寫入標題行
-    if not os.path.exists(output_file):
-        with open(output_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["#", "rs ID", "gene", "freq"])
-    
-    for index, row in df.iterrows():
-        id = row['rs ID']
-        number = row['#']
-        chr = row['hg38 chromosome']
-        location = row['Location']
+
+def region_result(id, rows):
+    gene, all_freq = None, None
+    if not rows:
+        # 若 `tbody` 為空，設定 `gene` 和 `all_freq` 為 None
+        logging.info(f"{id} | No data available.")
+    else:
+        # get gene data
+        gene = rows[0]['td'][2]
+        gene = gene.replace("\n", " ")
+        logging.info(f"{id} | GENE: {gene}")
+
+        # get freq data
+        freqs = [row['td'][5].replace("\n", " ") for row in rows if len(row['td']) > 5]
         
-        logging.info("")
-        driver = init_driver(driver_path)
-        driver.implicitly_wait(0)
-        driver.get(base_url)
+        all_freq = ",".join(freqs)
+        logging.info(f"{id} | All FREQ: {all_freq}")
+    return gene, all_freq
 
-        # 選擇 "Whole genome sequence: Illumina (GRCh38)"
-        database = Select(driver.find_element("id", "database"))
-        database.select_by_visible_text("Whole genome sequence: Illumina (GRCh38)")
 
-        # 選擇 "Region"
-        searchby = Select(driver.find_element("id", "searchBy"))
-        searchby.select_by_visible_text("Region")
+def lookup_region(pool, limiter, base_url, screenshots, number, id, chr, location, warm=False, client=None, fallback=True):
+    logging.info("")
+    gene, all_freq = None, None
+
+    driver = None
+    try:
+        # 有 client 時直接重送 Region 查詢，回應格式不符才開瀏覽器
+        rows = replayed(client, region_params(chr, location, location), id, fallback)
+        if rows is None:
+            driver = pool.acquire()
+            with limiter.slot(base_url) as slot:
+                rows = search_region(driver, base_url, screenshots, id, chr, location, location, warm, slot)
+        gene, all_freq = region_result(id, rows)
+
+    except Exception as e:
+        # 若發生錯誤，設定 `gene` 和 `all_freq` 為 'error'，稍後重試
+        gene = 'error'
+        all_freq = 'error'
+        logging.error(f"Error processing {id}: {e}")
+        if driver:
+            screenshots.capture(driver, next_step(f"{id}_error.png"), key=id, failed=True)
+
+    finally:
+        pool.release(driver)
+
+    return [number, id, gene, all_freq]
+
+
+def row_position(row, column):
+    # e.g. "chrX:153863997" 或 "X:153863997-153863998" -> 153863997
+    if len(row['td']) <= column:
+        return None
+    numbers = re.findall(r'\d+', row['td'][column].split(':')[-1].replace(',', ''))
+    return int(numbers[0]) if numbers else None
+
+
+def find_position_column(rows, start, end, column=None):
+    """Index of the result column whose cells are all positions inside [start, end] (only `column` if given); None if there is none."""
+    candidates = [column] if column is not None else range(max(len(row['td']) for row in rows))
+    for candidate in candidates:
+        found = [row_position(row, candidate) for row in rows]
+        if all(position is not None and start <= position <= end for position in found):
+            return candidate
+    return None
+
+
+def lookup_window(pool, limiter, base_url, screenshots, window, position_column=None, max_rows=500, warm=False, client=None, fallback=True):
+    """One Region query for a whole window; returns {position: (gene, all_freq)} for every position in it."""
+    logging.info("")
+    chr, start, end, positions = window
+    tag = f"chr{chr}_{start}-{end}"
+
+    driver = None
+    try:
+        rows = replayed(client, region_params(chr, start, end), tag, fallback)
+        if rows is None:
+            driver = pool.acquire()
+            with limiter.slot(base_url) as slot:
+                rows = search_region(driver, base_url, screenshots, tag, chr, start, end, warm, slot)
 
-        # 填入 chr chrfrom chrto
-        searchby = Select(driver.find_element("id", "chr"))
-        if "X" in chr:
-            searchby.select_by_visible_text("ChrX")
+    except Exception as e:
+        logging.error(f"Error processing {tag}: {e}")
+        if driver:
+            screenshots.capture(driver, next_step(f"{tag}_error.png"), key=tag, failed=True)
+        return {position: ('error', 'error') for position in positions}
+
+    finally:
+        pool.release(driver)
+
+    def one_by_one():
+        return {position: tuple(lookup_region(pool, limiter, base_url, screenshots, None, f"chr{chr}_{position}", chr, position, warm, client, fallback)[2:])
+                for position in positions}
+
+    # 結果列數達上限時表格可能被截斷，改為逐一查詢
+    if len(rows) >= max_rows and len(positions) > 1:
+        logging.warning(f"{tag} | {len(rows)} rows returned, re-querying {len(positions)} positions one by one")
+        return one_by_one()
+
+    # 找出存放位置的欄位；表格版面改變、沒有欄位對得上查詢範圍時，改為逐一查詢
+    column = find_position_column(rows, start, end, position_column) if rows else None
+    if rows and column is None:
+        logging.warning(f"{tag} | {len(rows)} rows but no result column holds positions in {start}-{end} "
+                        f"(table layout changed?), re-querying {len(positions)} positions one by one")
+        return one_by_one()
+
+    # 依位置欄位把結果列分回各個查詢位置
+    by_position = {}
+    for row in rows:
+        by_position.setdefault(row_position(row, column), []).append(row)
+    logging.info(f"{tag} | {len(rows)} rows for {len(positions)} positions")
+    return {position: region_result(f"chr{chr}_{position}", by_position.get(position, [])) for position in positions}
+
+
+def with_cache(cache, lookup):
+    # 先查快取，命中則不開瀏覽器
+    def cached(row):
+        number, id, chr, location = row
+        region = f"{chr}:{location}"
+        hit = cache.get('taiwanview-region', region, 'GRCh38')
+        if hit is not None:
+            logging.info(f"{id} | cache hit ({region})")
+            return [number, id, *hit]
+        result = lookup(row)
+        if (result[2] or result[3]) and 'error' not in result[2:]:
+            cache.put('taiwanview-region', region, result[2:], 'GRCh38')
+        return result
+    return cached
+
+
+def run_rows(run, lookup, sink, retry, rows):
+    # 相同 region 只查一次，結果再分配回每一列；只記住最近 --dedup-window 個 region
+    lookup = run.dedup(lookup,
+                       key=lambda row: normalize_region(row[2], row[3]),
+                       fan_out=lambda row, result: [row[0], row[1], *result[2:]],
+                       failed=retry.failed)
+
+    for row, result, reason in run_ordered(retry.guard(lookup), rows, args.workers):
+        if reason:
+            retry.add(row, reason, result)
+            continue
+        # 將 number, id, gene 和 all_freq 依輸入順序寫入
+        sink.write([result], key=result[0])
+
+
+def run_windows(run, base_url, client, sink, retry, rows):
+    # 依染色體與位置排序，相近位置合併成一個查詢視窗；排序需要完整的 region 清單
+    regions = {}
+    for row in rows:
+        regions.setdefault(normalize_region(row[2], row[3]), []).append(row)
+
+    def write(region, result):
+        for number, id, chr, location in regions[region]:
+            sink.write([[number, id, *result]], key=number)
+
+    def count(outcome, region):
+        # 與逐列模式相同，每個輸入列計一次結果
+        METRICS.count(outcome, retry.source, len(regions[region]))
+
+    pending = []
+    for region in regions:
+        hit = run.cache.get('taiwanview-region', f"{region[0]}:{region[1]}", 'GRCh38') if run.cache else None
+        if hit is not None:
+            count('result' if hit[0] or hit[1] else 'empty', region)
+            write(region, hit)
         else:
-            searchby.select_by_visible_text("ChrY")
-        
-        chrFrom_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "chrFrom")))
-        chrFrom_box.clear()
-        chrFrom_box.send_keys(location)
-
-        chrTo_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "chrTo")))
-        chrTo_box.clear()
-        chrTo_box.send_keys(location)
-
-        driver.set_window_size(1920, 1920)
-        file_name = next_step(f"{id}_search.png")
-        screenshot_path = f"{screenshot_dir_path}/{file_name}"
-        driver.save_screenshot(screenshot_path)
-        logging.info(f'Screenshot saved: {screenshot_path}')
-                
-        try:
-            # submit
-            submit = driver.find_element(By.XPATH, "//button[@type='submit']")
-            submit.click()
-            
-            time.sleep(3)
-            
-            # screenshot for result
-            file_name = next_step(f"{id}_result.png")
-            screenshot_path = f"{screenshot_dir_path}/{file_name}"
-            driver.save_screenshot(screenshot_path)
-            logging.info(f'Screenshot saved: {screenshot_path}')
-            
-            # 檢查 `tbody` 是否為空
-            rows = driver.find_elements("xpath", "//div[@id='datatable']/table/tbody/tr")
-            
-            if not rows:
-                # 若 `tbody` 為空，設定 `gene` 和 `all_freq` 為 None
-                gene = None
-                all_freq = None
-                logging.info(f"{id} | No data available.")
-            else:
-                # get gene data
-                gene = driver.find_element("xpath", "//div[@id='datatable']/table/tbody/tr[1]/td[3]").text
-                gene = gene.replace("\n", " ")
-                logging.info(f"{id} | GENE: {gene}")
-
-                # get freq data
-                freq_cells = driver.find_elements("xpath", "//div[@id='datatable']/table/tbody/tr/td[6]")
-                freqs = [cell.text.replace("\n", " ") for cell in freq_cells]
-                
-                all_freq = ",".join(freqs)
-                logging.info(f"{id} | All FREQ: {all_freq}")
-
-        except Exception as e:
-            # 若發生錯誤，設定 `gene` 和 `all_freq` 為 None 並記錄錯誤
-            gene = None
-            all_freq = None
-            logging.error(f"Error processing {id}: {e}")
-
-        # 將 number, id, gene 和 all_freq 寫入 CSV
-        with open(output_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([number, id, gene, all_freq])
-
-        driver.quit()
+            pending.append(region)
+
+    windows = plan_windows(pending, args.window_span, args.window_max_positions)
+
+    def lookup(window):
+        # circuit breaker 開啟時整個視窗留到最後重試
+        if not retry.breaker.allow(retry.host):
+            return None
+        with METRICS.timer('lookup', retry.source):
+            found = lookup_window(run.pool, run.limiter, base_url, run.screenshots, window, args.position_column, args.window_max_rows, args.warm_form, client, args.fallback)
+        retry.breaker.record(retry.host, any('error' in result for result in found.values()))
+        return found
+
+    # 結果依視窗（染色體、位置）順序寫入；失敗的位置改為逐列重試
+    for window, found in zip(windows, run_ordered(lookup, windows, args.workers)):
+        for position in window[3]:
+            region = (window[0], position)
+            result = found[position] if found else None
+            if result is None or 'error' in result:
+                count('circuit_open' if result is None else 'error', region)
+                for row in regions[region]:
+                    retry.add(row, 'circuit-open' if result is None else 'error', [row[0], row[1], *(result or ('error', 'error'))])
+                continue
+            if run.cache and (result[0] or result[1]):
+                run.cache.put('taiwanview-region', f"{region[0]}:{region[1]}", list(result), 'GRCh38')
+            if result == (None, None):
+                for row in regions[region]:
+                    retry.note_empty(row)
+            count('empty' if result == (None, None) else 'result', region)
+            write(region, result)
+
+
+def main():
+    base_url = args.base_url
+    output_file = args.output
+
+    with RunContext(args, 'taiwanview-xy', script_dir, log_time, lean_source='taiwanview', screenshot_name='taiwanview') as run:
+        run.cache_ttls('taiwanview-region')
+
+        client = None
+        if args.engine == 'http':
+            # 直接重送表單的 Region 查詢請求，回應格式不符時才開瀏覽器
+            client = replay_client(args.replay_url, 'taiwanview-xy', method=args.replay_method, maxsize=args.workers, limiter=run.limiter)
+            run.on_close(client.close)
+        run.prewarm([] if client else [base_url])
+
+        # 逐列讀取（CSV/TSV，可為 gzip/bgzip），不把整個輸入載入記憶體
+        rows = read_rows(args.input, ['#', 'rs ID', 'hg38 chromosome', 'Location'], row_number='#')
+
+        # 續跑：略過已完成的 key，error 的列重新排入
+        rows = run.resume(rows, output_file, '#', ['gene', 'freq'])
+
+        # 輸出先暫存，批次寫入 CSV 或 Parquet
+        sink = run.output(output_file, ["#", "rs ID", "gene", "freq"], types={'#': 'int64', 'freq': 'list<float64>'})
+
+        lookup = lambda row: lookup_region(run.pool, run.limiter, base_url, run.screenshots, *row, warm=args.warm_form, client=client, fallback=args.fallback)
+        if run.cache:
+            lookup = with_cache(run.cache, lookup)
+        lookup = lambda row, lookup=lookup: lookup((row[0], row[1], *normalize_region(row[2], row[3])))
+
+        # 失敗的查詢留到最後重試；同一網站連續失敗時暫停查詢
+        retry = run.retry(args.replay_url if client else base_url, 'taiwanview-xy',
+                          failed=lambda result: 'error' in result[2:], empty=lambda result: result[2] is None and result[3] is None,
+                          key=lambda row: row[1])
+
+        if args.window_span is not None:
+            run_windows(run, base_url, client, sink, retry, rows)
+        else:
+            run_rows(run, lookup, sink, retry, rows)
+        for row, result, reason in retry.drain(lookup, args.workers):
+            sink.write([result or [row[0], row[1], 'error', 'error']], key=row[0])
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Get Sex Chromosome genetic variation info from Taiwan View.')
-    parser.add_argument('--input', help='Input file path. Default="./inputs/taiwanview_xy_example.csv"', default="./inputs/taiwanview_xy_example.csv")
-    parser.add_argument('--output', help='Output file path. Default="./outputs/taiwanview_xy_example_output.csv"', default="./outputs/taiwanview_xy_example_output.csv")
-    args = parser.parse_args()    
-    
+    parser.add_argument('--input', help='Input CSV/TSV file path, plain or gzip/bgzip. Default="./inputs/taiwanview_xy_example.csv"', default="./inputs/taiwanview_xy_example.csv")
+    parser.add_argument('--output', help='Output file path, .csv or .parquet. Default="./outputs/taiwanview_xy_example_output.csv"', default="./outputs/taiwanview_xy_example_output.csv")
+    parser.add_argument('--base-url', help=f'TaiwanView variant page, e.g. a local stand-in server. Default="{BASE_URL}"', default=BASE_URL)
+    add_replay_args(parser)
+    parser.add_argument('--window-span', type=int, help='Batch nearby positions into one Region query spanning at most this many bases (output is then in chromosome/position order). Default=off', default=None)
+    parser.add_argument('--window-max-positions', type=int, help='With --window-span, at most this many input positions per query. Default=50', default=50)
+    parser.add_argument('--window-max-rows', type=int, help='With --window-span, re-query a window position by position when it returns this many rows (table may be truncated). Default=500', default=500)
+    parser.add_argument('--position-column', type=int, help='With --window-span, index of the result table column holding the variant position; checked against the queried window. Default=the first column whose cells are all positions inside the window', default=None)
+    add_common_args(parser, './outputs/taiwanview_xy_failures.json', noun='regions')
+    args = parser.parse_args()
+    check_replay_args(parser, args)
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    os.makedirs(f'{script_dir}/logs', exist_ok=True)    
-    log_time = datetime.now().strftime("%Y-%m-%d")
-    logFileName = f'{script_dir}/logs/taiwanview_automator_{log_time}.log'
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', 
-                        datefmt='%Y-%m-%d %H:%M:%S',
-                        level=logging.INFO,
-                        handlers=[
-                            logging.FileHandler(logFileName, mode='a'),
-                            logging.StreamHandler()s
-                        ])
-
-    # Global step counter
-    step_counter = 0
-    
-    main()
\ No newline at end of file
+    log_time = setup_logging(script_dir, 'taiwanview_automator')
+
+    main()
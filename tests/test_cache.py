@@ -0,0 +1,41 @@
+from genebots import cache as cache_module
+from genebots.cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+
+def test_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock.time)
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), ttls={'dbsnp': 60})
+    cache.put('dbsnp', 'rs1', ['GRCh38'], 'GRCh38')
+    clock.now += 59
+    assert cache.get('dbsnp', 'rs1', 'GRCh38') == ['GRCh38']
+    assert cache.get('dbsnp', 'rs1', 'GRCh37') is None
+    clock.now += 2
+    assert cache.get('dbsnp', 'rs1', 'GRCh38') is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+
+def test_lru_eviction_uses_batched_access_times(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock.time)
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ResultCache(path, max_entries=2, access_batch=100)
+    for query in ('rs1', 'rs2', 'rs3'):
+        cache.put('dbsnp', query, query)
+        clock.now += 1
+    # rs1 最近被讀取：存取時間只在記憶體中，淘汰前才寫回
+    assert cache.get('dbsnp', 'rs1') == 'rs1'
+    cache.close()
+
+    cache = ResultCache(path, max_entries=2)
+    assert [cache.get('dbsnp', query) for query in ('rs1', 'rs2', 'rs3')] == ['rs1', None, 'rs3']
+    cache.close()
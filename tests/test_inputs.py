@@ -0,0 +1,44 @@
+import gzip
+
+import pytest
+
+from genebots.inputs import read_column, read_lines, read_rows
+
+
+def test_read_rows_csv(tmp_path):
+    path = tmp_path / 'input.csv'
+    path.write_text('#,rs ID,note\n1,rs1,a\n\n2,rs2\n')
+    assert list(read_rows(str(path), ['#', 'rs ID'])) == [('1', 'rs1'), ('2', 'rs2')]
+    assert list(read_rows(str(path), ['note'])) == [('a',), ('',)]
+
+
+def test_read_rows_vep_tsv_numbers_rows(tmp_path):
+    path = tmp_path / 'input.tsv'
+    path.write_text('## VEP output\n## more meta\n#Uploaded_variation\tLocation\nrs1\tX:10\nrs2\tY:20\n')
+    assert list(read_rows(str(path), ['#', '#Uploaded_variation'], row_number='#')) == [(1, 'rs1'), (2, 'rs2')]
+
+
+def test_read_rows_gzip_and_bgzip(tmp_path):
+    path = tmp_path / 'input.csv.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write('rs ID\nrs1\nrs2\n')
+    assert list(read_column(str(path), 'rs ID')) == ['rs1', 'rs2']
+
+    # bgzip 是多個 gzip member 串接
+    path = tmp_path / 'input.tsv.bgz'
+    path.write_bytes(gzip.compress(b'#Uploaded_variation\tAllele\nrs1\tA\n') + gzip.compress(b'rs2\tG\n'))
+    assert list(read_rows(str(path), ['#Uploaded_variation', 'Allele'])) == [('rs1', 'A'), ('rs2', 'G')]
+
+
+def test_read_rows_missing_column(tmp_path):
+    path = tmp_path / 'input.csv'
+    path.write_text('rs ID\nrs1\n')
+    with pytest.raises(ValueError):
+        list(read_rows(str(path), ['#', 'rs ID']))
+
+
+def test_read_lines_gzip(tmp_path):
+    path = tmp_path / 'diseases.txt.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write('Disease A\n\n  Disease B  \n')
+    assert list(read_lines(str(path))) == ['Disease A', 'Disease B']
@@ -0,0 +1,43 @@
+import glob, os
+
+import pyarrow.parquet as pq
+
+from genebots.merge import MergedDataset
+
+
+def write_table(path, disease, names):
+    with open(path, 'w') as f:
+        f.write('Disease Name\tName\tGene\n')
+        for name in names:
+            f.write(f'{disease}\t{name}\tG\n')
+    return str(path)
+
+
+def test_callbacks_wait_for_the_part_file(tmp_path):
+    merged = MergedDataset(str(tmp_path / 'merged.parquet'), batch_rows=5, chunk_rows=2)
+    done = []
+    merged.add_file(write_table(tmp_path / 'a.txt', 'A', ['v3', 'v1', 'v2']), 'A', on_merged=lambda: done.append('A'))
+    # 已寫入 .tmp 的 chunk 還不算合併
+    assert done == []
+    assert glob.glob(str(tmp_path / 'merged.parquet' / 'part-*.parquet')) == []
+    merged.add_file(write_table(tmp_path / 'b.txt', 'B', ['v5', 'v4', 'v6']), 'B', on_merged=lambda: done.append('B'))
+    assert done == ['A', 'B']
+
+    table = pq.read_table(os.path.join(merged.path, 'part-00000.parquet'))
+    assert table.num_rows == 6
+    # 每個 chunk（row group）各自排序
+    assert table.column('Name').to_pylist() == ['v1', 'v3', 'v2', 'v5', 'v4', 'v6']
+    assert MergedDataset(merged.path).diseases() == {'A', 'B'}
+
+
+def test_disease_without_rows_is_merged(tmp_path):
+    merged = MergedDataset(str(tmp_path / 'merged.parquet'))
+    done = []
+    merged.add_file(write_table(tmp_path / 'a.txt', 'A', []), 'A', on_merged=lambda: done.append('A'))
+    merged.close()
+    assert done == ['A']
+
+    merged.add_file(write_table(tmp_path / 'a.txt', 'A', ['v1']), 'A', on_merged=lambda: done.append('again'))
+    assert done == ['A', 'again']
+    merged.close()
+    assert glob.glob(os.path.join(merged.path, 'part-*.parquet')) == []
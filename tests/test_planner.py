@@ -0,0 +1,63 @@
+import pytest
+
+from genebots.planner import Deduplicator, normalize_region, normalize_rsid, plan_windows
+
+
+def counting(results=None):
+    calls = []
+
+    def lookup(row):
+        calls.append(row[1])
+        return (results or {}).get(row[1], [row[0], row[1], f'gene-{row[1]}'])
+    return lookup, calls
+
+
+def fan_out(row, result):
+    return [row[0], row[1], *result[2:]]
+
+
+def test_normalize():
+    assert normalize_rsid(' RS123 ') == normalize_rsid('123') == 'rs123'
+    assert normalize_region('chrx', '100') == normalize_region('X', 100.0) == ('X', 100)
+
+
+def test_plan_windows():
+    regions = [('X', 300), ('X', 100), ('Y', 100), ('X', 100), ('X', 250), ('X', 2000)]
+    assert plan_windows(regions, 200, 10) == [['X', 100, 300, [100, 250, 300]], ['X', 2000, 2000, [2000]], ['Y', 100, 100, [100]]]
+    assert plan_windows(regions, 200, 2)[:2] == [['X', 100, 250, [100, 250]], ['X', 300, 300, [300]]]
+
+
+def test_dedup_plan_fans_out_and_forgets():
+    rows = [(1, 'rs1'), (2, 'RS1'), (3, 'rs2'), (4, 'rs1')]
+    lookup, calls = counting()
+    dedup = Deduplicator(lookup, key=lambda row: normalize_rsid(row[1]), fan_out=fan_out,
+                         keys=[normalize_rsid(row[1]) for row in rows])
+    assert [dedup(row) for row in rows] == [[1, 'rs1', 'gene-rs1'], [2, 'RS1', 'gene-rs1'], [3, 'rs2', 'gene-rs2'], [4, 'rs1', 'gene-rs1']]
+    assert calls == ['rs1', 'rs2']
+    # 最後一列用完後就不再保留結果
+    assert not dedup._futures
+
+
+def test_dedup_window():
+    lookup, calls = counting()
+    dedup = Deduplicator(lookup, key=lambda row: row[1], fan_out=fan_out, window=2)
+    for number, rsid in enumerate(['rs1', 'rs2', 'rs1', 'rs3', 'rs1', 'rs4', 'rs2'], 1):
+        dedup((number, rsid))
+    # rs1 一直在最近 2 個之內；rs2 在 rs3、rs1、rs4 之後已被淘汰
+    assert calls == ['rs1', 'rs2', 'rs3', 'rs4', 'rs2']
+    assert (dedup.rows, dedup.lookups) == (7, 5)
+
+
+def test_dedup_does_not_keep_failures():
+    lookup, calls = counting({'rs1': [None, 'rs1', 'error']})
+    dedup = Deduplicator(lookup, key=lambda row: row[1], fan_out=fan_out, failed=lambda result: 'error' in result)
+    assert dedup((1, 'rs1')) == [1, 'rs1', 'error']
+    dedup((2, 'rs1'))
+    assert calls == ['rs1', 'rs1']
+
+    def broken(row):
+        raise RuntimeError('down')
+    dedup = Deduplicator(broken, key=lambda row: row[1], fan_out=fan_out)
+    with pytest.raises(RuntimeError):
+        dedup((1, 'rs1'))
+    assert not dedup._futures
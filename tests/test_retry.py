@@ -0,0 +1,72 @@
+import time
+
+from genebots.retry import CircuitBreaker, RetryQueue
+from genebots.workers import run_ordered
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(threshold=2, reset_after=0.1)
+    breaker.record('h', True)
+    assert breaker.allow('h')
+    breaker.record('h', True)
+    assert not breaker.allow('h')
+    assert breaker.opened['h'] == 1
+    assert 0 < breaker.wait_time('h') <= 0.1
+
+    # 開啟前送出的查詢晚點成功，不應關閉斷路器
+    breaker.record('h', False)
+    assert not breaker.allow('h')
+
+    time.sleep(0.15)
+    assert breaker.allow('h')
+    assert not breaker.allow('h')
+    # 試探失敗：重新開啟
+    breaker.record('h', True)
+    assert not breaker.allow('h')
+    assert breaker.opened['h'] == 2
+
+    time.sleep(0.15)
+    assert breaker.allow('h')
+    breaker.record('h', False)
+    assert breaker.allow('h') and breaker.allow('h')
+    assert breaker.wait_time('h') == 0
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker(threshold=2)
+    for failed in (True, False, True, False):
+        breaker.record('h', failed)
+    assert breaker.allow('h')
+    assert breaker.allow('other')
+
+
+def test_drain_counts_attempts_by_key():
+    fails = {'rs1': 1, 'rs2': 5}
+    calls = []
+
+    def lookup(item):
+        calls.append(item[1])
+        fails[item[1]] = fails.get(item[1], 0) - 1
+        return [*item, 'error' if fails[item[1]] >= 0 else 'ok']
+
+    retry = RetryQueue('http://host/path', failed=lambda result: result[2] == 'error', key=lambda item: item[1],
+                       max_attempts=3, base_delay=0, breaker=CircuitBreaker(threshold=100))
+    assert retry.host == 'host'
+    for item, result, reason in run_ordered(retry.guard(lookup), [(1, 'rs1'), (2, 'rs2'), (3, 'rs3')]):
+        if reason:
+            retry.add(item, reason, result)
+    assert calls == ['rs1', 'rs2', 'rs3']
+
+    drained = sorted(retry.drain(lookup, workers=2), key=lambda entry: entry[0][1])
+    assert [(item[1], reason) for item, result, reason in drained] == [('rs1', None), ('rs2', 'error')]
+    assert retry.failures == [{'key': 'rs2', 'reason': 'error', 'attempts': 3}]
+    assert retry.pending == []
+    assert sorted(calls) == ['rs1', 'rs1', 'rs2', 'rs2', 'rs2', 'rs3']
+
+
+def test_guard_skips_while_circuit_open():
+    retry = RetryQueue('h', failed=lambda result: result is None, breaker=CircuitBreaker(threshold=1, reset_after=60))
+    guarded = retry.guard(lambda item: None)
+    assert guarded('a') == ('a', None, 'error')
+    assert guarded('b') == ('b', None, 'circuit-open')
+    assert 59 < retry.wait_time() <= 60
@@ -0,0 +1,81 @@
+import csv, glob, os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from genebots.checkpoint import Checkpoint, resume_keys
+from genebots.sink import OutputSink
+
+COLUMNS = ['#', 'rs ID', 'gene', 'freq']
+TYPES = {'#': 'int64', 'freq': 'list<float64>'}
+ROWS = [[1, 'rs1', 'G1', '0.1,0.2'], [2, 'rs2', 'error', 'error'], [3, 'rs3', None, None]]
+
+
+def read_parquet(path):
+    return pa.concat_tables(pq.read_table(part) for part in sorted(glob.glob(os.path.join(path, 'part-*.parquet'))))
+
+
+def test_csv_checkpoint_after_flush(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    checkpoint = Checkpoint(str(tmp_path / 'out.checkpoint'))
+    sink = OutputSink(path, COLUMNS, checkpoint=checkpoint, flush_rows=2, flush_interval=float('inf'))
+    sink.write([ROWS[0]], key=1)
+    assert '1' not in checkpoint
+    sink.write([ROWS[1]], key=2)
+    assert checkpoint.keys == {'1', '2'}
+    sink.write([ROWS[2]], key=3)
+    sink.close()
+    checkpoint.close()
+
+    with open(path) as f:
+        assert list(csv.reader(f)) == [COLUMNS, ['1', 'rs1', 'G1', '0.1,0.2'], ['2', 'rs2', 'error', 'error'], ['3', 'rs3', '', '']]
+    with open(tmp_path / 'out.checkpoint') as f:
+        assert f.read() == '1\n2\n3\n'
+
+    # 再開一次只續寫，不重複標題
+    OutputSink(path, COLUMNS).close()
+    with open(path) as f:
+        assert sum(1 for line in f) == 4
+
+
+def test_parquet_types_and_status(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    sink = OutputSink(path, COLUMNS, types=TYPES, flush_rows=2)
+    sink.write(ROWS)
+    sink.close()
+    table = read_parquet(path)
+    assert table.schema.field('#').type == pa.int64()
+    assert table.to_pylist() == [
+        {'#': 1, 'rs ID': 'rs1', 'gene': 'G1', 'freq': [0.1, 0.2], 'status': None},
+        {'#': 2, 'rs ID': 'rs2', 'gene': 'error', 'freq': None, 'status': 'error'},
+        {'#': 3, 'rs ID': 'rs3', 'gene': None, 'freq': None, 'status': None},
+    ]
+
+    sink = OutputSink(path, COLUMNS, types=TYPES)
+    sink.write([[4, 'rs4', 'G4', 'n/a']])
+    with pytest.raises(ValueError):
+        sink.close()
+
+
+def test_resume_csv(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    sink = OutputSink(path, COLUMNS)
+    sink.write(ROWS + [[4, 'rs2', 'G2', '0.3']])
+    sink.close()
+    assert resume_keys(path, '#', ['gene', 'freq']) == ({'1', '3', '4'}, {'2'})
+    with open(path) as f:
+        assert [row[0] for row in csv.reader(f)] == ['#', '1', '3', '4']
+
+    assert resume_keys(path, '#', ['gene', 'freq'], retry_empty=True) == ({'1', '4'}, {'3'})
+    assert resume_keys(str(tmp_path / 'missing.csv'), '#', ['gene']) == (set(), set())
+
+
+def test_resume_parquet_uses_status(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    sink = OutputSink(path, COLUMNS, types=TYPES, flush_rows=1)
+    sink.write(ROWS)
+    sink.close()
+    assert resume_keys(path, '#', ['gene', 'freq']) == ({'1', '3'}, {'2'})
+    assert glob.glob(os.path.join(path, 'part-*.parquet')) == [os.path.join(path, 'part-00000.parquet')]
+    assert read_parquet(path).column('#').to_pylist() == [1, 3]
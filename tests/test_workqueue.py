@@ -0,0 +1,103 @@
+import csv, time
+
+from genebots.retry import CircuitBreaker, RetryQueue
+from genebots.workqueue import WorkQueue
+
+
+def make_queue(tmp_path, rows, **opts):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), 'job', **opts)
+    queue.enqueue(rows, key=lambda row: row[1])
+    return queue
+
+
+def test_expired_lease_goes_to_next_worker(tmp_path):
+    first = make_queue(tmp_path, [('1', 'rs1'), ('2', 'rs2')], lease=0.2)
+    assert [key for key, row in first.claim(10)] == ['rs1', 'rs2']
+    # worker 當掉：停止續約
+    first._stop.set()
+    first._heartbeat.join()
+
+    second = WorkQueue(str(tmp_path / 'queue.sqlite'), 'job', lease=0.2)
+    assert second.claim(10) == []
+    time.sleep(0.3)
+    assert [key for key, row in second.claim(10)] == ['rs1', 'rs2']
+    second.complete('rs1', ['1', 'rs1', 'x'])
+
+    # 過期後才完成的舊 worker 不能交回已被接手的 task
+    first.release('rs2', 'error')
+    assert second.counts() == {'pending': 0, 'leased': 1, 'done': 1, 'failed': 0}
+    second.close()
+
+
+def test_release_backs_off(tmp_path):
+    queue = make_queue(tmp_path, [('1', 'rs1')], base_delay=0.2)
+    queue.claim(10)
+    queue.release('rs1', 'error')
+    assert queue.claim(10) == []
+    time.sleep(0.35)
+    assert queue.claim(10) == [('rs1', ('1', 'rs1'))]
+    queue.close()
+
+
+def test_task_fails_after_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, [('1', 'rs1')], max_attempts=2, base_delay=0)
+    for attempt in range(2):
+        assert queue.claim(10)
+        queue.release('rs1', 'error', ['1', 'rs1', 'error'])
+    assert queue.claim(10) == []
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 0, 'failed': 1}
+    assert queue.finished()
+    assert list(queue.results()) == [(('1', 'rs1'), ['1', 'rs1', 'error'])]
+    queue.close()
+
+
+def test_circuit_open_keeps_attempts(tmp_path):
+    queue = make_queue(tmp_path, [('1', 'rs1')], max_attempts=2, base_delay=0)
+    for skipped in range(5):
+        assert queue.claim(10)
+        queue.release('rs1', 'circuit-open', wait=0)
+    assert queue.counts()['pending'] == 1
+
+    queue.claim(10)
+    queue.release('rs1', 'circuit-open', wait=0.2)
+    assert queue.claim(10) == []
+    time.sleep(0.3)
+    assert queue.claim(10)
+    queue.close()
+
+
+def test_run_waits_for_open_circuit(tmp_path):
+    rows = [(str(number), f'rs{number}') for number in range(60)]
+    queue = make_queue(tmp_path, rows, max_attempts=2, base_delay=0.01)
+    calls = []
+
+    def lookup(row):
+        # 前 5 次查詢失敗，斷路器打開；其餘 task 應等到斷路器放行，而不是用完嘗試次數
+        calls.append(row)
+        return [*row, 'error' if len(calls) <= 5 else 'ok']
+
+    retry = RetryQueue('http://host', failed=lambda result: result[2] == 'error',
+                       key=lambda row: row[1], breaker=CircuitBreaker(threshold=5, reset_after=0.2))
+    queue.run(retry.guard(lookup), batch_size=20, poll=0.05, empty=retry.empty, wait=retry.wait_time)
+    assert queue.counts() == {'pending': 0, 'leased': 0, 'done': 60, 'failed': 0}
+    queue.close()
+
+
+def test_export_keeps_input_order(tmp_path):
+    rows = [('1', 'rs3'), ('2', 'rs1'), ('3', 'rs3'), ('4', 'rs2')]
+    queue = make_queue(tmp_path, rows, max_attempts=1)
+    claimed = queue.claim(10)
+    assert [key for key, row in claimed] == ['rs3', 'rs1', 'rs2']
+    for key, row in reversed(claimed):
+        if key == 'rs2':
+            queue.release(key, 'error')
+        else:
+            queue.complete(key, [key.upper()])
+
+    path = tmp_path / 'out.csv'
+    queue.export(str(path), ['#', 'rs ID', 'value'],
+                 lambda row, result: [[row[0], row[1], result[0] if result else 'error']])
+    with open(path) as f:
+        assert list(csv.reader(f)) == [['#', 'rs ID', 'value'], ['1', 'rs3', 'RS3'], ['2', 'rs1', 'RS1'],
+                                       ['3', 'rs3', 'RS3'], ['4', 'rs2', 'error']]
+    queue.close()
@@ -1,174 +1,64 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import tempfile, json, logging, time, re, os, zipfile, sys, argparse, configparser
-import smtplib
-from email.mime.text import MIMEText
-from threading import Thread
-from datetime import datetime, timedelta
-from glob import glob
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import Select
-import pandas as pd
-import csv
-
-def next_step(tag_name):
-    global step_counter
-    step_counter += 1    
-    
-    return f'{step_counter:02d}-{tag_name}'
-
-
-def init_driver(driverpath, download_dir=None, implicit_wait=30):
-    logging.info('Initializing driver')
-    
-    options = webdriver.ChromeOptions()
-    options.add_argument('--no-sandbox')
-    options.add_argument('--headless') # 瀏覽器在沒有 GUI 的情況下運行
-    options.add_argument('--disable-dev-shm-usage')
-
-    if download_dir is None:
-        download_dir = tempfile.gettempdir()
-        
-    prefs = {
-        "download.default_directory": download_dir,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    
-    service = Service(driverpath)
-    options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.implicitly_wait(implicit_wait)
-    logging.info('Driver initialized successfully')
-    
-    return driver
+import os, argparse
+from genebots import RunContext, add_common_args, add_replay_args, check_replay_args, read_column, run_ordered
+from genebots.core import setup_logging
+from genebots.sources.vietnamese import BASE_URL, VietnameseSource
+from genebots.planner import normalize_rsid
 
 
 def main():
-    driver_path = './chromedriver-linux64/chromedriver'
-    base_url = 'https://genomes.vn/'   
-    screenshot_dir_path = f'{script_dir}/screenshots/{log_time}_vietnamese_screenshot'
-
-    os.makedirs(screenshot_dir_path, exist_ok=True)
-    
-    df = pd.read_csv(args.input, header=0)
     output_file = args.output
-    dir_path = os.path.dirname(output_file)
-    os.makedirs(dir_path, exist_ok = True)
+    columns = ["ALT", "KHV", "KHV-G", "Region", "Gene", "Impact", "AA Change"]
+
+    with RunContext(args, 'vietnamese', script_dir, log_time) as run:
+        # 直接重送查詢請求（--engine http），回應格式不符時才開瀏覽器；結果經由共用快取
+        source = run.source(VietnameseSource, base_url=args.base_url, engine=args.engine, replay_url=args.replay_url,
+                            replay_method=args.replay_method, fallback=args.fallback, maxsize=args.workers)
+        run.prewarm(source.prewarm_urls())
 
-    # 若 CSV 檔案不存在，則寫入標題行
-    if not os.path.exists(output_file):
-        with open(output_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["#Uploaded_variation", "ALT", "KHV", "KHV-G", "Region", "Gene", "Impact", "AA Change"])
-    
-    for index, row in df.iterrows():
-        id = row['#Uploaded_variation']
-        
-        try:
-            # 初始化 WebDriver 並訪問網站
-            logging.info("")
-            driver = init_driver(driver_path)
-            driver.implicitly_wait(5)
-            driver.get(base_url)
-            driver.set_window_size(1920, 1920)
+        # 逐列讀取（CSV/TSV，可為 gzip/bgzip），不把整個輸入載入記憶體
+        ids = read_column(args.input, '#Uploaded_variation')
 
-        
-            # 填入 RS ID
-            search_box = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "query")))
-            search_box.clear()
-            search_box.send_keys(id)
+        # 續跑：略過已完成的 key，error 的列重新排入
+        ids = run.resume(ids, output_file, '#Uploaded_variation', columns, key=str)
 
-            # 選擇 "GRCh37"
-            ref_button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.NAME, "ref")))
-            ref_button.click()        
+        # 輸出先暫存，批次寫入 CSV 或 Parquet
+        sink = run.output(output_file, ["#Uploaded_variation", *columns], types={'KHV': 'float64', 'KHV-G': 'float64'})
 
-            # submit
-            submit = driver.find_element(By.XPATH, "//button[@id='search-btn']/i")
-            submit.click()
-            
-            # time.sleep(4)
-            
-            file_name = next_step(f"{id}_result.png")
-            screenshot_path = f"{screenshot_dir_path}/{file_name}"
-            driver.save_screenshot(screenshot_path)
-            logging.info(f'Screenshot saved: {screenshot_path}')
-            
-            # 獲取所有行
-            rows = driver.find_elements(By.XPATH, "//div[@id='result']/div/table/tbody/tr[5]/td/table/tbody/tr")
-            
-            if not rows:
-                # 若 `tbody` 為空，設定為 None
-                logging.warning(f"{id} | No data available.")
-                alt, khv, khvg, region, gene, impact, aachange = None, None, None, None, None, None, None
-                with open(output_file, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([id, alt, khv, khvg, region, gene, impact, aachange])
-            else:
-                for row in rows:
-                    try:
-                        alt = row.find_element(By.XPATH, ".//th").text
-                        khv = row.find_element(By.XPATH, ".//td[1]").text
-                        khvg = row.find_element(By.XPATH, ".//td[2]").text
-                        region = row.find_element(By.XPATH, ".//td[3]").text
-                        gene = row.find_element(By.XPATH, ".//td[4]").text
-                        impact = row.find_element(By.XPATH, ".//td[5]").text
-                        aachange = row.find_element(By.XPATH, ".//td[6]").text
+        # 失敗的查詢留到最後重試；同一網站連續失敗時暫停查詢
+        retry = run.retry(source.base_url, 'vietnamese', failed=lambda results: any('error' in result[1:] for result in results),
+                          empty=lambda results: all(result[1] is None for result in results), key=str)
 
-                        logging.info(f"{id} | ALT: {alt} | KHV: {khv} | KHV-G: {khvg} | Region: {region} | Gene: {gene} | Impact: {impact} | AA Change: {aachange}")
-                        
-                        # 寫入 CSV
-                        with open(output_file, 'a', newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow([id, alt, khv, khvg, region, gene, impact, aachange])
-                    except Exception as row_e:
-                        logging.error(f"Error processing row for {id}: {row_e}")
-                        alt, khv, khvg, region, gene, impact, aachange = 'error', 'error', 'error', 'error', 'error', 'error', 'error'
-                        with open(output_file, 'a', newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow([id, alt, khv, khvg, region, gene, impact, aachange])
-                        continue
-                
-            driver.quit()
+        # 相同 rsID 只查一次，結果再分配回每一列；只記住最近 --dedup-window 個 rsID
+        lookup = run.dedup(lambda id: [[id, *values] for values in source.lookup(None, normalize_rsid(id), run.cache)],
+                           key=normalize_rsid,
+                           fan_out=lambda id, results: [[id, *result[1:]] for result in results],
+                           failed=retry.failed)
 
-        except Exception as e:
-            logging.error(f"Error processing {id}: {e}")
-            alt, khv, khvg, region, gene, impact, aachange = 'error', 'error', 'error', 'error', 'error', 'error', 'error'
-            with open(output_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([id, alt, khv, khvg, region, gene, impact, aachange])
-            continue      
-        
+        for id, results, reason in run_ordered(retry.guard(lookup), ids, args.workers):
+            if reason:
+                retry.add(id, reason, results)
+                continue
+            # 依輸入順序寫入
+            sink.write(results, key=id)
+        for id, results, reason in retry.drain(lookup, args.workers):
+            sink.write(results or [[id, *['error'] * 7]], key=id)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Get genetic variation info from Vietnamese Genetic Variation Database.')
-    parser.add_argument('--input', help='Input file path. Default="./inputs/vietnamese_example.csv"', default="./inputs/vietnamese_example.csv")
-    parser.add_argument('--output', help='Output file path. Default="./outputs/vietnamese_example_output.csv"', default="./outputs/vietnamese_example_output.csv")
+    parser.add_argument('--input', help='Input CSV/TSV file path, plain or gzip/bgzip. Default="./inputs/vietnamese_example.csv"', default="./inputs/vietnamese_example.csv")
+    parser.add_argument('--output', help='Output file path, .csv or .parquet. Default="./outputs/vietnamese_example_output.csv"', default="./outputs/vietnamese_example_output.csv")
+    parser.add_argument('--base-url', help=f'genomes.vn search page, e.g. a local stand-in server. Default="{BASE_URL}"', default=BASE_URL)
+    add_replay_args(parser)
+    add_common_args(parser, './outputs/vietnamese_failures.json')
     args = parser.parse_args()
+    check_replay_args(parser, args)
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    os.makedirs(f'{script_dir}/logs', exist_ok=True)    
-    log_time = datetime.now().strftime("%Y-%m-%d")
-    logFileName = f'{script_dir}/logs/vietnamese_automator_{log_time}.log'
-    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', 
-                        datefmt='%Y-%m-%d %H:%M:%S',
-                        level=logging.INFO,
-                        handlers=[
-                            logging.FileHandler(logFileName, mode='a'),
-                            logging.StreamHandler()
-                        ])
+    log_time = setup_logging(script_dir, 'vietnamese_automator')
 
-    # Global step counter
-    step_counter = 0
-    
     main()